@@ -0,0 +1,143 @@
+import hashlib
+import os
+import time
+
+from core import metrics
+
+# Cache de resultados endereçado por conteúdo:
+#   chave = hash(áudio) + hash(job_description) + versão do prompt + modelo
+# Mesma gravação + mesma vaga + mesmo prompt => mesmo feedback, sem chamar o Gemini.
+
+DEFAULT_TTL_SECONDS = 7 * 86400
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def audio_fingerprint(stream, chunk_size=8 * 1024 * 1024):
+    """
+    Identidade do conteúdo do áudio.
+    Upload simples (PUT): o ETag do S3 já é o MD5 do conteúdo -> custo zero.
+    Upload multipart: o ETag depende do tamanho das partes, então calculamos SHA-256 lendo o stream
+    (o process_audio usa o ContentHasher para aproveitar as leituras da pré-triagem).
+    """
+    etag = (stream.head.get("ETag") or "").strip('"')
+    if etag and "-" not in etag:
+        return f"md5:{etag}"
+
+    digest = hashlib.sha256()
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+    stream.seek(0)
+    return f"sha256:{digest.hexdigest()}"
+
+
+def is_single_part(head):
+    """ETag sem "-N": upload simples, o fingerprint sai do ETag sem ler o objeto."""
+    etag = (head.get("ETag") or "").strip('"')
+    return bool(etag) and "-" not in etag
+
+
+class ContentHasher:
+    """
+    SHA-256 do objeto calculado com as leituras de quem já percorre o stream (a
+    pré-triagem lê MP3/WAV inteiros). Bytes lidos em ordem entram no hash; um salto
+    para frente lê antes o trecho pulado; releituras não entram de novo. fingerprint()
+    lê só o que ainda faltar (fim do arquivo, formato desconhecido).
+    Mesmo seek/read do stream envolvido.
+    """
+
+    def __init__(self, stream, chunk_size=8 * 1024 * 1024):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self._digest = hashlib.sha256()
+        self._hashed = 0  # bytes [0, _hashed) já no hash
+        self._pos = 0
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._pos = self.stream.seek(offset, whence)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def read(self, n=-1):
+        if self._pos > self._hashed:
+            self._catch_up(self._pos)
+        data = self.stream.read(n)
+        end = self._pos + len(data)
+        if end > self._hashed:
+            self._digest.update(data[self._hashed - self._pos:])
+            self._hashed = end
+        self._pos = end
+        return data
+
+    def _catch_up(self, target):
+        self.stream.seek(self._hashed)
+        while self._hashed < target:
+            chunk = self.stream.read(min(self.chunk_size, target - self._hashed))
+            if not chunk:
+                break
+            self._digest.update(chunk)
+            self._hashed += len(chunk)
+        self.stream.seek(self._pos)
+
+    def fingerprint(self):
+        """sha256:<hex> do objeto inteiro (mesmo formato do audio_fingerprint)."""
+        self._catch_up(self.stream.seek(0, os.SEEK_END))
+        return f"sha256:{self._digest.hexdigest()}"
+
+
+def build_cache_key(audio_fp, job_description, prompt_version, model):
+    return _sha256(f"{audio_fp}|{_sha256(job_description or '')}|{prompt_version}|{model}")
+
+
+class AnalysisCache:
+    """Tabela DynamoDB (hash key `cache_key`) com TTL em `expire_at`."""
+
+    def __init__(self, dynamodb_resource, table_name, ttl_seconds=None):
+        self.table = dynamodb_resource.Table(table_name)
+        self.ttl_seconds = ttl_seconds or int(os.environ.get("CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+
+    def get(self, cache_key):
+        """Retorna o ai_feedback em cache ou None. Falhas do cache nunca quebram a análise."""
+        try:
+            item = self.table.get_item(Key={"cache_key": cache_key}).get("Item")
+        except Exception as e:
+            print(f"Cache indisponível (get): {str(e)}")
+            metrics.incr("AnalysisCacheError", op="get")
+            return None
+
+        # O TTL do DynamoDB pode demorar para remover itens vencidos
+        if item and int(item.get("expire_at", 0)) > time.time():
+            metrics.incr("AnalysisCacheHit")
+            return item["ai_feedback"]
+
+        metrics.incr("AnalysisCacheMiss")
+        return None
+
+    def put(self, cache_key, ai_feedback, **attributes):
+        try:
+            self.table.put_item(Item={
+                "cache_key": cache_key,
+                "ai_feedback": ai_feedback,
+                "created_at": str(int(time.time())),
+                "expire_at": int(time.time() + self.ttl_seconds),
+                **attributes
+            })
+        except Exception as e:
+            print(f"Cache indisponível (put): {str(e)}")
+            metrics.incr("AnalysisCacheError", op="put")
+
+
+def get_cache(dynamodb_resource):
+    """Cache habilitado apenas quando CACHE_TABLE_NAME estiver configurada."""
+    table_name = os.environ.get("CACHE_TABLE_NAME")
+    if not table_name:
+        return None
+    return AnalysisCache(dynamodb_resource, table_name)
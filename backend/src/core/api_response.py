@@ -0,0 +1,114 @@
+import base64
+import gzip
+import os
+
+from core import dynamo_json, metrics
+
+try:
+    import brotli
+except ImportError:  # Sem o pacote (testes locais): só gzip
+    brotli = None
+
+# Respostas HTTP das Lambdas atrás do API Gateway (payload v2).
+# Headers (Content-Type + CORS) montados num lugar só. Corpos a partir de
+# RESPONSE_COMPRESSION_MIN_BYTES são comprimidos conforme o Accept-Encoding
+# (br > gzip, respeitando q=) e vão em base64 com isBase64Encoded — o API Gateway
+# entrega os bytes comprimidos e o navegador descomprime. O item de sessão com
+# job_description + feedback tem vários KB; JSON comprime para ~1/4 disso.
+
+DEFAULT_COMPRESSION_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Bom equilíbrio para conteúdo dinâmico (11 é lento demais)
+
+CORS_HEADERS = {"Access-Control-Allow-Origin": "*"}
+JSON_HEADERS = {"Content-Type": "application/json", **CORS_HEADERS}
+
+
+def header(event, name):
+    """Headers do API Gateway (HTTP API manda em minúsculas; REST mantém o original)."""
+    for key, value in ((event or {}).get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding):
+    """Melhor codificação aceita pelo cliente ("br", "gzip") ou None (identity)."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    supported = _supported_encodings()
+    ranked = sorted(
+        (-accepted.get(coding, accepted.get("*", 0.0)), index, coding)
+        for index, coding in enumerate(supported)
+    )
+    quality, _, coding = ranked[0]
+    return coding if quality < 0 else None
+
+
+def _compress(data, coding):
+    if coding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def json_response(status_code, body, event=None, headers=None):
+    """
+    Resposta JSON. `body` pode ser objeto (serializado com dynamo_json, aceita
+    Decimal/set do DynamoDB) ou string já serializada. Com `event`, negocia a
+    compressão pelo Accept-Encoding da requisição.
+    """
+    text = body if isinstance(body, str) else dynamo_json.dumps(body)
+    headers = {**JSON_HEADERS, **(headers or {})}
+    response = {"statusCode": status_code, "headers": headers, "body": text}
+    if event is None:
+        return response
+
+    data = text.encode("utf-8")
+    min_bytes = int(os.environ.get("RESPONSE_COMPRESSION_MIN_BYTES", DEFAULT_COMPRESSION_MIN_BYTES))
+    if len(data) < min_bytes:
+        return response
+    # A partir do limite a representação depende do Accept-Encoding (caches/CDN)
+    headers["Vary"] = "Accept-Encoding"
+    coding = negotiate_encoding(header(event, "accept-encoding"))
+    if coding is None:
+        return response
+    compressed = _compress(data, coding)
+    if len(compressed) >= len(data):
+        return response
+
+    headers["Content-Encoding"] = coding
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        # Bytes diferentes da versão sem compressão: ETag fraco (If-None-Match ignora o W/)
+        headers["ETag"] = "W/" + etag
+    metrics.incr("ResponseCompressed", encoding=coding)
+    metrics.put_metric("ResponseBytesSaved", len(data) - len(compressed), unit="Bytes", encoding=coding)
+    response["body"] = base64.b64encode(compressed).decode("ascii")
+    response["isBase64Encoded"] = True
+    return response
+
+
+def error_response(status_code, message, event=None):
+    return json_response(status_code, {"error": message}, event)
+
+
+def not_modified(headers):
+    """304 sem corpo (If-None-Match bateu com o ETag)."""
+    return {"statusCode": 304, "headers": {**JSON_HEADERS, **headers}, "body": ""}
+
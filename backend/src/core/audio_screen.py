@@ -0,0 +1,430 @@
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+# Pré-triagem local do áudio (antes de pagar upload + polling + modelo).
+#
+# - WAV/PCM: decodifica em blocos e calcula a energia RMS (dBFS) de quadros de 20 ms.
+# - MP3: não decodifica; lê apenas cabeçalho + "side info" de cada frame. O número
+#   de bits codificados (part2_3_length) e o global_gain funcionam como proxy de
+#   energia: silêncio digital praticamente não consome bits.
+# Todo o cálculo por quadro é vetorizado com NumPy; o stream é lido em blocos
+# (memória limitada, sem arquivo local).
+# `cancel` (threading.Event) interrompe a leitura no próximo bloco: a pré-triagem
+# roda numa thread e o chamador não pode fechar o stream com ela ainda lendo.
+
+READ_CHUNK = 1024 * 1024
+WAV_FRAME_S = 0.02
+SILENCE_DB = -120.0
+
+# Bitrates (kbps) do Layer III: MPEG-1 e MPEG-2/2.5
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+class PrescreenCancelled(Exception):
+    pass
+
+
+@dataclass
+class AudioProfile:
+    """Resumo do áudio por quadros de análise (tempo, byte de início, energia, atividade)."""
+    format: str
+    size: int
+    duration_s: float = 0.0
+    frame_s: float = 0.0
+    frame_offsets: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    frame_db: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    active: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    data_end: int = 0
+    wav_header: Optional[dict] = None
+
+    @property
+    def frame_count(self):
+        return len(self.frame_offsets)
+
+    @property
+    def active_seconds(self):
+        return float(self.active.sum()) * self.frame_s
+
+    def voiced_mask(self, margin_db=6.0, hangover_s=0.2):
+        """
+        VAD simples: quadro ativo e acima do piso de ruído (percentil 10) + margem.
+        A "hangover" (dilatação) evita cortar consoantes fracas entre palavras.
+        """
+        if self.frame_count == 0:
+            return self.active
+        noise_floor = np.percentile(self.frame_db, 10)
+        voiced = self.active & (self.frame_db > noise_floor + margin_db)
+        if not voiced.any():
+            # Ruído/voz estacionária: sem contraste suficiente, usa só a atividade
+            voiced = self.active.copy()
+        width = max(1, int(round(hangover_s / self.frame_s)))
+        kernel = np.ones(2 * width + 1)
+        return np.convolve(voiced.astype(float), kernel, mode="same") > 0
+
+    def byte_range(self, first, last):
+        """
+        Faixa de bytes [start, end) + prefixo (cabeçalho) para os quadros [first, last).
+        O resultado é um arquivo válido do mesmo formato.
+        """
+        start = int(self.frame_offsets[first])
+        end = int(self.frame_offsets[last]) if last < self.frame_count else self.data_end
+        prefix = b""
+        if self.format == "wav":
+            prefix = _wav_header_bytes(self.wav_header["fmt_chunk"], end - start)
+        return start, end, prefix
+
+
+@dataclass
+class ScreenResult:
+    accepted: bool
+    profile: AudioProfile
+    reason: Optional[str] = None
+    trim: Optional[tuple] = None  # (start, end, prefix) quando vale a pena cortar
+    frames: Optional[tuple] = None  # (primeiro, último) quadro com voz + margem
+
+    @property
+    def trimmed_size(self):
+        if not self.trim:
+            return self.profile.size
+        start, end, prefix = self.trim
+        return len(prefix) + end - start
+
+
+# --- Detecção de formato ---
+def _read(stream, n):
+    return stream.read(n) or b""
+
+
+class _CancellableStream:
+    """Repassa seek/read ao stream, mas para (PrescreenCancelled) quando `cancel` é sinalizado."""
+
+    def __init__(self, stream, cancel):
+        self.stream = stream
+        self.cancel = cancel
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.stream.seek(offset, whence)
+
+    def read(self, n=-1):
+        if self.cancel.is_set():
+            raise PrescreenCancelled("Pré-triagem cancelada")
+        return self.stream.read(n)
+
+
+def profile_audio(stream):
+    """Inspeciona o stream (a partir do byte 0) e devolve o AudioProfile."""
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    head = _read(stream, READ_CHUNK)
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        profile = _profile_wav(stream, head, size)
+    elif head[:3] == b"ID3" or _parse_mp3_header(head, 0) is not None:
+        profile = _profile_mp3(stream, head)
+    else:
+        profile = AudioProfile(format="unknown", size=size)
+
+    profile.size = size
+    stream.seek(0)
+    return profile
+
+
+# --- WAV (PCM) ---
+def _wav_header_bytes(fmt_chunk, data_size):
+    riff_size = 4 + len(fmt_chunk) + 8 + data_size
+    return b"RIFF" + struct.pack("<I", riff_size) + b"WAVE" + fmt_chunk + b"data" + struct.pack("<I", data_size)
+
+
+def _parse_wav_header(stream, head):
+    buf = head
+    pos = 12
+    fmt = None
+    while True:
+        while len(buf) < pos + 8:
+            more = _read(stream, READ_CHUNK)
+            if not more:
+                return None
+            buf += more
+        chunk_id = buf[pos:pos + 4]
+        chunk_size = struct.unpack("<I", buf[pos + 4:pos + 8])[0]
+        if chunk_id == b"data":
+            return fmt, pos + 8, chunk_size
+        while len(buf) < pos + 8 + chunk_size:
+            more = _read(stream, READ_CHUNK)
+            if not more:
+                return None
+            buf += more
+        if chunk_id == b"fmt ":
+            raw = buf[pos:pos + 8 + chunk_size]
+            audio_format, channels, sample_rate, byte_rate, block_align, bits = struct.unpack(
+                "<HHIIHH", raw[8:24]
+            )
+            if audio_format == 0xFFFE and chunk_size >= 26:
+                audio_format = struct.unpack("<H", raw[32:34])[0]
+            fmt = {
+                "audio_format": audio_format, "channels": channels, "sample_rate": sample_rate,
+                "byte_rate": byte_rate, "block_align": block_align, "bits": bits, "fmt_chunk": raw
+            }
+        pos += 8 + chunk_size + (chunk_size % 2)
+
+
+def _pcm_to_float(raw, fmt):
+    """Bytes PCM -> float32 mono em [-1, 1] (vetorizado)."""
+    bits, fmt_code = fmt["bits"], fmt["audio_format"]
+    if fmt_code == 3 and bits == 32:
+        samples = np.frombuffer(raw, dtype="<f4").astype(np.float32)
+    elif bits == 8:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif bits == 16:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif bits == 24:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608.0
+    elif bits == 32:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"PCM de {bits} bits não suportado")
+    channels = fmt["channels"]
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def _profile_wav(stream, head, total):
+    parsed = _parse_wav_header(stream, head)
+    if not parsed or parsed[0] is None or parsed[0]["audio_format"] not in (1, 3):
+        return AudioProfile(format="unknown", size=total)
+    fmt, data_start, data_size = parsed
+
+    # Tamanho 0/0xFFFFFFFF (gravação em streaming): usa o tamanho real do objeto
+    if data_size in (0, 0xFFFFFFFF) or data_start + data_size > total:
+        data_size = total - data_start
+    data_size -= data_size % fmt["block_align"]
+
+    frame_samples = max(1, int(fmt["sample_rate"] * WAV_FRAME_S))
+    frame_bytes = frame_samples * fmt["block_align"]
+    frames_per_read = max(1, READ_CHUNK // frame_bytes)
+
+    stream.seek(data_start)
+    energies = []
+    remaining = data_size
+    while remaining > 0:
+        raw = _read(stream, min(remaining, frames_per_read * frame_bytes))
+        if not raw:
+            break
+        remaining -= len(raw)
+        samples = _pcm_to_float(raw[:len(raw) - len(raw) % fmt["block_align"]], fmt)
+        n_frames = -(-len(samples) // frame_samples)
+        padded = np.zeros(n_frames * frame_samples, dtype=np.float32)
+        padded[:len(samples)] = samples
+        rms = np.sqrt(np.mean(padded.reshape(n_frames, frame_samples) ** 2, axis=1))
+        energies.append(20.0 * np.log10(rms + 1e-10))
+
+    frame_db = np.concatenate(energies) if energies else np.zeros(0)
+    frame_db = np.maximum(frame_db, SILENCE_DB)
+    offsets = data_start + np.arange(len(frame_db), dtype=np.int64) * frame_bytes
+    return AudioProfile(
+        format="wav",
+        size=total,
+        duration_s=data_size / float(fmt["byte_rate"]) if fmt["byte_rate"] else 0.0,
+        frame_s=frame_samples / float(fmt["sample_rate"]),
+        frame_offsets=offsets,
+        frame_db=frame_db,
+        active=frame_db > _env_float("PRESCREEN_SILENCE_DBFS", -50.0),
+        data_end=data_start + data_size,
+        wav_header=fmt,
+    )
+
+
+# --- MP3 (Layer III) ---
+def _find_mp3_sync(buf, start):
+    pos = buf.find(b"\xff", start)
+    while pos != -1 and pos + 1 < len(buf):
+        if buf[pos + 1] & 0xE0 == 0xE0:
+            return pos
+        pos = buf.find(b"\xff", pos + 1)
+    return None
+
+
+def _parse_mp3_header(buf, pos):
+    """Retorna (versão, nch, sample_rate, tamanho_frame, offset_side_info, tamanho_side_info) ou None."""
+    if pos is None or pos + 4 > len(buf):
+        return None
+    b1, b2, b3 = buf[pos + 1], buf[pos + 2], buf[pos + 3]
+    if buf[pos] != 0xFF or b1 & 0xE0 != 0xE0:
+        return None
+    version_bits = (b1 >> 3) & 0x3
+    layer_bits = (b1 >> 1) & 0x3
+    if version_bits == 1 or layer_bits != 1:  # reservado / não é Layer III
+        return None
+    version = {3: 1, 2: 2, 0: 25}[version_bits]
+    bitrate_idx = b2 >> 4
+    sr_idx = (b2 >> 2) & 0x3
+    if bitrate_idx in (0, 15) or sr_idx == 3:
+        return None
+    bitrate = _MP3_BITRATES[1 if version == 1 else 2][bitrate_idx] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sr_idx]
+    padding = (b2 >> 1) & 0x1
+    nch = 1 if (b3 >> 6) == 3 else 2
+    crc = 2 if (b1 & 0x1) == 0 else 0
+    coef = 144 if version == 1 else 72
+    frame_len = coef * bitrate // sample_rate + padding
+    if version == 1:
+        side_len = 17 if nch == 1 else 32
+    else:
+        side_len = 9 if nch == 1 else 17
+    return version, nch, sample_rate, frame_len, 4 + crc, side_len
+
+
+def _mp3_side_fields(side_info, version, nch):
+    """
+    Extrai part2_3_length e global_gain de todos os grânulos/canais de uma vez.
+    side_info: matriz (n_frames, 32) uint8.
+    """
+    bits = np.unpackbits(side_info, axis=1)
+    if version == 1:
+        base, per_gc, granules = 9 + (5 if nch == 1 else 3) + 4 * nch, 59, 2
+    else:
+        base, per_gc, granules = 8 + (1 if nch == 1 else 2), 63, 1
+
+    def field_at(pos, width):
+        weights = 1 << np.arange(width - 1, -1, -1)
+        return bits[:, pos:pos + width].astype(np.int64) @ weights
+
+    part23 = []
+    gains = []
+    for gc in range(granules * nch):
+        start = base + per_gc * gc
+        part23.append(field_at(start, 12))
+        gains.append(field_at(start + 21, 8))
+    return np.stack(part23, axis=1), np.stack(gains, axis=1)
+
+
+def _profile_mp3(stream, head):
+    buf = head
+    base = 0
+    pos = 0
+    eof = False
+
+    def fill(needed):
+        nonlocal buf, eof
+        while len(buf) < needed and not eof:
+            more = _read(stream, READ_CHUNK)
+            if not more:
+                eof = True
+            buf += more
+        return len(buf) >= needed
+
+    # Pula tag ID3v2
+    if buf[:3] == b"ID3" and fill(10):
+        tag_size = 0
+        for b in buf[6:10]:
+            tag_size = (tag_size << 7) | (b & 0x7F)
+        pos = 10 + tag_size + (10 if buf[5] & 0x10 else 0)
+
+    offsets, sides = [], []
+    layout = None
+    data_end = 0
+    while True:
+        if not fill(pos + 4):
+            break
+        header = _parse_mp3_header(buf, pos)
+        if header is None or (layout and header[:3] != layout):
+            nxt = _find_mp3_sync(buf, pos + 1)
+            if nxt is None:
+                if eof:
+                    break
+                # Mantém o último byte (pode ser o início de um sync)
+                pos = len(buf) - 1
+                fill(len(buf) + 1)
+                continue
+            pos = nxt
+            continue
+        version, nch, sample_rate, frame_len, side_off, side_len = header
+        if not fill(pos + frame_len):
+            break  # último frame truncado
+        layout = layout or (version, nch, sample_rate)
+        side = buf[pos + side_off:pos + side_off + side_len]
+        sides.append(side.ljust(32, b"\x00"))
+        offsets.append(base + pos)
+        pos += frame_len
+        data_end = base + pos
+
+        # Compacta o buffer: memória limitada ao tamanho do bloco de leitura
+        if pos > READ_CHUNK:
+            buf = buf[pos:]
+            base += pos
+            pos = 0
+
+    if not offsets:
+        return AudioProfile(format="unknown", size=data_end)
+
+    version, nch, sample_rate = layout
+    samples_per_frame = 1152 if version == 1 else 576
+    side_info = np.frombuffer(b"".join(sides), dtype=np.uint8).reshape(-1, 32)
+    part23, gains = _mp3_side_fields(side_info, version, nch)
+
+    # Cada passo do global_gain = 1,5 dB; grânulo sem bits = silêncio digital
+    coded = part23 > 0
+    gain_db = np.where(coded, 1.5 * (gains - 210.0), SILENCE_DB)
+    frame_db = np.maximum(gain_db.max(axis=1), SILENCE_DB)
+    min_bits = int(os.environ.get("PRESCREEN_MP3_MIN_BITS", 64))
+
+    frame_s = samples_per_frame / float(sample_rate)
+    return AudioProfile(
+        format="mp3",
+        size=data_end,
+        duration_s=len(offsets) * frame_s,
+        frame_s=frame_s,
+        frame_offsets=np.asarray(offsets, dtype=np.int64),
+        frame_db=frame_db,
+        active=part23.sum(axis=1) >= min_bits,
+        data_end=data_end,
+    )
+
+
+# --- Decisão ---
+def prescreen(stream, cancel=None):
+    """
+    Decide se vale a pena enviar o áudio ao Gemini e onde cortar o silêncio.
+    Formato desconhecido nunca é rejeitado (o modelo decide).
+    cancel: threading.Event; sinalizado, a leitura para com PrescreenCancelled.
+    """
+    profile = profile_audio(_CancellableStream(stream, cancel) if cancel else stream)
+
+    if profile.size == 0:
+        return ScreenResult(accepted=False, profile=profile, reason="EMPTY")
+    if profile.format == "unknown":
+        return ScreenResult(accepted=True, profile=profile)
+
+    min_duration = _env_float("PRESCREEN_MIN_DURATION_S", 0.5)
+    min_active = _env_float("PRESCREEN_MIN_ACTIVE_S", 0.5)
+    if profile.frame_count == 0 or profile.duration_s < min_duration:
+        return ScreenResult(accepted=False, profile=profile, reason="TOO_SHORT")
+    if profile.active_seconds < min_active:
+        return ScreenResult(accepted=False, profile=profile, reason="SILENCE")
+
+    # Corte do silêncio inicial/final (com margem), só se economizar algo relevante
+    voiced = np.flatnonzero(profile.voiced_mask())
+    pad = int(round(_env_float("PRESCREEN_TRIM_PAD_S", 0.3) / profile.frame_s))
+    first = max(0, int(voiced[0]) - pad)
+    last = min(profile.frame_count, int(voiced[-1]) + 1 + pad)
+    saved_s = (first + profile.frame_count - last) * profile.frame_s
+    trim = None
+    if saved_s >= _env_float("PRESCREEN_MIN_TRIM_S", 1.0):
+        trim = profile.byte_range(first, last)
+    return ScreenResult(accepted=True, profile=profile, trim=trim, frames=(first, last))
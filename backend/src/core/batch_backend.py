@@ -0,0 +1,128 @@
+import itertools
+import json
+import os
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+from google.genai import types
+
+# Backends da fila "deferred" (análises sem urgência: treinos, re-scoring noturno).
+# Um job de lote recebe N requisições generate_content de uma vez e é consultado
+# depois (uma vez por execução do agendador), em vez de N chamadas síncronas.
+#
+# - GeminiBatchBackend: Batch API do Gemini (client.batches), requisições inline.
+# - FakeBatchBackend: backend local em memória para testes e desenvolvimento offline.
+
+DONE_STATES = ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED")
+FAILED_STATES = ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED")
+
+
+@dataclass
+class BatchRequest:
+    key: str          # session_id: volta no metadata da resposta
+    contents: list
+    config: object
+
+
+@dataclass
+class BatchPoll:
+    state: str
+    # key -> (resposta com .text/.parsed, ou None; mensagem de erro ou None)
+    results: dict = field(default_factory=dict)
+
+    @property
+    def done(self):
+        return self.state in DONE_STATES
+
+    @property
+    def failed(self):
+        return self.state in FAILED_STATES
+
+
+def _state_name(state):
+    return getattr(state, "name", None) or str(state)
+
+
+class GeminiBatchBackend:
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, model, requests, display_name=None):
+        """Cria o job com as requisições inline; retorna o nome do job (batches/...)."""
+        job = self.client.batches.create(
+            model=model,
+            src=[
+                types.InlinedRequest(contents=r.contents, config=r.config, metadata={"key": r.key})
+                for r in requests
+            ],
+            config=types.CreateBatchJobConfig(display_name=display_name) if display_name else None
+        )
+        return job.name
+
+    def poll(self, job_name, keys):
+        """Uma única consulta ao job. `keys` (ordem do submit) resolve respostas sem metadata."""
+        job = self.client.batches.get(name=job_name)
+        poll = BatchPoll(state=_state_name(job.state))
+        if not poll.done:
+            return poll
+
+        responses = getattr(job.dest, "inlined_responses", None) or []
+        for position, item in enumerate(responses):
+            key = (item.metadata or {}).get("key") or (keys[position] if position < len(keys) else None)
+            if key is None:
+                continue
+            error = getattr(item.error, "message", None) or (str(item.error) if item.error else None)
+            poll.results[key] = (item.response, error)
+        return poll
+
+
+class FakeBatchBackend:
+    """
+    Backend em memória: o job conclui após `polls_until_done` consultas e cada
+    resposta vem de `responder(request)` (texto JSON da análise).
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, responder=None, polls_until_done=0):
+        self.responder = responder or (lambda request: json.dumps({
+            "technical_score": 70,
+            "summary": "Análise local (backend de lote fake).",
+            "feedback": "Resultado gerado offline."
+        }))
+        self.polls_until_done = polls_until_done
+        self.jobs = {}  # nome -> {"requests": [...], "polls": n}
+
+    def submit(self, model, requests, display_name=None):
+        name = f"batches/fake-{next(self._ids)}"
+        self.jobs[name] = {"model": model, "requests": list(requests), "polls": 0}
+        return name
+
+    def poll(self, job_name, keys):
+        job = self.jobs.get(job_name)
+        if job is None:
+            return BatchPoll(state="JOB_STATE_FAILED")
+        job["polls"] += 1
+        if job["polls"] <= self.polls_until_done:
+            return BatchPoll(state="JOB_STATE_RUNNING")
+
+        poll = BatchPoll(state="JOB_STATE_SUCCEEDED")
+        for request in job["requests"]:
+            try:
+                poll.results[request.key] = (SimpleNamespace(text=self.responder(request), parsed=None), None)
+            except Exception as e:
+                poll.results[request.key] = (None, str(e))
+        return poll
+
+
+_FAKE_BACKEND = None
+
+
+def get_batch_backend(ai_client):
+    """BATCH_BACKEND=fake usa o backend local (um por container); padrão: Gemini."""
+    global _FAKE_BACKEND
+    if os.environ.get("BATCH_BACKEND", "gemini") == "fake":
+        if _FAKE_BACKEND is None:
+            _FAKE_BACKEND = FakeBatchBackend()
+        return _FAKE_BACKEND
+    return GeminiBatchBackend(ai_client)
@@ -0,0 +1,203 @@
+import os
+import time
+
+from botocore.exceptions import ClientError
+
+from core import metrics
+
+# Circuit breaker do Gemini, com estado compartilhado na tabela de controle.
+#
+#   CLOSED    -> chamadas normais; falhas transitórias contam numa janela
+#   OPEN      -> após BREAKER_FAILURE_THRESHOLD falhas na janela: ninguém chama o
+#                Gemini por BREAKER_OPEN_SECONDS (sessões vão para DEFERRED na hora)
+#   HALF_OPEN -> fim do OPEN: um único worker (lease de sonda) testa a API;
+#                sucesso fecha o circuito, falha reabre
+#
+# Durante uma indisponibilidade os workers falham rápido em vez de baixar do S3,
+# subir o áudio e fazer polling até o timeout da Lambda.
+
+CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_OPEN_SECONDS = 60
+PROBE_LEASE_SECONDS = 30
+# Quanto tempo um worker reaproveita o estado lido (evita um GetItem por chamada)
+STATE_CACHE_SECONDS = 2.0
+
+
+class CircuitOpenError(Exception):
+    """Circuito aberto: o Gemini está indisponível, a sessão deve ser adiada."""
+
+
+def _is_conditional_failure(error):
+    return error.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+
+class CircuitBreaker:
+    def __init__(self, table, key="breaker#gemini", failure_threshold=None,
+                 window_seconds=None, open_seconds=None):
+        self.table = table
+        self.key = key
+        self.failure_threshold = int(failure_threshold or os.environ.get(
+            "BREAKER_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD))
+        self.window_seconds = int(window_seconds or os.environ.get(
+            "BREAKER_WINDOW_SECONDS", DEFAULT_WINDOW_SECONDS))
+        self.open_seconds = int(open_seconds or os.environ.get(
+            "BREAKER_OPEN_SECONDS", DEFAULT_OPEN_SECONDS))
+        self._cached = None  # (lido_em, item)
+        self._probing = False  # este worker detém o lease de sonda do HALF_OPEN
+
+    # --- Estado ---
+    def _state(self, fresh=False):
+        now = time.time()
+        if not fresh and self._cached and now - self._cached[0] < STATE_CACHE_SECONDS:
+            return self._cached[1]
+        try:
+            item = self.table.get_item(Key={"control_key": self.key}, ConsistentRead=True).get("Item") or {}
+        except Exception as e:
+            # Sem tabela de controle não bloqueamos o tráfego (falha aberta do breaker)
+            print(f"Estado do circuit breaker indisponível: {str(e)}")
+            item = {}
+        self._cached = (now, item)
+        return item
+
+    def is_open(self):
+        """Leitura sem efeitos: True enquanto o Gemini não deve ser chamado por este worker."""
+        item = self._state()
+        now = time.time()
+        state = item.get("state", CLOSED)
+        if state == OPEN:
+            return now < float(item.get("opened_until", 0))
+        if state == HALF_OPEN and not self._probing:
+            return now < float(item.get("probe_until", 0))
+        return False
+
+    def allow(self):
+        """Antes de cada chamada. No fim do OPEN, só o worker que ganhar o lease de sonda passa."""
+        if not self.is_open():
+            item = self._state()
+            if item.get("state", CLOSED) == CLOSED or self._probing:
+                return True
+            return self._claim_probe()
+        metrics.incr("BreakerRejected")
+        return False
+
+    def _claim_probe(self):
+        now = int(time.time())
+        try:
+            self.table.update_item(
+                Key={"control_key": self.key},
+                UpdateExpression="SET #st = :half, probe_until = :lease",
+                ConditionExpression="(#st = :open AND opened_until <= :now) OR "
+                                    "(#st = :half AND probe_until <= :now)",
+                ExpressionAttributeNames={"#st": "state"},
+                ExpressionAttributeValues={
+                    ":half": HALF_OPEN, ":open": OPEN, ":now": now, ":lease": now + PROBE_LEASE_SECONDS
+                }
+            )
+        except ClientError as e:
+            if not _is_conditional_failure(e):
+                raise
+            self._state(fresh=True)
+            metrics.incr("BreakerRejected")
+            return False
+        self._probing = True
+        self._state(fresh=True)
+        print("Circuit breaker HALF_OPEN: este worker testa o Gemini.")
+        return True
+
+    # --- Resultado das chamadas ---
+    def record_success(self):
+        """
+        Sonda bem-sucedida fecha o circuito; no CLOSED, zera as falhas da janela.
+        Condicional ao estado esperado: um sucesso atrasado (visão em cache) nunca
+        sobrescreve um OPEN gravado por outro worker.
+        """
+        item = self._state()
+        probing = self._probing
+        if not probing and (item.get("state", CLOSED) != CLOSED or not item.get("failures")):
+            return  # Nada a zerar; OPEN/HALF_OPEN só quem detém a sonda fecha
+        try:
+            self.table.update_item(
+                Key={"control_key": self.key},
+                UpdateExpression="SET #st = :closed, failures = :zero "
+                                 "REMOVE window_start, opened_until, probe_until",
+                ConditionExpression="#st = :expected",
+                ExpressionAttributeNames={"#st": "state"},
+                ExpressionAttributeValues={
+                    ":closed": CLOSED, ":zero": 0, ":expected": HALF_OPEN if probing else CLOSED
+                }
+            )
+        except ClientError as e:
+            if not _is_conditional_failure(e):
+                raise
+            # Outro worker mudou o estado (ex: abriu o circuito): vale o dele
+            self._probing = False
+            self._state(fresh=True)
+            return
+        self._probing = False
+        self._state(fresh=True)
+        if probing:
+            print("Circuit breaker CLOSED: Gemini respondeu.")
+            metrics.incr("BreakerTransition", to=CLOSED)
+
+    def record_failure(self):
+        """Falha transitória (após as retentativas da chamada)."""
+        now = int(time.time())
+        if self._probing:
+            self._probing = False
+            self._open(now)
+            return
+        try:
+            # Mesma janela: soma a falha
+            response = self.table.update_item(
+                Key={"control_key": self.key},
+                UpdateExpression="ADD failures :one",
+                ConditionExpression="window_start > :floor AND #st = :closed",
+                ExpressionAttributeNames={"#st": "state"},
+                ExpressionAttributeValues={":one": 1, ":floor": now - self.window_seconds, ":closed": CLOSED},
+                ReturnValues="UPDATED_NEW"
+            )
+            failures = int(response["Attributes"]["failures"])
+        except ClientError as e:
+            if not _is_conditional_failure(e):
+                raise
+            item = self._state(fresh=True)
+            if item.get("state", CLOSED) != CLOSED:
+                return  # Já aberto/em sonda por outro worker
+            # Janela nova (ou primeiro registro), sem sobrescrever um OPEN concorrente
+            try:
+                self.table.put_item(
+                    Item={"control_key": self.key, "state": CLOSED, "failures": 1, "window_start": now},
+                    ConditionExpression="attribute_not_exists(control_key) OR #st = :closed",
+                    ExpressionAttributeNames={"#st": "state"},
+                    ExpressionAttributeValues={":closed": CLOSED}
+                )
+            except ClientError as put_error:
+                if not _is_conditional_failure(put_error):
+                    raise
+                return
+            failures = 1
+        metrics.incr("BreakerFailure")
+        if failures >= self.failure_threshold:
+            self._open(now)
+        else:
+            self._state(fresh=True)
+
+    def _open(self, now):
+        self.table.put_item(Item={
+            "control_key": self.key, "state": OPEN, "failures": 0,
+            "opened_until": now + self.open_seconds
+        })
+        self._state(fresh=True)
+        print(f"Circuit breaker OPEN por {self.open_seconds}s: Gemini indisponível.")
+        metrics.incr("BreakerTransition", to=OPEN)
+
+
+def get_circuit_breaker(db):
+    """Breaker na tabela de controle, ou None quando CONTROL_TABLE_NAME não está configurada."""
+    table_name = os.environ.get("CONTROL_TABLE_NAME")
+    if not table_name:
+        return None
+    return CircuitBreaker(db.Table(table_name))
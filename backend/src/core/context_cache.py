@@ -0,0 +1,110 @@
+import asyncio
+import os
+import time
+
+from google.genai import types
+
+from core import metrics
+from core.prompts import SYSTEM_INSTRUCTION, job_context, job_hash
+
+# Context caching do Gemini para a parte fixa do prompt + descrição da vaga.
+# Uma mesma vaga é reaproveitada por dezenas de candidatos: o cached content é
+# criado uma vez e cada análise envia só o áudio + a referência do cache.
+#
+# Registro em dois níveis:
+#   1. memória do container (warm start)
+#   2. tabela do cache de análises (item "ctx#<modelo>#<hash>"), compartilhada entre containers
+#
+# A criação passa pelo GeminiGateway (rate limiter + circuit breaker): com o Gemini
+# em 429 ou circuito aberto, a análise segue sem cache em vez de insistir na API.
+
+DEFAULT_TTL_SECONDS = 3600
+# O Gemini exige um mínimo de tokens para criar cache; abaixo disso nem tentamos
+DEFAULT_MIN_TOKENS = 1024
+# Não usar um cache que expira durante a análise
+EXPIRY_MARGIN_SECONDS = 120
+# Após falha na criação, espera antes de tentar de novo para a mesma vaga
+FAILURE_BACKOFF_SECONDS = 300
+
+
+def _estimate_tokens(text):
+    return len(text) // 4
+
+
+class ContextCacheRegistry:
+    def __init__(self, ttl_seconds=None, min_tokens=None):
+        self.ttl_seconds = ttl_seconds or int(os.environ.get("CONTEXT_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+        self.min_tokens = min_tokens or int(os.environ.get("CONTEXT_CACHE_MIN_TOKENS", DEFAULT_MIN_TOKENS))
+        self._entries = {}  # chave -> (nome do cached content ou None, expira_em)
+
+    def _valid(self, entry):
+        return entry is not None and entry[1] - EXPIRY_MARGIN_SECONDS > time.time()
+
+    async def lookup(self, gemini, model, job_description, table=None):
+        """Nome do cached content para (modelo, vaga) ou None quando não compensa/indisponível."""
+        context = job_context(job_description)
+        if not context or _estimate_tokens(SYSTEM_INSTRUCTION + context) < self.min_tokens:
+            return None
+
+        key = f"ctx#{model}#{job_hash(job_description)}"
+        entry = self._entries.get(key)
+        if self._valid(entry):
+            if entry[0]:
+                metrics.incr("ContextCacheHit", tier="memory")
+            return entry[0]
+
+        if table is not None:
+            entry = await asyncio.to_thread(self._load, table, key)
+            if self._valid(entry):
+                self._entries[key] = entry
+                metrics.incr("ContextCacheHit", tier="dynamodb")
+                return entry[0]
+
+        metrics.incr("ContextCacheMiss")
+        try:
+            cached = await gemini.create_cache(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=SYSTEM_INSTRUCTION,
+                    contents=[context],
+                    ttl=f"{self.ttl_seconds}s",
+                    display_name=f"job-{job_hash(job_description)[:16]}"
+                )
+            )
+        except Exception as e:
+            print(f"Context cache indisponível: {str(e)}")
+            metrics.incr("ContextCacheError")
+            self._entries[key] = (None, time.time() + FAILURE_BACKOFF_SECONDS + EXPIRY_MARGIN_SECONDS)
+            return None
+
+        expire_at = time.time() + self.ttl_seconds
+        if getattr(cached, "expire_time", None) is not None:
+            expire_at = cached.expire_time.timestamp()
+        entry = (cached.name, expire_at)
+        self._entries[key] = entry
+        if table is not None:
+            await asyncio.to_thread(self._store, table, key, entry)
+        return cached.name
+
+    @staticmethod
+    def _load(table, key):
+        try:
+            item = table.get_item(Key={"cache_key": key}).get("Item")
+        except Exception as e:
+            print(f"Registro de context cache indisponível (get): {str(e)}")
+            return None
+        if not item:
+            return None
+        return item["cached_content"], float(item["expire_at"])
+
+    @staticmethod
+    def _store(table, key, entry):
+        try:
+            table.put_item(Item={
+                "cache_key": key,
+                "cached_content": entry[0],
+                "expire_at": int(entry[1]),
+                "created_at": str(int(time.time()))
+            })
+        except Exception as e:
+            print(f"Registro de context cache indisponível (put): {str(e)}")
@@ -0,0 +1,74 @@
+import asyncio
+import math
+import os
+import time
+
+from core import metrics
+
+# Prazo da invocação (context.get_remaining_time_in_millis da Lambda).
+# Cada etapa lenta (upload, polling, generate) roda limitada ao tempo que sobra,
+# descontada uma reserva para salvar o progresso e responder. Sem tempo, a etapa
+# levanta DeadlineExceeded: o process_audio grava o que já foi feito e deixa a
+# sessão em RESUMABLE, e a próxima tentativa (Retry da Step Function) continua
+# de onde parou em vez de ser morta pelo timeout sem salvar nada.
+# Sem contexto de Lambda (testes, scripts) o prazo é infinito.
+
+DEFAULT_RESERVE_SECONDS = 5.0
+
+
+class DeadlineExceeded(Exception):
+    """Tempo da invocação acabando: progresso salvo, sessão retomável (RESUMABLE)."""
+
+
+class Deadline:
+    def __init__(self, remaining_ms=None, reserve_seconds=None):
+        self.reserve_seconds = float(
+            reserve_seconds if reserve_seconds is not None
+            else os.environ.get("DEADLINE_RESERVE_SECONDS", DEFAULT_RESERVE_SECONDS)
+        )
+        self._end = None if remaining_ms is None else time.monotonic() + remaining_ms / 1000.0
+
+    @classmethod
+    def from_context(cls, context):
+        getter = getattr(context, "get_remaining_time_in_millis", None)
+        return cls(getter() if callable(getter) else None)
+
+    @property
+    def bounded(self):
+        return self._end is not None
+
+    def remaining(self):
+        """Segundos úteis (já sem a reserva); infinito sem prazo."""
+        if self._end is None:
+            return math.inf
+        return self._end - time.monotonic() - self.reserve_seconds
+
+    def budget(self, cap=None):
+        """Quanto uma espera/chamada pode durar: min(cap, restante), nunca negativo."""
+        remaining = max(0.0, self.remaining())
+        return remaining if cap is None else min(cap, remaining)
+
+    def require(self, seconds, stage):
+        """Levanta DeadlineExceeded se não sobram `seconds` para a etapa."""
+        if self.remaining() < seconds:
+            metrics.incr("DeadlineExceeded", stage=stage)
+            raise DeadlineExceeded(
+                f"Sem tempo para {stage}: restam {max(0.0, self.remaining()):.1f}s (mínimo {seconds:.0f}s)"
+            )
+
+    async def run(self, coro, stage, min_seconds=0):
+        """Executa `coro` limitado ao prazo; estourou o prazo = DeadlineExceeded."""
+        try:
+            self.require(min_seconds, stage)
+        except DeadlineExceeded:
+            coro.close()
+            raise
+        if self._end is None:
+            return await coro
+        try:
+            return await asyncio.wait_for(coro, self.budget())
+        except TimeoutError:
+            if self.remaining() > 0:
+                raise  # Timeout da própria etapa, não do prazo da invocação
+            metrics.incr("DeadlineExceeded", stage=stage)
+            raise DeadlineExceeded(f"Prazo da invocação esgotado durante {stage}")
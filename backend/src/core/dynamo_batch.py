@@ -0,0 +1,56 @@
+import random
+import time
+
+# Operações em lote do DynamoDB (BatchGetItem / BatchWriteItem) com o mesmo laço:
+# pedido dividido em blocos no limite da API, e o que volta em UnprocessedKeys /
+# UnprocessedItems (throttling, limite de 16 MB) é reenviado com backoff exponencial
+# + jitter total até MAX_ATTEMPTS. O que sobrar é devolvido para quem chamou decidir
+# (o get_session devolve os ids em "unprocessed", o batch de criação em "failed").
+# Funciona com o client ou com o resource: os itens e chaves vão e voltam no formato
+# de quem chamou.
+
+GET_CHUNK = 100
+WRITE_CHUNK = 25
+MAX_ATTEMPTS = 5
+BASE_DELAY = 0.05
+
+
+def _send(call, request, unprocessed_field, on_response=None):
+    """Chama até MAX_ATTEMPTS vezes reenviando só o que não foi processado; devolve o que sobrou."""
+    for attempt in range(MAX_ATTEMPTS):
+        response = call(RequestItems=request)
+        if on_response:
+            on_response(response)
+        request = response.get(unprocessed_field) or {}
+        if not request:
+            break
+        if attempt + 1 < MAX_ATTEMPTS:
+            time.sleep(random.uniform(0, BASE_DELAY * (2 ** attempt)))
+    return request
+
+
+def batch_get(db, table_name, keys, **projection):
+    """
+    BatchGetItem em blocos de GET_CHUNK chaves (`projection`: ProjectionExpression e
+    ExpressionAttributeNames). Retorna (itens, chaves_não_processadas), sem ordem garantida.
+    """
+    items = []
+    unprocessed = []
+    for start in range(0, len(keys), GET_CHUNK):
+        request = {table_name: {'Keys': keys[start:start + GET_CHUNK], **projection}}
+        left = _send(db.batch_get_item, request, 'UnprocessedKeys',
+                     lambda response: items.extend(response.get('Responses', {}).get(table_name, [])))
+        if left:
+            unprocessed.extend(left[table_name]['Keys'])
+    return items, unprocessed
+
+
+def batch_put(db, table_name, items):
+    """BatchWriteItem (PutRequest) em blocos de WRITE_CHUNK itens. Retorna os itens não gravados."""
+    unprocessed = []
+    for start in range(0, len(items), WRITE_CHUNK):
+        request = {table_name: [{'PutRequest': {'Item': item}} for item in items[start:start + WRITE_CHUNK]]}
+        left = _send(db.batch_write_item, request, 'UnprocessedItems')
+        if left:
+            unprocessed.extend(r['PutRequest']['Item'] for r in left[table_name])
+    return unprocessed
@@ -0,0 +1,90 @@
+import base64
+import json
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary
+
+# Serialização JSON de itens do DynamoDB (respostas da API).
+#
+# Itens do boto3 resource (Decimal, set, Binary): um único encoder reaproveitado,
+# com `default` só para os tipos do DynamoDB — o resto do item é serializado pelo
+# encoder em C. Decimal inteiro vira int, fracionário vira float (inclusive
+# negativos: -1.5 continua -1.5).
+#
+# Itens do boto3 client (formato {"N": "85"}): from_attribute_value converte os
+# valores direto para tipos JSON, sem passar pelo TypeDeserializer/Decimal. É o
+# caminho das leituras do get_session (GetItem/BatchGetItem pelo client).
+
+
+_MAX_EXACT_FLOAT = 2 ** 53
+
+
+def _from_float(number, exact):
+    if not number.is_integer():
+        return number
+    if -_MAX_EXACT_FLOAT < number < _MAX_EXACT_FLOAT:
+        return int(number)
+    return int(Decimal(exact))
+
+
+def _number(value):
+    # float() é a conversão mais barata de Decimal e já decide o tipo.
+    # Inteiros além de 2**53 não cabem exatos no float: vão pelo Decimal.
+    return _from_float(float(value), value)
+
+
+def _parse_number(text):
+    # "N" do client: sem ponto/expoente é inteiro (caso comum, sem Decimal)
+    if "." in text or "e" in text or "E" in text:
+        return _from_float(float(text), text)
+    return int(text)
+
+
+def _binary(value):
+    if isinstance(value, Binary):
+        value = value.value
+    return base64.b64encode(value).decode("ascii")
+
+
+def _default(o):
+    if type(o) is Decimal:
+        return _number(o)
+    if isinstance(o, (set, frozenset)):
+        # SS/NS/BS: lista ordenada (saída determinística, útil para ETag/cache)
+        return sorted(_default(v) if not isinstance(v, str) else v for v in o)
+    if isinstance(o, (Binary, bytes, bytearray)):
+        return _binary(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+_ENCODER = json.JSONEncoder(default=_default, ensure_ascii=False)
+
+
+def dumps(value):
+    """JSON de um item (ou parte) do boto3 resource."""
+    return _ENCODER.encode(value)
+
+
+_ATTRIBUTE_VALUES = {
+    "S": lambda v: v,
+    "N": _parse_number,
+    "BOOL": lambda v: v,
+    "NULL": lambda v: None,
+    "M": lambda v: {k: from_attribute_value(x) for k, x in v.items()},
+    "L": lambda v: [from_attribute_value(x) for x in v],
+    "SS": sorted,
+    "NS": lambda v: sorted(_parse_number(x) for x in v),
+    "B": _binary,
+    "BS": lambda v: sorted(_binary(x) for x in v),
+}
+
+
+def from_attribute_value(attribute):
+    """{"N": "85"} -> 85, {"M": {...}} -> dict etc. (formato do boto3 client)."""
+    (tag, value), = attribute.items()
+    return _ATTRIBUTE_VALUES[tag](value)
+
+
+def item_from_client(item):
+    """Item do client (get_item/query/batch_get_item) já em tipos JSON."""
+    return {k: from_attribute_value(v) for k, v in item.items()}
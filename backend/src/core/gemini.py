@@ -0,0 +1,192 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+from core import metrics
+from core.circuit_breaker import CircuitOpenError
+from core.rate_limiter import RateLimitExceeded
+
+# Fachada assíncrona sobre o client google-genai.
+# - use_aio=False: chama o client síncrono em uma thread (uma sessão por invocação).
+# - use_aio=True: usa client.aio (modo lote: várias sessões no mesmo event loop).
+# O pipeline do process_audio só conversa com esta fachada, então os dois modos
+# compartilham exatamente o mesmo fluxo.
+# Com um limiter (core.rate_limiter), upload, geração e criação de context cache só
+# saem com cota disponível — cada tentativa (inclusive retentativas) consome a sua;
+# um 429 mesmo assim zera o balde compartilhado e vira RateLimitExceeded (adiar).
+# Cada operação tem a sua política de retentativa (backoff exponencial com jitter
+# total) só para erros transitórios; esgotadas as tentativas, a falha alimenta o
+# circuit breaker compartilhado (core.circuit_breaker). Circuito aberto =
+# CircuitOpenError antes de qualquer chamada.
+# generate_stream entrega o texto acumulado a cada chunk (feedback parcial); uma
+# retentativa recomeça o stream do zero.
+# O upload sempre usa o client síncrono numa thread: o arquivo é lido com read()
+# bloqueante, o que no client.aio aconteceria dentro do event loop.
+
+TRANSIENT_STATUS_CODES = (500, 502, 503, 504)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int
+    base_delay: float
+    max_delay: float
+
+    def delay(self, attempt):
+        """Jitter total: uniforme em [0, min(max, base * 2^tentativa)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+# files.get é barato e idempotente; generate é caro e lento, então tenta menos vezes
+DEFAULT_RETRY_POLICIES = {
+    "upload": RetryPolicy(attempts=3, base_delay=1.0, max_delay=4.0),
+    "get": RetryPolicy(attempts=4, base_delay=0.5, max_delay=2.0),
+    "generate": RetryPolicy(attempts=2, base_delay=2.0, max_delay=6.0),
+    "cache": RetryPolicy(attempts=2, base_delay=1.0, max_delay=4.0),
+}
+
+
+@dataclass(frozen=True)
+class StreamedResponse:
+    """Resposta montada a partir dos chunks (mesma interface que o parse_analysis usa)."""
+    text: str
+    parsed: Any = None
+
+
+def is_transient(error):
+    """5xx do Gemini, timeouts e falhas de conexão: vale tentar de novo."""
+    if getattr(error, "code", None) in TRANSIENT_STATUS_CODES:
+        return True
+    return isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError))
+
+
+class GeminiGateway:
+    def __init__(self, client, use_aio=False, limiter=None, breaker=None, retry_policies=None):
+        self.client = client
+        self.use_aio = use_aio
+        self.limiter = limiter
+        self.breaker = breaker
+        self.retry_policies = retry_policies or DEFAULT_RETRY_POLICIES
+
+    async def available(self):
+        """False quando o circuito está aberto (checagem barata antes de começar o trabalho)."""
+        if self.breaker is None:
+            return True
+        return not await asyncio.to_thread(self.breaker.is_open)
+
+    async def record_failure(self):
+        """Falha observada fora de uma chamada (ex: arquivo preso em PROCESSING)."""
+        if self.breaker:
+            await asyncio.to_thread(self.breaker.record_failure)
+
+    async def _invoke(self, service, method, **kwargs):
+        target = self.client.aio if self.use_aio else self.client
+        fn = getattr(getattr(target, service), method)
+        if self.use_aio:
+            return await fn(**kwargs)
+        return await asyncio.to_thread(fn, **kwargs)
+
+    async def _invoke_sync(self, service, method, **kwargs):
+        """Client síncrono numa thread mesmo no modo aio (chamadas que leem arquivos bloqueantes)."""
+        return await asyncio.to_thread(getattr(getattr(self.client, service), method), **kwargs)
+
+    async def _stream(self, on_text, service, method, **kwargs):
+        """Consome o stream (sync numa thread, ou client.aio) e chama on_text(texto_acumulado) no event loop."""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        parts = []
+
+        def deliver(text):
+            if not parts:
+                metrics.timing("GeminiFirstChunkMs", (time.perf_counter() - start) * 1000)
+            parts.append(text)
+            on_text("".join(parts))
+
+        if self.use_aio:
+            stream = await getattr(self.client.aio.models, method)(**kwargs)
+            async for chunk in stream:
+                if getattr(chunk, "text", None):
+                    deliver(chunk.text)
+        else:
+            def consume():
+                for chunk in getattr(self.client.models, method)(**kwargs):
+                    if getattr(chunk, "text", None):
+                        loop.call_soon_threadsafe(deliver, chunk.text)
+
+            await asyncio.to_thread(consume)
+            await asyncio.sleep(0)  # entrega os chunks agendados antes de devolver o texto
+        return StreamedResponse("".join(parts))
+
+    async def _call(self, operation, service, method, invoke=None, quota=None, **kwargs):
+        """quota: kwargs do limiter.acquire, cobrados a cada tentativa (None = sem cota)."""
+        invoke = invoke or self._invoke
+        if self.breaker and not await asyncio.to_thread(self.breaker.allow):
+            raise CircuitOpenError(f"Circuit breaker aberto: {service}.{method} não enviado")
+
+        policy = self.retry_policies.get(operation) or DEFAULT_RETRY_POLICIES[operation]
+        for attempt in range(policy.attempts):
+            if attempt and hasattr(kwargs.get("file"), "seek"):
+                kwargs["file"].seek(0)  # Upload parcial: reenvia o stream desde o início
+            if quota is not None and self.limiter:
+                await self.limiter.acquire(**quota)  # Retentativa também é requisição para a cota
+            try:
+                result = await invoke(service, method, **kwargs)
+            except Exception as e:
+                if getattr(e, "code", None) == 429 and self.limiter is not None:
+                    await asyncio.to_thread(self.limiter.drain)
+                    raise RateLimitExceeded(f"Gemini respondeu 429 em {service}.{method}: {str(e)}") from e
+                if not is_transient(e):
+                    raise
+                if attempt + 1 >= policy.attempts:
+                    if self.breaker:
+                        await asyncio.to_thread(self.breaker.record_failure)
+                    raise
+                delay = policy.delay(attempt)
+                print(f"Falha transitória em {service}.{method} ({str(e)}); nova tentativa em {delay:.1f}s")
+                metrics.incr("GeminiRetry", operation=operation)
+                await asyncio.sleep(delay)
+            else:
+                if self.breaker:
+                    await asyncio.to_thread(self.breaker.record_success)
+                return result
+
+    async def upload(self, file, config):
+        """
+        O upload do SDK chama file.read() direto; com o stream do S3 (GETs por faixa,
+        bloqueantes) isso travaria o event loop do lote, então sempre roda numa thread.
+        """
+        return await self._call("upload", "files", "upload", invoke=self._invoke_sync,
+                                quota={"operation": "upload"}, file=file, config=config)
+
+    async def get_file(self, name):
+        return await self._call("get", "files", "get", name=name)
+
+    async def count_tokens(self, model, contents):
+        """total_tokens da entrada (chamada barata, sem cota de geração)."""
+        response = await self._call("get", "models", "count_tokens", model=model, contents=contents)
+        return int(response.total_tokens)
+
+    async def create_cache(self, model, config):
+        """caches.create (context cache da vaga): conta como requisição no limiter."""
+        return await self._call("cache", "caches", "create", quota={"operation": "cache"},
+                                model=model, config=config)
+
+    async def generate(self, model, contents, config, tokens=0):
+        """`tokens`: estimativa (entrada + saída) consumida do limite de tokens/min a cada tentativa."""
+        return await self._call(
+            "generate", "models", "generate_content", quota={"tokens": tokens, "operation": "generate"},
+            model=model, contents=contents, config=config
+        )
+
+    async def generate_stream(self, model, contents, config, on_text, tokens=0):
+        """generate_content_stream: on_text(texto_acumulado) a cada chunk; devolve StreamedResponse."""
+        return await self._call(
+            "generate", "models", "generate_content_stream",
+            quota={"tokens": tokens, "operation": "generate"},
+            invoke=lambda service, method, **kwargs: self._stream(on_text, service, method, **kwargs),
+            model=model, contents=contents, config=config
+        )
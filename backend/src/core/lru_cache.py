@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+
+from core import metrics
+
+# LRU com TTL em memória do container (sobrevive entre invocações no warm start).
+# Limitado em entradas: a entrada menos usada sai quando a capacidade estoura.
+# Hits/misses/evictions ficam em contadores no objeto e viram métricas
+# "<nome>Hit", "<nome>Miss" e "<nome>Eviction".
+
+
+class LRUCache:
+    def __init__(self, max_entries, ttl_seconds, name="LRUCache"):
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = float(ttl_seconds)
+        self.name = name
+        self._entries = OrderedDict()  # chave -> (valor, expira_em)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            metrics.incr(f"{self.name}Miss")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        metrics.incr(f"{self.name}Hit")
+        return entry[0]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            metrics.incr(f"{self.name}Eviction")
+
+    def clear(self):
+        self._entries.clear()
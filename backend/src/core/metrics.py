@@ -0,0 +1,107 @@
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Métricas leves para Lambda:
+# - Cada ponto é impresso no formato EMF (Embedded Metric Format); o CloudWatch
+#   Logs transforma em métrica sem chamadas extras de API (PutMetricData).
+# - Os valores também são acumulados em memória (útil em testes e no warm start).
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "MockInterviewAI")
+
+_COUNTERS = defaultdict(float)
+
+
+def _key(name, dimensions):
+    if not dimensions:
+        return name
+    dims = ",".join(f"{k}={v}" for k, v in sorted(dimensions.items()))
+    return f"{name}|{dims}"
+
+
+def put_metric(name, value=1, unit="Count", **dimensions):
+    """Registra um ponto de métrica (memória + log EMF)."""
+    _COUNTERS[_key(name, dimensions)] += value
+
+    dimensions = {k: str(v) for k, v in dimensions.items()}
+    payload = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [sorted(dimensions.keys())],
+                "Metrics": [{"Name": name, "Unit": unit}]
+            }]
+        },
+        name: value,
+        **dimensions
+    }
+    print(json.dumps(payload))
+
+
+def incr(name, value=1, **dimensions):
+    put_metric(name, value, "Count", **dimensions)
+
+
+def timing(name, millis, **dimensions):
+    put_metric(name, round(millis, 3), "Milliseconds", **dimensions)
+
+
+@contextmanager
+def timer(name, **dimensions):
+    """Mede o bloco em milissegundos: `with timer("GeminiUploadMs"): ...`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing(name, (time.perf_counter() - start) * 1000, **dimensions)
+
+
+def snapshot():
+    """Cópia dos valores acumulados neste container (chave: 'Nome|dim=valor')."""
+    return dict(_COUNTERS)
+
+
+def get(name, **dimensions):
+    return _COUNTERS.get(_key(name, dimensions), 0)
+
+
+def reset():
+    _COUNTERS.clear()
+
+
+class Timeline:
+    """
+    Linha do tempo por estágio de um pipeline com etapas concorrentes.
+    Cada estágio registra (início, fim) relativos ao começo do pipeline; no final
+    emite StageMs por estágio e PipelineMs (o caminho crítico real, de ponta a ponta).
+    """
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter() - self._origin
+        try:
+            yield
+        finally:
+            self.stages[name] = (start, time.perf_counter() - self._origin)
+
+    async def run(self, name, awaitable):
+        with self.stage(name):
+            return await awaitable
+
+    def emit(self, **dimensions):
+        for name, (start, end) in self.stages.items():
+            timing("StageMs", (end - start) * 1000, stage=name, **dimensions)
+        total = max((end for _, end in self.stages.values()), default=0.0)
+        busy = sum(end - start for start, end in self.stages.values())
+        timing("PipelineMs", total * 1000, **dimensions)
+        ordered = sorted(self.stages.items(), key=lambda kv: kv[1][0])
+        print("Linha do tempo: " + " | ".join(
+            f"{name} {start * 1000:.0f}-{end * 1000:.0f}ms" for name, (start, end) in ordered
+        ) + f" | total {total * 1000:.0f}ms (soma serial {busy * 1000:.0f}ms)")
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, replace
+from decimal import Decimal
+from typing import Optional
+
+# Roteamento de modelo por tamanho da entrada.
+# A tabela de rotas (ordem = preferência) é configurável por MODEL_ROUTES (JSON);
+# a primeira rota cujos limites comportam a medição vence, e a última é o
+# fallback. Clipes curtos vão para o modelo mais rápido; gravações muito longas
+# para um modelo de contexto longo.
+#
+# Medição: duração (AudioProfile da pré-triagem) -> tokens estimados (32 tokens/s
+# de áudio + texto). Formato desconhecido não tem duração: a estimativa por bytes
+# é provisória e o process_audio confirma com count_tokens antes de gerar.
+
+AUDIO_TOKENS_PER_SECOND = 32
+ASSUMED_AUDIO_BYTES_PER_SECOND = 16000  # 128 kbps, quando o formato não é reconhecido
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    name: str
+    model: str
+    max_seconds: Optional[float] = None
+    max_bytes: Optional[int] = None
+    max_tokens: Optional[int] = None
+
+    def fits(self, measure):
+        limits = ((self.max_seconds, measure.duration_s), (self.max_bytes, measure.size),
+                  (self.max_tokens, measure.tokens))
+        return all(limit is None or value <= limit for limit, value in limits)
+
+
+@dataclass(frozen=True)
+class AudioMeasure:
+    duration_s: float
+    size: int
+    tokens: int
+    token_source: str  # "duration" | "bytes" | "count_tokens"
+
+    @property
+    def exact(self):
+        return self.token_source != "bytes"
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: ModelRoute
+    measure: AudioMeasure
+
+    @property
+    def model(self):
+        return self.route.model
+
+    def record(self, decision_ms, generate_ms):
+        """Atributo gravado na sessão (DynamoDB não aceita float: Decimal)."""
+        return {
+            "route": self.route.name,
+            "model": self.route.model,
+            "duration_s": Decimal(str(round(self.measure.duration_s, 2))),
+            "bytes": self.measure.size,
+            "tokens": self.measure.tokens,
+            "token_source": self.measure.token_source,
+            "decision_ms": int(decision_ms),
+            "generate_ms": int(generate_ms),
+        }
+
+
+DEFAULT_ROUTES = (
+    ModelRoute("fast", "gemini-2.5-flash-lite", max_seconds=90, max_tokens=8_000),
+    ModelRoute("standard", "gemini-2.5-flash-native-audio-preview-09-2025", max_seconds=1200, max_tokens=100_000),
+    ModelRoute("long_context", "gemini-2.5-pro"),
+)
+
+
+def _load_routes():
+    raw = os.environ.get("MODEL_ROUTES")
+    if not raw:
+        return DEFAULT_ROUTES
+    try:
+        routes = tuple(ModelRoute(**entry) for entry in json.loads(raw))
+    except (TypeError, ValueError) as e:
+        print(f"MODEL_ROUTES inválido ({str(e)}): usando a tabela padrão.")
+        return DEFAULT_ROUTES
+    return routes or DEFAULT_ROUTES
+
+
+class ModelRouter:
+    def __init__(self, routes=None):
+        self.routes = tuple(routes) if routes else _load_routes()
+        # Versão da tabela: entra na chave do cache de análises (o modelo é função da tabela + áudio)
+        self.version = hashlib.sha256(
+            json.dumps([asdict(r) for r in self.routes], sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+
+    def measure(self, duration_s, size, prompt_text=""):
+        """Medição inicial; sem duração conhecida, estima pelos bytes."""
+        text_tokens = len(prompt_text) // 4
+        if duration_s:
+            return AudioMeasure(duration_s, size, int(duration_s * AUDIO_TOKENS_PER_SECOND) + text_tokens, "duration")
+        estimated_s = size / ASSUMED_AUDIO_BYTES_PER_SECOND
+        return AudioMeasure(estimated_s, size, int(estimated_s * AUDIO_TOKENS_PER_SECOND) + text_tokens, "bytes")
+
+    def with_counted_tokens(self, measure, tokens):
+        """Medição corrigida com o total do count_tokens (duração derivada dos tokens)."""
+        duration_s = measure.duration_s if measure.exact else int(tokens) / AUDIO_TOKENS_PER_SECOND
+        return replace(measure, tokens=int(tokens), token_source="count_tokens", duration_s=duration_s)
+
+    def route(self, measure):
+        for route in self.routes:
+            if route.fits(measure):
+                return RouteDecision(route, measure)
+        return RouteDecision(self.routes[-1], measure)
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import time
+
+from botocore.exceptions import ClientError
+
+from core import metrics
+from core.response_parser import partial_fields
+
+# Feedback parcial durante a geração em streaming.
+# Cada chunk atualiza o texto em memória; a gravação na sessão (partial_feedback)
+# acontece no máximo a cada `interval` segundos e só se o texto cresceu pelo menos
+# `min_chars` — chunks entre duas gravações são coalescidos numa única escrita
+# (WCU limitado independente do número de chunks). O primeiro trecho vai na hora:
+# o candidato vê algo no tempo do primeiro chunk, não da resposta inteira.
+# A escrita é condicional a PROCESSING, então nunca sobrescreve o resultado final.
+
+DEFAULT_MIN_CHARS = 80
+
+
+def partial_feedback_interval():
+    """Intervalo entre gravações (s), ou None quando o streaming está desligado."""
+    value = os.environ.get("PARTIAL_FEEDBACK_INTERVAL_SECONDS")
+    return float(value) if value else None
+
+
+class PartialFeedbackWriter:
+    def __init__(self, table, session_id, interval, min_chars=DEFAULT_MIN_CHARS):
+        self.table = table
+        self.session_id = session_id
+        self.interval = interval
+        self.min_chars = min_chars
+        self._latest = None
+        self._latest_size = 0
+        self._written_size = 0
+        self._last_write = None
+        self._task = None
+        self._writing = False
+        self.writes = 0
+
+    def update(self, text):
+        """Chamado a cada chunk (no event loop) com o texto acumulado da resposta."""
+        fields = partial_fields(text)
+        size = sum(len(v) for v in fields.values())
+        if size <= self._latest_size:
+            return
+        self._latest, self._latest_size = fields, size
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self._task is not None and not self._task.done():
+            return  # Escrita já agendada: leva o texto mais novo quando sair
+        if self._latest_size - self._written_size < (self.min_chars if self._last_write else 1):
+            return
+        delay = 0.0
+        if self._last_write is not None:
+            delay = max(0.0, self.interval - (time.monotonic() - self._last_write))
+        self._task = asyncio.ensure_future(self._flush(delay))
+
+    async def _flush(self, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        fields, size = self._latest, self._latest_size
+        self._writing = True
+        self._last_write = time.monotonic()
+        try:
+            await asyncio.to_thread(self._write, fields)
+        except Exception as e:
+            # Feedback parcial é melhor esforço: nunca derruba a geração
+            if isinstance(e, ClientError) and e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return  # Sessão já saiu de PROCESSING
+            print(f"Falha ao gravar feedback parcial: {str(e)}")
+            metrics.incr("PartialFeedbackWriteErrors")
+            return
+        finally:
+            self._writing = False
+        self._written_size = size
+        self.writes += 1
+        metrics.incr("PartialFeedbackWrites")
+        # Texto que chegou durante a escrita: agenda a próxima (respeitando o intervalo)
+        self._task = None
+        self._maybe_flush()
+
+    def _write(self, fields):
+        self.table.update_item(
+            Key={'session_id': self.session_id},
+            UpdateExpression="SET partial_feedback = :partial",
+            ConditionExpression="#s = :processing",
+            ExpressionAttributeNames={'#s': 'status'},
+            ExpressionAttributeValues={
+                ':partial': {**fields, 'updated_at': int(time.time())},
+                ':processing': 'PROCESSING'
+            }
+        )
+
+    async def close(self):
+        """
+        Cancela a escrita ainda agendada e espera a que já saiu: o resultado final é
+        gravado depois, sem corrida. Nunca levanta erro.
+        """
+        while self._task is not None and not self._task.done():
+            task = self._task
+            if not self._writing:
+                task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                print(f"Falha ao encerrar feedback parcial: {str(e)}")
@@ -0,0 +1,59 @@
+import hashlib
+from functools import lru_cache
+
+# Templates do prompt de análise.
+# A parte estática (papel + regras + formato) é montada uma única vez no import;
+# só o bloco da vaga varia por sessão e é memoizado por job_description.
+
+SYSTEM_INSTRUCTION = """Você é um Recrutador Técnico Sênior.
+Sua tarefa é analisar o áudio fornecido.
+
+REGRAS CRÍTICAS:
+1. Analise APENAS o áudio.
+2. Se silêncio/ruído, retorne {"error": "AUDIO_INAUDIVEL"}.
+
+Formato de Resposta (JSON Puro):
+{
+    "technical_score": (0-100),
+    "summary": "Resumo",
+    "feedback": "Feedback"
+}"""
+
+JOB_CONTEXT_TEMPLATE = """CONTEXTO DA VAGA:
+"{job_description}"
+Avalie se o candidato demonstra os conhecimentos exigidos."""
+
+# Texto curto que acompanha o áudio quando não há contexto de vaga
+ANALYZE_INSTRUCTION = "Analise o áudio da resposta do candidato."
+
+# Análise segmentada: cada trecho é avaliado isoladamente e depois consolidado
+SEGMENT_NOTE_TEMPLATE = """Este áudio é o trecho {index} de {total} da entrevista ({start} a {end}).
+Avalie apenas o que aparece neste trecho; o resultado será consolidado com os demais."""
+
+# Versão derivada do próprio template: qualquer edição invalida o cache de análises
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_INSTRUCTION + JOB_CONTEXT_TEMPLATE + ANALYZE_INSTRUCTION + SEGMENT_NOTE_TEMPLATE).encode("utf-8")
+).hexdigest()[:12]
+
+
+def job_hash(job_description):
+    return hashlib.sha256((job_description or "").encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=256)
+def job_context(job_description):
+    """Bloco da vaga (vazio quando não há descrição)."""
+    if not job_description:
+        return ""
+    return JOB_CONTEXT_TEMPLATE.format(job_description=job_description)
+
+
+def user_turn(job_description):
+    """Texto enviado junto com o áudio quando o system instruction vai à parte."""
+    return job_context(job_description) or ANALYZE_INSTRUCTION
+
+
+def segment_turn(base_turn, index, total, start, end):
+    """Texto do turno de um trecho: turno normal + posição do trecho na entrevista."""
+    note = SEGMENT_NOTE_TEMPLATE.format(index=index, total=total, start=start, end=end)
+    return f"{base_turn}\n\n{note}"
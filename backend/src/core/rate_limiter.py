@@ -0,0 +1,148 @@
+import asyncio
+import os
+import random
+import time
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+from core import metrics
+
+# Token bucket distribuído para as chamadas ao Gemini.
+# Todas as Lambdas concorrentes (unitária, lote, deferred) consomem do mesmo item
+# na tabela de controle: requisições/min e tokens/min, com reposição contínua.
+# Cada consumo é um PutItem condicional (lock otimista em updated_at): sem
+# servidor central e sem perder atualizações entre workers.
+#
+# Sem cota disponível o worker espera (asyncio.sleep) até RATE_LIMIT_MAX_WAIT_SECONDS;
+# além disso levanta RateLimitExceeded e a sessão é adiada (Retry dedicado na
+# Step Function), em vez de martelar a API e receber 429.
+
+DEFAULT_RPM = 60
+DEFAULT_TPM = 1_000_000
+DEFAULT_MAX_WAIT_SECONDS = 20.0
+# Estimativa para chamadas sem contagem (ex: files.upload não consome tokens do modelo)
+DEFAULT_REQUEST_TOKENS = 0
+MAX_CONFLICT_RETRIES = 20
+
+
+class RateLimitExceeded(Exception):
+    """Sem cota do Gemini dentro do tempo máximo de espera: adiar a sessão."""
+
+
+def _decimal(value):
+    return Decimal(str(round(value, 3)))
+
+
+class TokenBucketLimiter:
+    def __init__(self, table, key="rate#gemini", rpm=None, tpm=None, max_wait_seconds=None):
+        self.table = table
+        self.key = key
+        self.rpm = float(rpm or os.environ.get("GEMINI_RPM", DEFAULT_RPM))
+        self.tpm = float(tpm or os.environ.get("GEMINI_TPM", DEFAULT_TPM))
+        self.max_wait_seconds = float(
+            max_wait_seconds if max_wait_seconds is not None
+            else os.environ.get("RATE_LIMIT_MAX_WAIT_SECONDS", DEFAULT_MAX_WAIT_SECONDS)
+        )
+
+    def _load(self):
+        item = self.table.get_item(Key={"control_key": self.key}, ConsistentRead=True).get("Item")
+        if not item:
+            return None, self.rpm, self.tpm
+        return int(item["updated_at"]), float(item["requests"]), float(item["tokens"])
+
+    def _refill(self, updated_at, requests, tokens, now_ms):
+        if updated_at is None:
+            return requests, tokens
+        elapsed = max(0.0, (now_ms - updated_at) / 1000.0)
+        return (
+            min(self.rpm, requests + elapsed * self.rpm / 60.0),
+            min(self.tpm, tokens + elapsed * self.tpm / 60.0),
+        )
+
+    def _store(self, previous, requests, tokens, now_ms):
+        """Grava o novo saldo só se ninguém mexeu no item desde a leitura."""
+        params = {
+            "Item": {
+                "control_key": self.key,
+                "requests": _decimal(requests),
+                "tokens": _decimal(tokens),
+                "updated_at": now_ms
+            }
+        }
+        if previous is None:
+            params["ConditionExpression"] = "attribute_not_exists(control_key)"
+        else:
+            params["ConditionExpression"] = "updated_at = :prev"
+            params["ExpressionAttributeValues"] = {":prev": previous}
+        try:
+            self.table.put_item(**params)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return False
+
+    def try_acquire(self, tokens=DEFAULT_REQUEST_TOKENS):
+        """
+        Uma tentativa de consumo (1 requisição + `tokens`).
+        Retorna 0.0 quando conseguiu ou os segundos estimados até haver saldo.
+        """
+        tokens = min(float(tokens), self.tpm)
+        for _ in range(MAX_CONFLICT_RETRIES):
+            previous, requests, available = self._load()
+            now_ms = int(time.time() * 1000)
+            if previous is not None and now_ms <= previous:
+                now_ms = previous + 1  # updated_at estritamente crescente (lock otimista)
+            requests, available = self._refill(previous, requests, available, now_ms)
+
+            if requests >= 1 and available >= tokens:
+                if self._store(previous, requests - 1, available - tokens, now_ms):
+                    return 0.0
+                metrics.incr("RateLimitConflict")
+                continue
+
+            return max(
+                (1 - requests) * 60.0 / self.rpm if requests < 1 else 0.0,
+                (tokens - available) * 60.0 / self.tpm if available < tokens else 0.0,
+            )
+        return 0.05  # Muita disputa pelo item: espera um pouco e tenta de novo
+
+    async def acquire(self, tokens=DEFAULT_REQUEST_TOKENS, operation="generate"):
+        """Espera a cota (até max_wait_seconds). Emite RateLimitWaitMs; sem cota levanta RateLimitExceeded."""
+        start = time.perf_counter()
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire, tokens)
+            waited = time.perf_counter() - start
+            if wait <= 0:
+                metrics.timing("RateLimitWaitMs", waited * 1000, operation=operation)
+                return waited
+            if waited + wait > self.max_wait_seconds:
+                metrics.timing("RateLimitWaitMs", waited * 1000, operation=operation)
+                metrics.incr("RateLimitDeferred", operation=operation)
+                raise RateLimitExceeded(
+                    f"Cota do Gemini esgotada ({operation}): espera estimada {wait:.1f}s"
+                )
+            # Jitter: workers que esperam o mesmo saldo não acordam juntos
+            await asyncio.sleep(wait * (1 + random.random() * 0.2))
+
+    def drain(self):
+        """Recebemos 429 mesmo com saldo: zera o balde para todos os workers recuarem."""
+        try:
+            self.table.put_item(Item={
+                "control_key": self.key,
+                "requests": _decimal(0),
+                "tokens": _decimal(0),
+                "updated_at": int(time.time() * 1000)
+            })
+            metrics.incr("RateLimitDrained")
+        except Exception as e:
+            print(f"Não foi possível zerar o rate limiter: {str(e)}")
+
+
+def get_rate_limiter(db):
+    """Limiter na tabela de controle, ou None quando CONTROL_TABLE_NAME não está configurada."""
+    table_name = os.environ.get("CONTROL_TABLE_NAME")
+    if not table_name:
+        return None
+    return TokenBucketLimiter(db.Table(table_name))
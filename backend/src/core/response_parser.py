@@ -0,0 +1,175 @@
+import json
+import re
+
+from google.genai import types
+
+from core import metrics
+
+# Saída estruturada da análise.
+# O modelo é chamado com response_schema (JSON garantido pela API); se mesmo assim
+# vier texto fora do formato, um único extrator tolerante resolve localmente.
+# Resposta malformada vira ERROR na sessão: nunca dispara o Retry da Step Function
+# (que repetiria download + upload + geração inteiros).
+
+ANALYSIS_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "technical_score": types.Schema(type=types.Type.INTEGER, minimum=0, maximum=100),
+        "summary": types.Schema(type=types.Type.STRING),
+        "feedback": types.Schema(type=types.Type.STRING),
+        "error": types.Schema(type=types.Type.STRING, nullable=True),
+    },
+    property_ordering=["technical_score", "summary", "feedback", "error"],
+)
+
+INVALID_RESPONSE_ERROR = "RESPOSTA_INVALIDA"
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def generation_config(**kwargs):
+    """GenerateContentConfig com saída JSON restrita ao schema da análise."""
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=ANALYSIS_SCHEMA,
+        **kwargs
+    )
+
+
+def _json_objects(text):
+    """Varre o texto uma vez e devolve cada objeto {...} de nível superior (respeitando strings)."""
+    depth = 0
+    start = None
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                yield text[start:i + 1]
+
+
+def extract_json(text):
+    """
+    Extrai o primeiro objeto JSON do texto.
+    Retorna (dict ou None, resultado) com resultado em: clean, extracted, repaired, failed.
+    """
+    if not text or not text.strip():
+        return None, "failed"
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data, "clean"
+    except ValueError:
+        pass
+
+    # Cercas ```json, prosa antes/depois, aspas tipográficas e vírgula sobrando
+    for candidate in _json_objects(text):
+        try:
+            return json.loads(candidate), "extracted"
+        except ValueError:
+            pass
+        repaired = _TRAILING_COMMA.sub(r"\1", candidate.translate(_SMART_QUOTES))
+        try:
+            return json.loads(repaired), "repaired"
+        except ValueError:
+            continue
+    return None, "failed"
+
+
+_PARTIAL_FIELD = re.compile(r'"(summary|feedback)"\s*:\s*"')
+
+
+def _partial_string(text, start):
+    """Conteúdo (decodificado) de uma string JSON que pode estar cortada no meio."""
+    i = start
+    while i < len(text):
+        ch = text[i]
+        if ch == '"':
+            break
+        if ch == "\\":
+            if i + 1 >= len(text):
+                break  # Escape cortado: espera o próximo chunk
+            if text[i + 1] == "u":
+                if i + 6 > len(text):
+                    break
+                # Par surrogate (emoji): só decodifica com as duas metades
+                if 0xD800 <= int(text[i + 2:i + 6], 16) <= 0xDBFF:
+                    if i + 12 > len(text):
+                        break
+                    i += 6
+                i += 6
+                continue
+            i += 2
+            continue
+        i += 1
+    try:
+        return json.loads('"' + text[start:i] + '"')
+    except ValueError:
+        return None
+
+
+def partial_fields(text):
+    """
+    summary/feedback já recebidos de uma resposta JSON ainda em streaming
+    (o schema fixa a ordem: technical_score, summary, feedback).
+    """
+    fields = {}
+    for match in _PARTIAL_FIELD.finditer(text or ""):
+        name = match.group(1)
+        if name not in fields:
+            value = _partial_string(text, match.end())
+            if value:
+                fields[name] = value
+    return fields
+
+
+def normalize_analysis(data):
+    """Garante o formato persistido: score inteiro em 0-100 e textos como string."""
+    if data.get("error"):
+        return {"error": str(data["error"])}
+    result = {
+        "summary": str(data.get("summary") or ""),
+        "feedback": str(data.get("feedback") or ""),
+    }
+    try:
+        score = int(round(float(data.get("technical_score"))))
+        result["technical_score"] = max(0, min(100, score))
+    except (TypeError, ValueError):
+        result["technical_score"] = 0
+    return result
+
+
+def parse_analysis(response):
+    """
+    Converte a resposta do Gemini no dicionário da análise.
+    Retorna (dados, resultado); em falha, dados = {"error": RESPOSTA_INVALIDA}.
+    """
+    parsed = getattr(response, "parsed", None)
+    if isinstance(parsed, dict):
+        data, outcome = parsed, "schema"
+    else:
+        data, outcome = extract_json(getattr(response, "text", None) or "")
+
+    if data is not None and not data.get("error") and "technical_score" not in data:
+        data, outcome = None, "failed"
+
+    metrics.incr("AnalysisParse", outcome=outcome)
+    if data is None:
+        print(f"Resposta do modelo fora do formato: {str(getattr(response, 'text', ''))[:200]}")
+        return {"error": INVALID_RESPONSE_ERROR}, outcome
+    return normalize_analysis(data), outcome
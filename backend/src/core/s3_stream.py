@@ -0,0 +1,192 @@
+import io
+import mimetypes
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Tamanho padrão de cada GET por faixa (mesmo chunk usado pelo upload resumable do SDK)
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+class _SeekableReader(io.RawIOBase):
+    """Base comum: posição lógica + seek/tell; subclasses definem `size` e `read`."""
+
+    _pos = 0
+    size = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            new_pos = offset
+        elif whence == os.SEEK_CUR:
+            new_pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            new_pos = self.size + offset
+        else:
+            raise ValueError(f"whence inválido: {whence}")
+        if new_pos < 0:
+            raise ValueError("Posição negativa")
+        self._pos = new_pos
+        return self._pos
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        return n
+
+
+class S3ObjectStream(_SeekableReader):
+    """
+    Leitor binário e "seekable" sobre um objeto do S3, sem arquivo local.
+
+    O SDK google-genai aceita qualquer `io.IOBase` em `files.upload`: ele usa
+    seek/tell para descobrir o tamanho e depois lê em chunks sequenciais.
+    Aqui cada leitura é atendida por GETs com Range, com prefetch paralelo de
+    até `max_concurrency` partes à frente. Memória máxima ~ part_size * max_concurrency.
+
+    `window=(start, end)` restringe as leituras a essa faixa (ex: um trecho da
+    gravação): as partes começam em `start`, nunca passam de `end` e não são
+    maiores que a própria faixa — o prefetch não busca bytes de outro trecho.
+    As posições continuam absolutas (seek/tell sobre o objeto inteiro).
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=DEFAULT_PART_SIZE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, head=None, window=None):
+        super().__init__()
+        self._s3 = s3_client
+        self._bucket = bucket
+        self._key = key
+        self._max_concurrency = max(1, max_concurrency)
+
+        # HeadObject falha cedo (404) se o objeto não existir
+        self.head = head if head is not None else s3_client.head_object(Bucket=bucket, Key=key)
+        self.size = int(self.head["ContentLength"])
+        self.content_type = self.head.get("ContentType")
+
+        start, end = window if window is not None else (0, self.size)
+        self._window_start = max(0, start)
+        self._window_end = min(self.size, end)
+        self._part_size = max(1, min(part_size, self._window_end - self._window_start))
+
+        self._pos = 0
+        self._parts = {}  # indice -> Future[bytes]
+        self._executor = None
+
+    def read(self, size=-1):
+        if self.closed:
+            raise ValueError("I/O operation on closed stream")
+        if size is None or size < 0:
+            size = self.size - self._pos
+        size = min(size, max(0, self._window_end - self._pos))
+        if size == 0:
+            return b""
+        if self._pos < self._window_start:
+            raise ValueError(f"Posição {self._pos} fora da janela [{self._window_start}, {self._window_end})")
+
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            index = (self._pos - self._window_start) // self._part_size
+            part = self._get_part(index)
+            start = self._pos - self._window_start - index * self._part_size
+            piece = part[start:start + remaining]
+            chunks.append(piece)
+            self._pos += len(piece)
+            remaining -= len(piece)
+            # Parte consumida por completo: libera memória
+            if start + len(piece) >= len(part):
+                self._parts.pop(index, None)
+        return b"".join(chunks)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._parts.clear()
+        super().close()
+
+    # --- Internos ---
+    def _fetch(self, index):
+        first = self._window_start + index * self._part_size
+        last = min(self._window_end, first + self._part_size) - 1
+        response = self._s3.get_object(
+            Bucket=self._bucket, Key=self._key, Range=f"bytes={first}-{last}"
+        )
+        return response["Body"].read()
+
+    def _get_part(self, index):
+        total_parts = (self._window_end - self._window_start + self._part_size - 1) // self._part_size
+
+        # Descarta partes fora da janela atual (ex: após um seek)
+        window_end = index + self._max_concurrency
+        for stale in [i for i in self._parts if i < index or i >= window_end]:
+            self._parts.pop(stale).cancel()
+
+        if self._max_concurrency == 1:
+            if index not in self._parts:
+                future = Future()
+                future.set_result(self._fetch(index))
+                self._parts[index] = future
+            return self._parts[index].result()
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_concurrency)
+
+        # Janela de prefetch: [index, index + max_concurrency)
+        for i in range(index, min(total_parts, window_end)):
+            if i not in self._parts:
+                self._parts[i] = self._executor.submit(self._fetch, i)
+        return self._parts[index].result()
+
+
+class ByteRangeView(_SeekableReader):
+    """
+    Janela [start, end) de um stream seekable, opcionalmente precedida de um
+    prefixo em memória (ex: cabeçalho WAV reescrito após cortar o silêncio).
+    """
+
+    def __init__(self, base, start, end, prefix=b""):
+        super().__init__()
+        self._base = base
+        self._start = start
+        self._end = end
+        self._prefix = prefix
+        self._pos = 0
+        self.size = len(prefix) + (end - start)
+        self.head = getattr(base, "head", {})
+        self.content_type = getattr(base, "content_type", None)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self._pos
+        size = min(size, max(0, self.size - self._pos))
+        chunks = []
+        if size and self._pos < len(self._prefix):
+            piece = self._prefix[self._pos:self._pos + size]
+            chunks.append(piece)
+            self._pos += len(piece)
+            size -= len(piece)
+        if size:
+            self._base.seek(self._start + self._pos - len(self._prefix))
+            piece = self._base.read(size)
+            chunks.append(piece)
+            self._pos += len(piece)
+        return b"".join(chunks)
+
+
+def guess_mime_type(stream, key, default="audio/mpeg"):
+    """Mime type para o upload: ContentType do S3 se útil, senão pela extensão."""
+    content_type = stream.content_type
+    if content_type and content_type not in ("binary/octet-stream", "application/octet-stream"):
+        return content_type
+    guessed, _ = mimetypes.guess_type(key)
+    return guessed or default
@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+
+# Análise segmentada (map-reduce) de gravações longas.
+# - map: o áudio é dividido em trechos cortados em pausas (quadros sem voz do
+#   AudioProfile) e cada trecho é analisado em paralelo pelo modelo;
+# - reduce: local e barato (sem nova chamada ao modelo), junta as análises
+#   parciais no mesmo formato technical_score/summary/feedback.
+# A latência passa a depender do trecho mais longo, não da duração total.
+
+DEFAULT_MIN_DURATION_S = 240.0   # Abaixo disso a chamada única é mais barata
+DEFAULT_TARGET_S = 120.0         # Duração alvo de cada trecho
+DEFAULT_SEARCH_S = 20.0          # Janela (±) em volta do corte ideal para achar uma pausa
+DEFAULT_MAX_SEGMENTS = 8
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def _longest_pause_center(silent):
+    """Índice do centro da maior sequência de True, ou None se não houver."""
+    if not silent.any():
+        return None
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    longest = int(np.argmax(ends - starts))
+    return int((starts[longest] + ends[longest]) // 2)
+
+
+def plan_segments(profile, first=0, last=None):
+    """
+    Divide os quadros [first, last) do perfil em trechos [(início, fim), ...] de
+    ~SEGMENT_TARGET_S. Cada corte fica no meio da maior pausa perto do ponto ideal;
+    sem pausa na janela, corta no ponto ideal. Retorna um único trecho quando não compensa dividir.
+    """
+    last = profile.frame_count if last is None else last
+    if profile.format == "unknown" or last <= first or profile.frame_s <= 0:
+        return [(first, last)]
+
+    duration = (last - first) * profile.frame_s
+    if duration < _env_float("SEGMENT_MIN_DURATION_S", DEFAULT_MIN_DURATION_S):
+        return [(first, last)]
+
+    max_segments = int(os.environ.get("SEGMENT_MAX_SEGMENTS", DEFAULT_MAX_SEGMENTS))
+    # Nunca mais que max_segments trechos: se preciso, cada trecho fica mais longo
+    target = max(_env_float("SEGMENT_TARGET_S", DEFAULT_TARGET_S), duration / max_segments)
+    target = int(round(target / profile.frame_s))
+    search = min(target // 4, int(round(_env_float("SEGMENT_SEARCH_S", DEFAULT_SEARCH_S) / profile.frame_s)))
+    silent = ~profile.voiced_mask()
+
+    # Caminha do início: cada corte na maior pausa da janela [alvo - busca, alvo + busca].
+    # O que sobra até alvo + busca vira o último trecho (sem trechos minúsculos no fim).
+    cuts = [first]
+    while last - cuts[-1] > target + search and len(cuts) < max_segments:
+        ideal = cuts[-1] + target
+        lo, hi = max(cuts[-1] + 1, ideal - search), min(last - 1, ideal + search)
+        center = _longest_pause_center(silent[lo:hi])
+        cuts.append(lo + center if center is not None else ideal)
+    cuts.append(last)
+    return list(zip(cuts, cuts[1:]))
+
+
+def format_clock(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def merge_analyses(parts):
+    """
+    Reduce das análises parciais: [(dados, início_s, fim_s), ...] -> dados no formato final.
+    Trechos com erro (ex: AUDIO_INAUDIVEL num trecho só de pausa) são ignorados;
+    a nota é a média ponderada pela duração dos trechos válidos.
+    """
+    valid = [(data, start, end) for data, start, end in parts if "error" not in data]
+    if not valid:
+        return parts[0][0] if parts else {"error": "AUDIO_INAUDIVEL"}
+    if len(valid) == 1:
+        return dict(valid[0][0])
+
+    weights = np.array([max(end - start, 1e-3) for _, start, end in valid])
+    scores = np.array([data["technical_score"] for data, _, _ in valid], dtype=float)
+    score = int(round(float(np.average(scores, weights=weights))))
+
+    return {
+        "technical_score": max(0, min(100, score)),
+        "summary": " ".join(data["summary"] for data, _, _ in valid if data["summary"]),
+        "feedback": "\n".join(
+            f"[{format_clock(start)}-{format_clock(end)}] {data['feedback']}"
+            for data, start, end in valid if data["feedback"]
+        ),
+        "segments": len(valid),
+    }
@@ -0,0 +1,41 @@
+import time
+
+# Índices de listagem da tabela de sessões (histórico sem Scan).
+# - owner-created-index: sessões de um candidato, mais novas primeiro
+# - question-created-index: sessões de uma pergunta (question_id)
+# Os dois projetam só os atributos do resumo (LISTING_ATTRIBUTES): a listagem lê
+# páginas pequenas do índice, e o detalhe (feedback) vem do GET/batch-get.
+# `owner` só é gravado quando o candidato se identifica, e `question_id` só quando
+# vem no pedido (índices esparsos: sessões "Anonymous" ou sem pergunta não caem
+# todas na mesma partição).
+
+OWNER_INDEX = "owner-created-index"
+QUESTION_INDEX = "question-created-index"
+
+LISTING_ATTRIBUTES = (
+    "session_id", "status", "candidate_name", "question_id", "analysis_mode",
+    "created_at", "updated_at",
+)
+
+ANONYMOUS = "Anonymous"
+
+
+def owner_key(candidate_name):
+    """Chave do candidato no índice (sem espaços nas pontas, sem caixa); None = anônimo."""
+    if not isinstance(candidate_name, str):
+        return None
+    owner = " ".join(candidate_name.split()).casefold()
+    if not owner or owner == ANONYMOUS.casefold():
+        return None
+    return owner
+
+
+def index_attributes(candidate_name, question_id=None, now=None):
+    """Atributos gravados na criação da sessão para os índices de listagem."""
+    attributes = {"created_at": int(now if now is not None else time.time())}
+    owner = owner_key(candidate_name)
+    if owner:
+        attributes["owner"] = owner
+    if question_id not in (None, ""):
+        attributes["question_id"] = str(question_id)
+    return attributes
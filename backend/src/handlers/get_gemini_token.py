@@ -1,6 +1,7 @@
-import json
 import os
 
+from core import api_response
+
 # Nenhuma dependência externa complexa além de variável de ambiente
 def lambda_handler(event, context):
     """
@@ -14,20 +15,8 @@ def lambda_handler(event, context):
         if not api_key:
             raise ValueError("GEMINI_API_KEY não configurada no servidor.")
 
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*"
-            },
-            "body": json.dumps({
-                "token": api_key
-            })
-        }
+        return api_response.json_response(200, {"token": api_key}, event)
 
     except Exception as e:
         print(f"Erro ao obter token: {str(e)}")
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": "Internal Server Error"})
-        }
\ No newline at end of file
+        return api_response.error_response(500, "Internal Server Error", event)
\ No newline at end of file
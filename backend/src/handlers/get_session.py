@@ -1,21 +1,74 @@
+import base64
+import hashlib
 import json
 import os
+import time
 import boto3
+from boto3.dynamodb.conditions import Attr, Key
 from botocore.config import Config
-from decimal import Decimal
+
+from core import api_response, dynamo_batch, dynamo_json
+from core.deadline import Deadline
+from core.lru_cache import LRUCache
+from core.session_index import LISTING_ATTRIBUTES, OWNER_INDEX, QUESTION_INDEX, owner_key
 
 # Singleton para conexão
 _DYNAMODB_RES = None
+_DYNAMODB_CLIENT = None
+_TERMINAL_CACHE = None
+
+# Campos públicos da sessão: o que o front recebe (sem ?fields=, todos eles) e o que
+# pode pedir em ?fields=. Viram ProjectionExpression: o polling não lê nem serializa o
+# job_description de 5000 caracteres, e atributos internos do item (upload_id, resume,
+# lease_until, cache_key, owner, batch_*...) nunca saem da tabela.
+PUBLIC_FIELDS = (
+    "session_id", "status", "candidate_name", "question_id", "job_description",
+    "analysis_mode", "ai_feedback", "partial_feedback", "error_message", "cache_hit",
+    "updated_at", "attempts", "model_routing", "expire_at", "created_at",
+)
+# Sempre lidos: compõem o ETag (mudou algum deles = representação nova)
+ETAG_FIELDS = ("status", "updated_at", "attempts")
+
+# Long-poll (?wait=N&since=STATUS): segura a requisição até o status mudar ou N s
+# passarem, relendo o item com backoff — uma chamada substitui dezenas de polls de 2 s.
+DEFAULT_LONG_POLL_MAX_WAIT_SECONDS = 20  # < timeout da Lambda e da integração do API Gateway
+LONG_POLL_FIRST_INTERVAL = 0.25
+LONG_POLL_MAX_INTERVAL = 2.0
+TERMINAL_STATUSES = ("COMPLETED", "ERROR")
+
+# Sessão COMPLETED/ERROR não muda mais: fica na memória do container (LRU com TTL)
+# e a resposta leva Cache-Control longo e `private` (rota atrás do autorizador JWT:
+# só o navegador do candidato guarda, nunca um cache compartilhado/CDN).
+# Em andamento: no-cache (sempre revalida via ETag).
+DEFAULT_TERMINAL_CACHE_MAX_ENTRIES = 2000
+DEFAULT_TERMINAL_CACHE_TTL_SECONDS = 900
+DEFAULT_TERMINAL_MAX_AGE_SECONDS = 86400
 
-# Classe auxiliar para converter Decimal do DynamoDB para JSON
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, Decimal):
-            if o % 1 > 0:
-                return float(o)
-            else:
-                return int(o)
-        return super(DecimalEncoder, self).default(o)
+# Consulta em lote (POST /sessions/batch-get) para o dashboard: BatchGetItem em blocos
+# de 100 chaves, UnprocessedKeys reenviadas com backoff (core.dynamo_batch).
+BATCH_GET_ROUTE = "POST /sessions/batch-get"
+DEFAULT_BATCH_GET_MAX_IDS = 500
+
+# Histórico (GET /sessions?candidate=...&question_id=...&cursor=...): Query num GSI
+# por candidato ou pergunta, mais novas primeiro, paginada por ExclusiveStartKey —
+# custo proporcional ao tamanho da página, não da tabela. O cursor é o
+# LastEvaluatedKey em base64 (opaco para o front).
+LIST_ROUTE = "GET /sessions"
+DEFAULT_LIST_LIMIT = 20
+LIST_MAX_LIMIT = 100
+# candidato + pergunta: question_id é filtro no índice do candidato, então uma Query
+# pode voltar curta; repete (até este limite de idas) até encher a página
+LIST_FILTER_MAX_QUERIES = 5
+
+def get_terminal_cache():
+    global _TERMINAL_CACHE
+    if _TERMINAL_CACHE is None:
+        _TERMINAL_CACHE = LRUCache(
+            int(os.environ.get("TERMINAL_CACHE_MAX_ENTRIES", DEFAULT_TERMINAL_CACHE_MAX_ENTRIES)),
+            float(os.environ.get("TERMINAL_CACHE_TTL_SECONDS", DEFAULT_TERMINAL_CACHE_TTL_SECONDS)),
+            name="SessionCache"
+        )
+    return _TERMINAL_CACHE
 
 def get_db():
     global _DYNAMODB_RES
@@ -24,52 +77,318 @@ def get_db():
         _DYNAMODB_RES = boto3.resource("dynamodb", config=config)
     return _DYNAMODB_RES
 
-def lambda_handler(event, context, dynamodb_resource=None):
+def get_dynamodb_client():
+    """
+    Client "cru" para GetItem/BatchGetItem: o item chega no formato {"S": ...} e o
+    dynamo_json converte direto para tipos JSON, sem o TypeDeserializer/Decimal do
+    resource (~2x mais rápido no item completo). O meta.client do resource não
+    serve: carrega os hooks de (de)serialização do resource.
+    """
+    global _DYNAMODB_CLIENT
+    if _DYNAMODB_CLIENT is None:
+        config = Config(retries={'max_attempts': 3, 'mode': 'standard'})
+        _DYNAMODB_CLIENT = boto3.client("dynamodb", config=config)
+    return _DYNAMODB_CLIENT
+
+def _parse_fields(raw):
+    """Campos de "a,b" ou ["a", "b"] (None = todos os PUBLIC_FIELDS). Levanta ValueError com campos desconhecidos."""
+    if not raw:
+        return None
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    fields = [f.strip() for f in raw if isinstance(f, str) and f.strip()]
+    unknown = [f for f in fields if f not in PUBLIC_FIELDS]
+    if unknown:
+        raise ValueError(f"Invalid fields: {', '.join(unknown)}")
+    return fields
+
+def _requested_fields(event):
+    return _parse_fields((event.get("queryStringParameters") or {}).get("fields"))
+
+def _projection(fields):
+    """ProjectionExpression (+ nomes) dos campos pedidos, sempre com a chave e os campos do ETag."""
+    projected = list(dict.fromkeys(["session_id", *(fields or PUBLIC_FIELDS), *ETAG_FIELDS]))
+    names = {f"#f{i}": name for i, name in enumerate(projected)}
+    return {'ProjectionExpression': ", ".join(names), 'ExpressionAttributeNames': names}
+
+def _cache_key(session_id, fields):
+    return f"{session_id}|{','.join(fields) if fields else '*'}"
+
+def _present(item, fields):
+    """Corpo devolvido ao front: só campos públicos (os pedidos); partial_feedback só em PROCESSING."""
+    status = item.get('status')
+    allowed = fields or PUBLIC_FIELDS
+    item = {k: v for k, v in item.items() if k == "session_id" or k in allowed}  # cópia: não altera o cache
+    # Feedback parcial (streaming) só faz sentido enquanto a análise roda
+    if status == 'PROCESSING' and (not fields or 'partial_feedback' in fields):
+        item['partial_feedback'] = item.get('partial_feedback')
+    else:
+        item.pop('partial_feedback', None)
+    return item
+
+def _wait_seconds(event):
+    """?wait=N limitado a LONG_POLL_MAX_WAIT_SECONDS (0 = resposta imediata)."""
+    raw = (event.get("queryStringParameters") or {}).get("wait")
+    if not raw:
+        return 0.0
+    try:
+        wait = float(raw)
+    except ValueError:
+        raise ValueError("Invalid wait")
+    limit = float(os.environ.get("LONG_POLL_MAX_WAIT_SECONDS", DEFAULT_LONG_POLL_MAX_WAIT_SECONDS))
+    return max(0.0, min(wait, limit))
+
+def _read(client, table_name, session_id, fields):
+    item = client.get_item(
+        TableName=table_name, Key={'session_id': {'S': session_id}}, **_projection(fields)
+    ).get('Item')
+    return dynamo_json.item_from_client(item) if item else None
+
+def _batch_read(client, table_name, session_ids, fields):
+    """
+    BatchGetItem pelo client (core.dynamo_batch), como o _read. Retorna
+    ({id: item}, ids_não_processados): o que sobrar das retentativas volta para o
+    cliente tentar de novo.
+    """
+    raw_items, unprocessed = dynamo_batch.batch_get(
+        client, table_name, [{'session_id': {'S': sid}} for sid in session_ids], **_projection(fields)
+    )
+    found = {}
+    for raw in raw_items:
+        item = dynamo_json.item_from_client(raw)
+        found[item['session_id']] = item
+    return found, [key['session_id']['S'] for key in unprocessed]
+
+def _wait_for_change(client, table_name, session_id, fields, item, since, wait, deadline):
+    """Relê com backoff até o status sair de `since` (ou ficar terminal), `wait` s ou o prazo da Lambda."""
+    since = since or item.get('status')
+    end = time.monotonic() + min(wait, deadline.budget())
+    interval = LONG_POLL_FIRST_INTERVAL
+    reads = 1
+    while item.get('status') == since and item.get('status') not in TERMINAL_STATUSES:
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, LONG_POLL_MAX_INTERVAL)
+        item = _read(client, table_name, session_id, fields) or item
+        reads += 1
+    print(f"Long-poll {session_id}: {reads} leituras, status {since} -> {item.get('status')}")
+    return item
+
+def _cache_control(status):
+    if status in TERMINAL_STATUSES:
+        max_age = int(os.environ.get("TERMINAL_MAX_AGE_SECONDS", DEFAULT_TERMINAL_MAX_AGE_SECONDS))
+        return f"private, max-age={max_age}, immutable"
+    return "no-cache"
+
+def _etag(item, fields):
+    """ETag da representação: status/updated_at/attempts (+ tamanho do parcial em streaming e a projeção)."""
+    partial = item.get("partial_feedback") or {}
+    state = [str(item.get(f, "")) for f in ETAG_FIELDS]
+    state.append(sum(len(str(partial.get(k, ""))) for k in ("summary", "feedback")))
+    state.append(",".join(sorted(fields)) if fields else "*")
+    return '"' + hashlib.sha256(json.dumps(state).encode("utf-8")).hexdigest()[:32] + '"'
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+def _encode_cursor(key):
+    return base64.urlsafe_b64encode(dynamo_json.dumps(key).encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor, hash_name, hash_value):
+    """ExclusiveStartKey do cursor; levanta ValueError se não for desta consulta."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if (not isinstance(key, dict) or set(key) != {hash_name, "created_at", "session_id"}
+            or key[hash_name] != hash_value or not isinstance(key["created_at"], int)
+            or not isinstance(key["session_id"], str)):
+        raise ValueError("Invalid cursor")
+    return key
+
+def _list_limit(params):
+    raw = params.get("limit")
+    if not raw:
+        return DEFAULT_LIST_LIMIT
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValueError("Invalid limit")
+    return max(1, min(limit, LIST_MAX_LIMIT))
+
+def _list_sessions(event, table):
+    """
+    GET /sessions?candidate=NOME[&question_id=Q][&limit=N][&cursor=C]
+    {"sessions": [resumos, mais novos primeiro], "next_cursor": C ou null}.
+    Com candidato usa o owner-created-index (question_id vira filtro: o histórico
+    de um candidato é curto); só com question_id, o question-created-index.
+    Com filtro, repete a Query até encher a página; o cursor aponta para o último
+    resumo devolvido, então nada é pulado nem repetido.
+    """
+    params = event.get("queryStringParameters") or {}
+    try:
+        owner = owner_key(params.get("candidate"))
+        question_id = params.get("question_id")
+        if not owner and not question_id:
+            raise ValueError("Missing candidate or question_id")
+        limit = _list_limit(params)
+        if owner:
+            index, hash_name, hash_value = OWNER_INDEX, "owner", owner
+        else:
+            index, hash_name, hash_value = QUESTION_INDEX, "question_id", question_id
+        start_key = _decode_cursor(params["cursor"], hash_name, hash_value) if params.get("cursor") else None
+    except ValueError as e:
+        return api_response.error_response(400, str(e), event)
+
+    filtered = bool(owner and question_id)
+    names = {f"#l{i}": name for i, name in enumerate(LISTING_ATTRIBUTES)}
+    query = {
+        'IndexName': index,
+        'KeyConditionExpression': Key(hash_name).eq(hash_value),
+        'ProjectionExpression': ", ".join(names),
+        'ExpressionAttributeNames': names,
+        'ScanIndexForward': False,
+        # Limit conta itens lidos antes do filtro: com filtro lê blocos maiores
+        'Limit': LIST_MAX_LIMIT if filtered else limit
+    }
+    if filtered:
+        query['FilterExpression'] = Attr('question_id').eq(question_id)
+
+    sessions = []
+    last_key = start_key
+    for _ in range(LIST_FILTER_MAX_QUERIES if filtered else 1):
+        if last_key:
+            query['ExclusiveStartKey'] = last_key
+        response = table.query(**query)
+        items = response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        taken = items[:limit - len(sessions)]
+        sessions.extend(taken)
+        if len(taken) < len(items):
+            # Página cheia no meio do bloco: continua logo depois do último devolvido
+            last = taken[-1]
+            last_key = {hash_name: hash_value, 'created_at': last['created_at'], 'session_id': last['session_id']}
+            break
+        if len(sessions) >= limit or not last_key:
+            break
+
+    return api_response.json_response(200, {
+        "sessions": sessions,
+        "next_cursor": _encode_cursor(last_key) if last_key else None
+    }, event, headers={"Cache-Control": "no-cache"})
+
+def _batch_get(event, client, table_name):
+    """
+    POST /sessions/batch-get  {"ids": [...], "fields": [...] (opcional)}
+    Uma ida e volta para o dashboard: {"sessions": [...na ordem pedida], "missing": [...],
+    "unprocessed": [...]}. Sessões terminais vêm do cache do container quando possível.
+    """
+    try:
+        body = json.loads(event.get("body") or "{}")
+        if not isinstance(body, dict):
+            raise ValueError("Invalid body")
+        ids = body.get("ids")
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) and i for i in ids):
+            raise ValueError("Missing ids")
+        ids = list(dict.fromkeys(ids))
+        max_ids = int(os.environ.get("BATCH_GET_MAX_IDS", DEFAULT_BATCH_GET_MAX_IDS))
+        if len(ids) > max_ids:
+            raise ValueError(f"Too many ids (max {max_ids})")
+        fields = _parse_fields(body.get("fields"))
+    except ValueError as e:
+        return api_response.error_response(400, str(e), event)
+
+    cache = get_terminal_cache()
+    items = {}
+    for sid in ids:
+        cached = cache.get(_cache_key(sid, fields))
+        if cached is not None:
+            items[sid] = cached
+    found, unprocessed = _batch_read(client, table_name, [sid for sid in ids if sid not in items], fields)
+    for sid, item in found.items():
+        if item.get('status') in TERMINAL_STATUSES:
+            cache.put(_cache_key(sid, fields), item)
+    items.update(found)
+
+    return api_response.json_response(200, {
+        "sessions": [_present(items[sid], fields) for sid in ids if sid in items],
+        "missing": [sid for sid in ids if sid not in items and sid not in unprocessed],
+        "unprocessed": unprocessed
+    }, event, headers={"Cache-Control": "no-cache"})
+
+def lambda_handler(event, context, dynamodb_resource=None, dynamodb_client=None):
     """
     Busca o status e feedback da sessão.
-    Rota: GET /session/{session_id}
+    Rota: GET /sessions/{session_id}[?fields=status,ai_feedback][&wait=N&since=STATUS]
+    Com If-None-Match igual ao ETag atual responde 304 sem corpo (polling sem mudança).
+    Com wait, responde assim que o status deixar de ser `since` (padrão: o status
+    atual) ou depois de N segundos.
+    A mesma função atende POST /sessions/batch-get (várias sessões, ver _batch_get)
+    e GET /sessions (histórico por candidato/pergunta, ver _list_sessions).
     """
     # Injeção de dependência para testes
     db = dynamodb_resource if dynamodb_resource else get_db()
+    client = dynamodb_client if dynamodb_client else get_dynamodb_client()
     
     TABLE_NAME = os.environ.get("TABLE_NAME")
     table = db.Table(TABLE_NAME)
 
+    if event.get("routeKey") in (BATCH_GET_ROUTE, LIST_ROUTE):
+        try:
+            if event["routeKey"] == LIST_ROUTE:
+                return _list_sessions(event, table)
+            return _batch_get(event, client, TABLE_NAME)
+        except Exception as e:
+            print(f"ERROR: {str(e)}")
+            return api_response.error_response(500, "Internal Server Error", event)
+
     # Pegar ID da URL (pathParameters)
     session_id = None
     if event.get("pathParameters"):
         session_id = event["pathParameters"].get("session_id")
     
     if not session_id:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Missing session_id"})
-        }
+        return api_response.error_response(400, "Missing session_id", event)
 
     try:
-        response = table.get_item(Key={'session_id': session_id})
-        
-        if 'Item' not in response:
-            return {
-                "statusCode": 404,
-                "body": json.dumps({"error": "Session not found"})
-            }
+        fields = _requested_fields(event)
+        wait = _wait_seconds(event)
+    except ValueError as e:
+        return api_response.error_response(400, str(e), event)
 
-        item = response['Item']
+    try:
+        cache = get_terminal_cache()
+        cache_key = _cache_key(session_id, fields)
+        item = cache.get(cache_key)
+        if item is None:
+            item = _read(client, TABLE_NAME, session_id, fields)
         
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*"
-            },
-            # Usa o Encoder customizado para lidar com números do DynamoDB
-            "body": json.dumps(item, cls=DecimalEncoder)
+            if item is None:
+                return api_response.error_response(404, "Session not found", event)
+
+            if wait:
+                since = (event.get("queryStringParameters") or {}).get("since")
+                item = _wait_for_change(client, TABLE_NAME, session_id, fields, item, since, wait,
+                                        Deadline.from_context(context))
+            if item.get('status') in TERMINAL_STATUSES:
+                cache.put(cache_key, item)
+
+        headers = {
+            "Access-Control-Expose-Headers": "ETag",
+            "Cache-Control": _cache_control(item.get('status')),
+            "ETag": _etag(item, fields)
         }
+        if _etag_matches(api_response.header(event, "if-none-match"), headers["ETag"]):
+            return api_response.not_modified(headers)
+
+        # Item já em tipos JSON (dynamo_json); comprimido se o cliente aceitar
+        return api_response.json_response(200, _present(item, fields), event, headers=headers)
 
     except Exception as e:
         print(f"ERROR: {str(e)}")
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": "Internal Server Error"})
-        }
\ No newline at end of file
+        return api_response.error_response(500, "Internal Server Error", event)
\ No newline at end of file
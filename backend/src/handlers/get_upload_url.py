@@ -1,14 +1,44 @@
 import json
+import math
 import uuid
 import os
 import time
 import boto3
 from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from core import api_response, dynamo_batch
+from core.session_index import index_attributes
 
 # --- Padrão Singleton para Clientes AWS (Cold Start Mitigation) ---
 _S3_CLIENT = None
 _DYNAMODB_RES = None
 
+SINGLE_UPLOAD_URL_EXPIRES = 300
+
+# Upload multipart (gravações longas em conexões ruins): com file_size declarado acima
+# do limite, o POST /sessions abre um CreateMultipartUpload e devolve uma URL assinada
+# por parte. O front envia as partes em paralelo, repete só as que falharam e fecha com
+# POST /sessions/{id}/complete-upload (CompleteMultipartUpload). O evento
+# ObjectCreated do S3 só sai na conclusão, então o fluxo de análise não muda.
+# Uploads abandonados são abortados pela regra de ciclo de vida do bucket.
+COMPLETE_UPLOAD_ROUTE = "POST /sessions/{session_id}/complete-upload"
+DEFAULT_MULTIPART_THRESHOLD_BYTES = 16 * 1024 * 1024
+DEFAULT_PART_SIZE_BYTES = 8 * 1024 * 1024
+MIN_PART_SIZE_BYTES = 5 * 1024 * 1024  # Mínimo do S3 (menos a última parte)
+MAX_PARTS = 10000
+DEFAULT_MAX_UPLOAD_BYTES = 2 * 1024 ** 3  # Limite de arquivo da File API do Gemini
+DEFAULT_PART_URL_EXPIRES_SECONDS = 3600
+
+# Criação em lote (POST /sessions/batch) para campanhas de avaliação: centenas de
+# sessões numa invocação. Itens vão por BatchWriteItem em blocos de 25, UnprocessedItems
+# reenviados com backoff (core.dynamo_batch). As URLs são assinadas
+# localmente no mesmo cliente S3 (sem ida à rede) e com validade maior, porque os
+# candidatos gravam depois. Sessões que não foram gravadas voltam em "failed", sem URL.
+BATCH_CREATE_ROUTE = "POST /sessions/batch"
+DEFAULT_BATCH_CREATE_MAX_ENTRIES = 500
+DEFAULT_BATCH_UPLOAD_URL_EXPIRES_SECONDS = 3600
+
 def get_clients():
     """
     Retorna ou inicializa os clientes AWS.
@@ -26,11 +56,203 @@ def get_clients():
         
     return _S3_CLIENT, _DYNAMODB_RES
 
+def _declared_size(body):
+    """file_size declarado (bytes) ou None; levanta ValueError se inválido."""
+    size = body.get("file_size")
+    if size is None:
+        return None
+    if isinstance(size, bool) or not isinstance(size, int) or size <= 0:
+        raise ValueError("Invalid file_size")
+    max_bytes = int(os.environ.get("MAX_UPLOAD_BYTES", DEFAULT_MAX_UPLOAD_BYTES))
+    if size > max_bytes:
+        raise ValueError(f"file_size too large (max {max_bytes} bytes)")
+    return size
+
+def _part_size(file_size):
+    """Tamanho das partes: o configurado (>= 5 MB), aumentado se passaria de 10.000 partes."""
+    configured = int(os.environ.get("MULTIPART_PART_SIZE_BYTES", DEFAULT_PART_SIZE_BYTES))
+    return max(configured, MIN_PART_SIZE_BYTES, math.ceil(file_size / MAX_PARTS))
+
+def _new_session(body):
+    """Item inicial da sessão (PENDING_UPLOAD) a partir do corpo do POST."""
+    job_description = body.get("job_description", "")
+    if len(job_description) > 5000:
+        job_description = job_description[:5000]
+
+    candidate_name = body.get("candidate_name", "Anonymous")
+
+    # "deferred": análise sem urgência (treino, re-scoring) vai para o job de lote
+    analysis_mode = body.get("analysis_mode", "realtime")
+    if analysis_mode not in ("realtime", "deferred"):
+        analysis_mode = "realtime"
+
+    # ID único
+    session_id = str(uuid.uuid4())
+    item = {
+        "session_id": session_id,
+        "status": "PENDING_UPLOAD",
+        "candidate_name": candidate_name,
+        "s3_key": f"uploads/{session_id}/audio.mp3",
+        "expire_at": int(time.time() + 86400),
+        "job_description": job_description,
+        # created_at (+ owner/question_id, quando houver) alimentam os índices de listagem
+        **index_attributes(candidate_name, body.get("question_id"))
+    }
+    if analysis_mode == "deferred":
+        item["analysis_mode"] = analysis_mode
+    return item
+
+def _upload_url(s3, bucket_name, object_key, expires):
+    return s3.generate_presigned_url(
+        ClientMethod='put_object',
+        Params={
+            'Bucket': bucket_name,
+            'Key': object_key,
+            'ContentType': 'audio/mpeg'
+        },
+        ExpiresIn=expires
+    )
+
+def _batch_write(db, table_name, items):
+    """BatchWriteItem dos itens (core.dynamo_batch). Retorna os session_ids que não foram gravados."""
+    return [item['session_id'] for item in dynamo_batch.batch_put(db, table_name, items)]
+
+def _batch_create(event, s3, db, table_name, bucket_name):
+    """
+    POST /sessions/batch  {"sessions": [{"candidate_name", "question_id", "job_description",
+    "analysis_mode"}, ...]}
+    201 com {"sessions": [{"index", "session_id", "upload_url"}], "failed": [{"index", "error"}]},
+    na ordem das entradas. Só upload único (campanhas não sabem o tamanho de antemão).
+    """
+    try:
+        body = json.loads(event.get("body") or "{}")
+        entries = body.get("sessions") if isinstance(body, dict) else None
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("Missing sessions")
+        max_entries = int(os.environ.get("BATCH_CREATE_MAX_ENTRIES", DEFAULT_BATCH_CREATE_MAX_ENTRIES))
+        if len(entries) > max_entries:
+            raise ValueError(f"Too many sessions (max {max_entries})")
+        invalid = [i for i, entry in enumerate(entries)
+                   if not isinstance(entry, dict) or not isinstance(entry.get("job_description", ""), str)]
+        if invalid:
+            raise ValueError(f"Invalid sessions at index {invalid}")
+    except ValueError as e:
+        return api_response.error_response(400, str(e), event)
+
+    items = [_new_session(entry) for entry in entries]
+    unprocessed = set(_batch_write(db, table_name, items))
+
+    expires = int(os.environ.get("BATCH_UPLOAD_URL_EXPIRES_SECONDS", DEFAULT_BATCH_UPLOAD_URL_EXPIRES_SECONDS))
+    created, failed = [], []
+    for index, item in enumerate(items):
+        if item["session_id"] in unprocessed:
+            failed.append({"index": index, "error": "Not written (throttled), retry this entry"})
+            continue
+        created.append({
+            "index": index,
+            "session_id": item["session_id"],
+            "upload_url": _upload_url(s3, bucket_name, item["s3_key"], expires)
+        })
+    print(f"Lote de sessões: {len(created)} criadas, {len(failed)} não gravadas")
+    return api_response.json_response(201, {"sessions": created, "failed": failed}, event)
+
+def _part_urls(s3, bucket_name, object_key, upload_id, part_numbers):
+    """URLs assinadas de UploadPart (assinatura local, sem chamada ao S3)."""
+    expires = int(os.environ.get("MULTIPART_URL_EXPIRES_SECONDS", DEFAULT_PART_URL_EXPIRES_SECONDS))
+    return [
+        {
+            "part_number": number,
+            "url": s3.generate_presigned_url(
+                ClientMethod='upload_part',
+                Params={'Bucket': bucket_name, 'Key': object_key,
+                        'UploadId': upload_id, 'PartNumber': number},
+                ExpiresIn=expires
+            )
+        }
+        for number in part_numbers
+    ]
+
+def _parse_parts(body):
+    """{"parts": [{"part_number": 1, "etag": "..."}]} -> {número: etag}."""
+    parts = body.get("parts")
+    if not isinstance(parts, list):
+        raise ValueError("Missing parts")
+    etags = {}
+    for part in parts:
+        number = part.get("part_number") if isinstance(part, dict) else None
+        etag = part.get("etag") if isinstance(part, dict) else None
+        if isinstance(number, bool) or not isinstance(number, int) or not isinstance(etag, str) or not etag:
+            raise ValueError("Invalid part")
+        etags[number] = etag
+    return etags
+
+def _complete_upload(event, s3, sessions_table, bucket_name):
+    """
+    POST /sessions/{session_id}/complete-upload  {"parts": [{"part_number", "etag"}]}
+    Faltando partes: 409 com missing_parts e URLs novas só para elas (o front reenvia
+    essas e chama de novo). Completo: CompleteMultipartUpload. Repetir a chamada
+    depois de concluído é inofensivo (200).
+    """
+    session_id = (event.get("pathParameters") or {}).get("session_id")
+    if not session_id:
+        return api_response.error_response(400, "Missing session_id", event)
+    try:
+        body = json.loads(event.get("body") or "{}")
+        etags = _parse_parts(body if isinstance(body, dict) else {})
+    except ValueError as e:
+        return api_response.error_response(400, str(e), event)
+
+    item = sessions_table.get_item(Key={'session_id': session_id}).get('Item')
+    if item is None:
+        return api_response.error_response(404, "Session not found", event)
+    if item.get("upload_completed_at"):
+        return api_response.json_response(200, {"session_id": session_id, "status": item.get("status")}, event)
+    if not item.get("upload_id"):
+        return api_response.error_response(409, "Session is not a multipart upload", event)
+
+    part_count = int(item["upload_part_count"])
+    unknown = sorted(n for n in etags if not 1 <= n <= part_count)
+    if unknown:
+        return api_response.error_response(400, f"Invalid part numbers: {unknown}", event)
+    missing = [n for n in range(1, part_count + 1) if n not in etags]
+    if missing:
+        return api_response.json_response(409, {
+            "error": "Missing parts",
+            "missing_parts": missing,
+            "parts": _part_urls(s3, bucket_name, item["s3_key"], item["upload_id"], missing)
+        }, event)
+
+    try:
+        s3.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=item["s3_key"],
+            UploadId=item["upload_id"],
+            MultipartUpload={'Parts': [
+                {'PartNumber': n, 'ETag': etags[n]} for n in range(1, part_count + 1)
+            ]}
+        )
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        if code in ("InvalidPart", "InvalidPartOrder", "EntityTooSmall", "NoSuchUpload"):
+            return api_response.error_response(409, f"{code}: {e.response['Error'].get('Message', '')}", event)
+        raise
+
+    sessions_table.update_item(
+        Key={'session_id': session_id},
+        UpdateExpression="SET upload_completed_at = :now",
+        ExpressionAttributeValues={':now': int(time.time())}
+    )
+    print(f"Upload multipart concluído: {session_id} ({part_count} partes)")
+    return api_response.json_response(200, {"session_id": session_id, "status": item.get("status")}, event)
+
 def lambda_handler(event, context, clients=None):
     """
     Handler com suporte a Injeção de Dependência para testes.
     Args:
         clients: Tupla (s3_client, dynamodb_resource) opcional para testes.
+    POST /sessions cria a sessão (upload único, ou multipart com file_size grande);
+    POST /sessions/{session_id}/complete-upload fecha o multipart (ver _complete_upload);
+    POST /sessions/batch cria várias sessões de uma vez (ver _batch_create).
     """
     print(f"Evento Recebido: {json.dumps(event)}")
 
@@ -43,62 +265,62 @@ def lambda_handler(event, context, clients=None):
         table_name = os.environ.get("TABLE_NAME")
         sessions_table = db.Table(table_name)
 
+        if event.get("routeKey") == COMPLETE_UPLOAD_ROUTE:
+            return _complete_upload(event, s3, sessions_table, bucket_name)
+        if event.get("routeKey") == BATCH_CREATE_ROUTE:
+            return _batch_create(event, s3, db, table_name, bucket_name)
+
         # 1. Parsing do Input
         body = {}
         if event.get("body"):
             body = json.loads(event["body"])
-        
-        job_description = body.get("job_description", "")
-        if len(job_description) > 5000:
-            job_description = job_description[:5000]
 
-        candidate_name = body.get("candidate_name", "Anonymous")
-        question_id = body.get("question_id", "Q1")
+        try:
+            file_size = _declared_size(body)
+        except ValueError as e:
+            return api_response.error_response(400, str(e), event)
+        threshold = int(os.environ.get("MULTIPART_THRESHOLD_BYTES", DEFAULT_MULTIPART_THRESHOLD_BYTES))
+        multipart = file_size is not None and file_size > threshold
 
-        # 2. Gerar ID Único
-        session_id = str(uuid.uuid4())
-        object_key = f"uploads/{session_id}/audio.mp3"
+        # 2-3. Estado inicial (ID único, PENDING_UPLOAD)
+        item = _new_session(body)
+        session_id = item["session_id"]
+        object_key = item["s3_key"]
 
-        # 3. Persistir Estado Inicial
-        item = {
-            "session_id": session_id,
-            "status": "PENDING_UPLOAD",
-            "candidate_name": candidate_name,
-            "question_id": question_id,
-            "s3_key": object_key,
-            "expire_at": int(time.time() + 86400),
-            "job_description": job_description 
-        }
+        if multipart:
+            # Abre o multipart antes de gravar: a sessão já nasce com o upload_id
+            # (se a gravação falhar, o upload órfão é abortado pelo ciclo de vida do bucket)
+            part_size = _part_size(file_size)
+            part_count = math.ceil(file_size / part_size)
+            upload_id = s3.create_multipart_upload(
+                Bucket=bucket_name, Key=object_key, ContentType='audio/mpeg'
+            )['UploadId']
+            item.update({"upload_id": upload_id, "upload_part_size": part_size,
+                         "upload_part_count": part_count})
 
         sessions_table.put_item(Item=item)
 
-        # 4. Gerar URL Assinada
-        presigned_url = s3.generate_presigned_url(
-            ClientMethod='put_object',
-            Params={
-                'Bucket': bucket_name,
-                'Key': object_key,
-                'ContentType': 'audio/mpeg'
-            },
-            ExpiresIn=300
-        )
-
-        return {
-            "statusCode": 201,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*"
-            },
-            "body": json.dumps({
+        if multipart:
+            return api_response.json_response(201, {
                 "message": "Session initiated",
                 "session_id": session_id,
-                "upload_url": presigned_url
-            })
-        }
+                "upload_mode": "multipart",
+                "upload_id": upload_id,
+                "part_size": part_size,
+                "parts": _part_urls(s3, bucket_name, object_key, upload_id, range(1, part_count + 1)),
+                "complete_path": f"/sessions/{session_id}/complete-upload"
+            }, event)
+
+        # 4. Gerar URL Assinada
+        presigned_url = _upload_url(s3, bucket_name, object_key, SINGLE_UPLOAD_URL_EXPIRES)
+
+        return api_response.json_response(201, {
+            "message": "Session initiated",
+            "session_id": session_id,
+            "upload_mode": "single",
+            "upload_url": presigned_url
+        }, event)
 
     except Exception as e:
         print(f"ERRO CRÍTICO: {str(e)}")
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
-        }
\ No newline at end of file
+        return api_response.error_response(500, str(e), event)
\ No newline at end of file
@@ -1,16 +1,84 @@
+import asyncio
 import json
 import os
+import threading
 import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 from google import genai
-from google.genai import types
+from google.genai import errors as genai_errors, types
 import time
-import tempfile
+from core import metrics
+from core.analysis_cache import ContentHasher, audio_fingerprint, build_cache_key, get_cache, is_single_part
+from core.audio_screen import PrescreenCancelled, prescreen
+from core.batch_backend import BatchRequest, get_batch_backend
+from core.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from core.context_cache import ContextCacheRegistry
+from core.deadline import Deadline, DeadlineExceeded
+from core.gemini import GeminiGateway
+from core.model_router import AUDIO_TOKENS_PER_SECOND, ModelRouter
+from core.partial_feedback import PartialFeedbackWriter, partial_feedback_interval
+from core.prompts import ANALYZE_INSTRUCTION, PROMPT_VERSION, SYSTEM_INSTRUCTION, segment_turn, user_turn
+from core.rate_limiter import RateLimitExceeded, get_rate_limiter
+from core.response_parser import INVALID_RESPONSE_ERROR, generation_config, parse_analysis
+from core.s3_stream import ByteRangeView, S3ObjectStream, guess_mime_type
+from core.segments import DEFAULT_MAX_SEGMENTS, format_clock, merge_analyses, plan_segments
+
+# Modelo padrão (jobs de lote da fila deferred). No caminho síncrono o modelo vem do
+# roteador (core.model_router); a versão da tabela de rotas e a do prompt
+# (core.prompts) fazem parte da chave do cache de análises.
+MODEL_NAME = "gemini-2.5-flash-native-audio-preview-09-2025"
+
+# Abaixo deste tamanho o áudio vai inline no generate_content (limite da API: 20 MB
+# por requisição, já contando o prompt e o overhead de base64).
+DEFAULT_INLINE_MAX_BYTES = 4 * 1024 * 1024
+
+# Prazo do polling da Files API (arquivo preso em PROCESSING = Gemini degradado)
+DEFAULT_FILE_POLL_TIMEOUT_SECONDS = 30
+FILE_POLL_INTERVAL_SECONDS = 1.0
+
+# Tempo mínimo restante na invocação para começar um generate_content; com menos
+# que isso a sessão é suspensa (RESUMABLE) em vez de morrer no timeout da Lambda.
+MIN_GENERATE_SECONDS = 10
+
+# Claim atômico da sessão: de quais status um worker pode assumir a análise.
+# PROCESSING também é aceito quando o lease venceu (worker anterior morreu no meio).
+# DEFERRED: adiada com o circuit breaker do Gemini aberto (retomada pelo Retry da Step Function).
+# RESUMABLE: suspensa perto do fim da invocação, com o progresso salvo em `resume`.
+CLAIMABLE_STATUSES = ("PENDING_UPLOAD", "RETRY_PENDING", "DEFERRED", "RESUMABLE")
+RESUME_FIELDS = ("resume",)
+# Texto parcial da geração em streaming (core.partial_feedback); sai com o resultado final
+PARTIAL_FIELDS = ("partial_feedback",)
+DEFAULT_CLAIM_LEASE_SECONDS = 90  # > timeout da Lambda (60 s)
+
+# Modo lote: quantas sessões analisadas ao mesmo tempo por invocação
+DEFAULT_BATCH_CONCURRENCY = 4
+
+# Fila "deferred" (Batch API): sessões sem urgência acumulam no índice esparso
+# batch_state (QUEUED -> SUBMITTED) e são enviadas como um único job de lote.
+BATCH_STATE_INDEX = "batch-state-index"
+DEFERRED_MODE = "deferred"
+DEFERRED_FIELDS = ("batch_state", "batch_job", "batch_position", "audio_location")
+DEFAULT_DEFERRED_MAX_SIZE = 100
+DEFAULT_DEFERRED_MIN_SIZE = 10
+DEFAULT_DEFERRED_MAX_WAIT_SECONDS = 3600
+DEFAULT_DEFERRED_MAX_ATTEMPTS = 3
+
+# Estimativa de tokens de saída por chamada para o rate limiter
+OUTPUT_TOKENS_ESTIMATE = 1024
 
 # --- Padrão Singleton para Clientes ---
 _S3_CLIENT = None
 _DYNAMODB_RES = None
 _GENAI_CLIENT = None
 
+# Cached contents do Gemini por vaga (sobrevive entre invocações no warm start)
+_CONTEXT_CACHE = ContextCacheRegistry()
+
+# Event loop persistente: o client.aio mantém conexões presas ao loop em que foram
+# abertas, então reaproveitamos o mesmo loop entre invocações (warm start).
+_EVENT_LOOP = None
+
 def get_resources():
     global _S3_CLIENT, _DYNAMODB_RES, _GENAI_CLIENT
     
@@ -28,130 +96,826 @@ def get_resources():
             
     return _S3_CLIENT, _DYNAMODB_RES, _GENAI_CLIENT
 
-def lambda_handler(event, context, resources=None):
+def _gateway(resources, use_aio=False):
+    """Fachada do client Gemini com rate limiter e circuit breaker compartilhados (tabela de controle)."""
+    _, db, ai_client = resources
+    return GeminiGateway(
+        ai_client, use_aio=use_aio,
+        limiter=get_rate_limiter(db), breaker=get_circuit_breaker(db)
+    )
+
+def _run(coro):
+    global _EVENT_LOOP
+    if _EVENT_LOOP is None or _EVENT_LOOP.is_closed():
+        _EVENT_LOOP = asyncio.new_event_loop()
+    return _EVENT_LOOP.run_until_complete(coro)
+
+def _update_status(table, sid, status, error_msg=None, remove=(), fields=None):
+    params = {
+        'Key': {'session_id': sid},
+        'UpdateExpression': "SET #s = :status",
+        'ExpressionAttributeNames': {'#s': 'status'},
+        'ExpressionAttributeValues': {':status': status}
+    }
+    if error_msg:
+        params['UpdateExpression'] += ", error_message = :err"
+        params['ExpressionAttributeValues'][':err'] = error_msg
+    for name, value in (fields or {}).items():
+        params['UpdateExpression'] += f", {name} = :{name}"
+        params['ExpressionAttributeValues'][f':{name}'] = value
+    if remove:
+        params['UpdateExpression'] += " REMOVE " + ", ".join(remove)
+    table.update_item(**params)
+
+def _claim_session(table, session_id):
     """
-    Executa a análise de IA usando o novo SDK google-genai (v1.0+).
+    Um único UpdateItem condicional: marca PROCESSING (com lease) e já devolve o
+    item inteiro (job_description etc.). Retorna (item, None) quando o claim deu
+    certo ou (None, status_atual) quando outra execução já cuidou/está cuidando da sessão.
+    Sessão inexistente (TTL, apagada ou evento forjado) não é criada: (None, None).
     """
-    print(f"Worker Iniciado. Payload: {json.dumps(event)}")
-    
-    s3, db, ai_client = resources if resources else get_resources()
-    
-    table_name = os.environ.get("TABLE_NAME")
-    table = db.Table(table_name)
-    
-    # 1. Leitura Direta
+    now = int(time.time())
+    lease = int(os.environ.get("CLAIM_LEASE_SECONDS", DEFAULT_CLAIM_LEASE_SECONDS))
+    claimable = {f':claimable{i}': status for i, status in enumerate(CLAIMABLE_STATUSES)}
+    try:
+        response = table.update_item(
+            Key={'session_id': session_id},
+            UpdateExpression="SET #s = :processing, lease_until = :lease, claimed_at = :now ADD attempts :one",
+            ConditionExpression=(
+                f"attribute_exists(session_id) AND (#s IN ({', '.join(claimable)}) OR "
+                "(#s = :processing AND (attribute_not_exists(lease_until) OR lease_until < :now)))"
+            ),
+            ExpressionAttributeNames={'#s': 'status'},
+            ExpressionAttributeValues={
+                ':processing': 'PROCESSING',
+                **claimable,
+                ':lease': now + lease,
+                ':now': now,
+                ':one': 1
+            },
+            ReturnValues="ALL_NEW",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD"
+        )
+        return response['Attributes'], None
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        current = e.response.get('Item', {}).get('status', {}).get('S')
+        return None, current
+
+def _release_claim(table, session_id, error_msg, status="RETRY_PENDING", progress=None):
+    """
+    Falha transitória: devolve a sessão para RETRY_PENDING (DEFERRED com o circuito
+    aberto, RESUMABLE com o prazo da invocação esgotado), só se ainda estiver
+    PROCESSING. O progresso (arquivos no Gemini, trechos prontos) vai junto.
+    """
+    update = "SET #s = :retry, error_message = :err"
+    values = {
+        ':retry': status,
+        ':processing': 'PROCESSING',
+        ':err': error_msg[:500]
+    }
+    if _has_progress(progress):
+        update += ", resume = :resume"
+        values[':resume'] = progress
+    try:
+        table.update_item(
+            Key={'session_id': session_id},
+            UpdateExpression=update + " REMOVE lease_until",
+            ConditionExpression="#s = :processing",
+            ExpressionAttributeNames={'#s': 'status'},
+            ExpressionAttributeValues=values
+        )
+    except Exception as e:
+        print(f"Não foi possível liberar a sessão {session_id}: {str(e)}")
+
+def _load_progress(session_item):
+    """
+    Progresso de uma tentativa anterior: {'files': {parte: arquivo no Gemini},
+    'results': {parte: análise do trecho}}. Parte = "full:<bytes>" ou "seg:<quadros>".
+    """
+    saved = session_item.get('resume') or {}
+    return {'files': dict(saved.get('files') or {}), 'results': dict(saved.get('results') or {})}
+
+def _has_progress(progress):
+    return bool(progress and (progress['files'] or progress['results']))
+
+def _enqueue_deferred(table, session_id, audio_location, cache_key=None):
+    """PROCESSING -> QUEUED: a sessão entra no índice esparso batch_state e libera o lease."""
+    params = {
+        ':queued': 'QUEUED',
+        ':processing': 'PROCESSING',
+        ':now': int(time.time()),
+        ':location': audio_location
+    }
+    update = "SET #s = :queued, batch_state = :queued, queued_at = :now, audio_location = :location"
+    if cache_key:
+        update += ", cache_key = :cache_key"
+        params[':cache_key'] = cache_key
+    table.update_item(
+        Key={'session_id': session_id},
+        UpdateExpression=update + " REMOVE lease_until",
+        ConditionExpression="#s = :processing",
+        ExpressionAttributeNames={'#s': 'status'},
+        ExpressionAttributeValues=params
+    )
+
+def _inline_max_bytes():
+    return int(os.environ.get("INLINE_AUDIO_MAX_BYTES", DEFAULT_INLINE_MAX_BYTES))
+
+async def _prepare_audio_part(gemini, upload_stream, mime_type, inline_max_bytes=None,
+                              deadline=None, progress=None, part=None):
+    """
+    Gravações curtas vão inline (bytes no próprio generate_content), sem o ciclo
+    upload -> polling -> files.get. Só arquivos grandes usam a Files API; o arquivo
+    enviado fica em progress['files'][part] e uma nova tentativa o reaproveita.
+    Retorna (parte_de_conteúdo, caminho) onde caminho é "inline" ou "files_api".
+    """
+    deadline = deadline or Deadline()
+    size = upload_stream.size
+    if inline_max_bytes is None:
+        inline_max_bytes = _inline_max_bytes()
+    if size <= inline_max_bytes:
+        print(f"Enviando {size} bytes inline para o Gemini...")
+        metrics.incr("AudioBytes", size, path="inline")
+        upload_stream.seek(0)
+        data = await asyncio.to_thread(upload_stream.read)
+        return types.Part.from_bytes(data=data, mime_type=mime_type), "inline"
+
+    myfile = None
+    saved_name = progress['files'].get(part) if progress and part else None
+    if saved_name:
+        # Tentativa anterior já subiu este áudio (arquivos ficam 48 h na Files API)
+        try:
+            myfile = await deadline.run(gemini.get_file(name=saved_name), "file_resume")
+        except genai_errors.ClientError as e:
+            print(f"Arquivo {saved_name} não está mais disponível ({str(e)}): novo upload.")
+        if myfile is not None and myfile.state.name == "FAILED":
+            myfile = None
+        if myfile is not None:
+            print(f"Retomando com o arquivo {saved_name} já enviado ao Gemini.")
+            metrics.incr("ResumedUpload")
+
+    if myfile is None:
+        print(f"Enviando {size} bytes para o Gemini (Files API, streaming)...")
+        metrics.incr("AudioBytes", size, path="files_api")
+
+        # Upload agora é via client.files (aceita IOBase + mime_type)
+        with metrics.timer("GeminiUploadMs", path="files_api"):
+            myfile = await deadline.run(
+                gemini.upload(file=upload_stream, config={'mime_type': mime_type}), "upload"
+            )
+        if progress is not None and part:
+            progress['files'][part] = myfile.name
+
+    # Polling de processamento (com prazo: não consumir a Lambda inteira esperando)
+    poll_deadline = time.monotonic() + float(os.environ.get("FILE_POLL_TIMEOUT_SECONDS", DEFAULT_FILE_POLL_TIMEOUT_SECONDS))
+    with metrics.timer("GeminiFilePollMs", path="files_api"):
+        while myfile.state.name == "PROCESSING":
+            if time.monotonic() > poll_deadline:
+                await gemini.record_failure()
+                raise TimeoutError(f"Arquivo {myfile.name} ainda em PROCESSING no Gemini após o prazo de polling.")
+            # Sem tempo para o generate depois do polling: suspende (o arquivo já está no progresso)
+            deadline.require(MIN_GENERATE_SECONDS + FILE_POLL_INTERVAL_SECONDS, "file_poll")
+            await asyncio.sleep(deadline.budget(FILE_POLL_INTERVAL_SECONDS))
+            # Get file agora é via client.files.get
+            myfile = await deadline.run(gemini.get_file(name=myfile.name), "file_poll")
+
+    if myfile.state.name == "FAILED":
+        if progress is not None and part:
+            progress['files'].pop(part, None)
+        raise ValueError("O processamento do arquivo de áudio falhou no Gemini.")
+    return myfile, "files_api"
+
+def _estimate_tokens(audio_seconds, contents):
+    """Estimativa de tokens de uma análise (rate limiter): áudio + texto + saída."""
+    text = SYSTEM_INSTRUCTION + "".join(c for c in contents if isinstance(c, str))
+    return int(audio_seconds * AUDIO_TOKENS_PER_SECOND + len(text) // 4 + OUTPUT_TOKENS_ESTIMATE)
+
+def _build_request(audio_part, job_description, cached_content, segment=None):
+    """
+    (contents, config) do generate_content. Com cached content a vaga já está no
+    cache e o turno leva só a instrução curta. segment = (índice, total, início_s, fim_s).
+    """
+    if cached_content:
+        turn = ANALYZE_INSTRUCTION
+        config = generation_config(cached_content=cached_content)
+    else:
+        turn = user_turn(job_description)
+        config = generation_config(system_instruction=SYSTEM_INSTRUCTION)
+    if segment:
+        index, total, start_s, end_s = segment
+        turn = segment_turn(turn, index, total, format_clock(start_s), format_clock(end_s))
+    return [audio_part, turn], config
+
+async def _generate(gemini, deadline, model, contents, config, tokens, on_text=None):
+    """
+    generate_content só com tempo suficiente e limitado ao prazo (timeout HTTP + wait_for).
+    Com on_text usa o streaming e repassa o texto acumulado a cada chunk.
+    """
+    deadline.require(MIN_GENERATE_SECONDS, "generate")
+    if deadline.bounded:
+        config.http_options = types.HttpOptions(timeout=int(deadline.budget() * 1000))
+    if on_text is not None:
+        call = gemini.generate_stream(model=model, contents=contents, config=config,
+                                      on_text=on_text, tokens=tokens)
+    else:
+        call = gemini.generate(model=model, contents=contents, config=config, tokens=tokens)
+    return await deadline.run(call, "generate")
+
+async def _analyze_segments(gemini, model, location, audio_stream, profile, segments,
+                            mime_type, job_description, context_task, timeline,
+                            deadline=None, progress=None):
+    """
+    Map-reduce de uma gravação longa: cada trecho (cortado em pausa) é enviado e
+    analisado em paralelo, com stream do S3 restrito ao trecho; o reduce é local (merge_analyses).
+    Trechos prontos ficam em progress['results'] e não são refeitos numa retomada.
+    Retorna (dados, resultado_do_parse).
+    """
+    deadline = deadline or Deadline()
+    progress = progress if progress is not None else _load_progress({})
+    s3, bucket_name, s3_key = location
+    total = len(segments)
+    semaphore = asyncio.Semaphore(int(os.environ.get("SEGMENT_CONCURRENCY", DEFAULT_MAX_SEGMENTS)))
+    print(f"Gravação longa ({profile.duration_s:.0f}s): analisando {total} trechos em paralelo...")
+    metrics.incr("AnalysisSegments", total)
+
+    async def analyze(index, first, last):
+        start_s, end_s = first * profile.frame_s, last * profile.frame_s
+        part = f"seg:{first}-{last}"
+        if part in progress['results']:
+            metrics.incr("ResumedSegment")
+            return progress['results'][part], "resumed", start_s, end_s
+        async with semaphore:
+            # Stream próprio limitado aos bytes do trecho: partes e prefetch não
+            # passam de [start, end) (nada de buffers/GETs duplicados entre trechos)
+            start, end, prefix = profile.byte_range(first, last)
+            stream = S3ObjectStream(s3, bucket_name, s3_key, head=audio_stream.head, window=(start, end))
+            try:
+                with timeline.stage(f"segment_{index}"):
+                    view = ByteRangeView(stream, start, end, prefix)
+                    audio_part, ingest_path = await _prepare_audio_part(
+                        gemini, view, mime_type, deadline=deadline, progress=progress, part=part
+                    )
+                    contents, config = _build_request(
+                        audio_part, job_description, await context_task, (index, total, start_s, end_s)
+                    )
+                    with metrics.timer("GeminiGenerateMs", path=ingest_path):
+                        response = await _generate(
+                            gemini, deadline, model, contents, config,
+                            _estimate_tokens(end_s - start_s, contents)
+                        )
+            finally:
+                stream.close()
+        data, outcome = parse_analysis(response)
+        if outcome != "failed":
+            progress['results'][part] = data
+        return data, outcome, start_s, end_s
+
+    # Todos os trechos terminam (ou estouram o prazo) antes de propagar o erro: o que
+    # ficou pronto entra no progresso salvo
+    results = await asyncio.gather(*(
+        analyze(index, first, last) for index, (first, last) in enumerate(segments, start=1)
+    ), return_exceptions=True)
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if failures:
+        raise next((e for e in failures if not isinstance(e, DeadlineExceeded)), failures[0])
+
+    # Um trecho fora do formato invalida o conjunto (mesma regra da chamada única)
+    if any(outcome == "failed" for _, outcome, _, _ in results):
+        return {"error": INVALID_RESPONSE_ERROR}, "failed"
+    with timeline.stage("reduce"):
+        merged = merge_analyses([(data, start_s, end_s) for data, _, start_s, end_s in results])
+    return merged, "segmented"
+
+def _save_result(table, session_id, ai_data, cache_hit=False, remove=(), model_routing=None):
+    """
+    Persiste o resultado da análise (vindo do Gemini ou do cache).
+    model_routing: escolha do roteador + latências, gravada para calibrar a tabela de rotas.
+    """
+    fields = {'model_routing': model_routing} if model_routing else {}
+    if "error" in ai_data:
+        _update_status(table, session_id, "ERROR", ai_data["error"], remove=remove, fields=fields)
+    else:
+        _update_status(table, session_id, "COMPLETED", remove=remove, fields={
+            'ai_feedback': ai_data,
+            'updated_at': str(int(time.time())),
+            'cache_hit': cache_hit,
+            **fields
+        })
+
+def _validate_payload(event):
     session_id = event.get('session_id')
     bucket_name = event.get('bucket')
     s3_key = event.get('key')
 
     if not session_id or not bucket_name or not s3_key:
         raise ValueError("Payload inválido: Faltam dados obrigatórios")
+    return session_id, bucket_name, s3_key
+
+async def _cache_lookup(cache, audio_fp, job_description, routing_version):
+    """
+    (cache_key, resultado em cache ou None) para a gravação + vaga. routing_version:
+    versão do roteador (realtime) ou o modelo fixo da fila deferred.
+    """
+    cache_key = build_cache_key(audio_fp, job_description, PROMPT_VERSION, routing_version)
+    return cache_key, await asyncio.to_thread(cache.get, cache_key)
 
-    local_path = os.path.join(tempfile.gettempdir(), f"{session_id}.mp3")
+async def _serve_cached(table, session_id, cache_key, cached, timeline):
+    print(f"Cache HIT ({cache_key[:12]}...): pulando o Gemini.")
+    await asyncio.to_thread(_save_result, table, session_id, cached, True, RESUME_FIELDS)
+    timeline.emit(outcome="cache_hit")
+    return {"status": "COMPLETED", "session_id": session_id, "cache": "HIT"}
 
+async def _stop_prescreen(screen_task, cancel):
+    """
+    Para a pré-triagem e espera a thread sair. task.cancel() só cancelaria o await:
+    a thread do to_thread continuaria lendo o stream.
+    """
+    if not screen_task.done():
+        cancel.set()
     try:
-        # 2. Busca Contexto
-        db_response = table.get_item(Key={'session_id': session_id})
-        job_description = db_response.get('Item', {}).get('job_description', "")
-        
-        # Helper interno para atualizar status
-        def _update_status(sid, status, error_msg=None):
-            params = {
-                'Key': {'session_id': sid},
-                'UpdateExpression': "SET #s = :status",
-                'ExpressionAttributeNames': {'#s': 'status'},
-                'ExpressionAttributeValues': {':status': status}
-            }
-            if error_msg:
-                params['UpdateExpression'] += ", error_message = :err"
-                params['ExpressionAttributeValues'][':err'] = error_msg
-            table.update_item(**params)
-        
-        _update_status(session_id, "PROCESSING")
+        await screen_task
+    except PrescreenCancelled:
+        metrics.incr("PrescreenCancelled")
+    except Exception:
+        pass  # Já propagado (ou irrelevante) no fluxo principal
 
-        # 3. Download do S3
-        print(f"Baixando de {bucket_name}/{s3_key} para {local_path}...")
-        s3.download_file(bucket_name, s3_key, local_path)
-        
-        # 4. Enviar para Gemini (Nova Sintaxe)
-        print("Enviando arquivo para o Gemini...")
-        
-        # Upload agora é via client.files
-        myfile = ai_client.files.upload(file=local_path)
-        
-        # Polling de processamento
-        while myfile.state.name == "PROCESSING":
-            time.sleep(1)
-            # Get file agora é via client.files.get
-            myfile = ai_client.files.get(name=myfile.name)
-
-        if myfile.state.name == "FAILED":
-            raise ValueError("O processamento do arquivo de áudio falhou no Gemini.")
-
-        # 5. Montagem do Prompt
-        base_prompt = """
-        Você é um Recrutador Técnico Sênior.
-        Sua tarefa é analisar o áudio fornecido.
-        """
-
-        context_instruction = ""
-        if job_description:
-            context_instruction = f"""
-            CONTEXTO DA VAGA:
-            "{job_description}"
-            Avalie se o candidato demonstra os conhecimentos exigidos.
-            """
-
-        prompt = f"""
-        {base_prompt}
-        {context_instruction}
-
-        REGRAS CRÍTICAS:
-        1. Analise APENAS o áudio.
-        2. Se silêncio/ruído, retorne {{"error": "AUDIO_INAUDIVEL"}}.
-
-        Formato de Resposta (JSON Puro):
-        {{
-            "technical_score": (0-100),
-            "summary": "Resumo",
-            "feedback": "Feedback"
-        }}
-        """
-        
-        print("Gerando conteúdo...")
-        # Geração agora é via client.models.generate_content
-        response = ai_client.models.generate_content(
-            model="gemini-2.5-flash-native-audio-preview-09-2025",
-            contents=[myfile, prompt]
+async def _analyze_session(event, resources, gemini, deadline=None):
+    """
+    Pipeline completo de uma sessão (usado pelo handler unitário e pelo modo lote).
+    Etapas independentes rodam em paralelo; chamadas boto3 rodam em threads para
+    não bloquear o event loop. A Timeline registra o caminho crítico por estágio.
+    deadline: prazo da invocação; esgotado, a sessão fica RESUMABLE com o progresso salvo.
+    """
+    s3, db, _ = resources
+    deadline = deadline or Deadline()
+    table = db.Table(os.environ.get("TABLE_NAME"))
+    timeline = metrics.Timeline()
+    router = ModelRouter()
+
+    # 1. Leitura Direta
+    session_id, bucket_name, s3_key = _validate_payload(event)
+
+    audio_stream = None
+    screen_task = None
+    screen_cancel = threading.Event()
+    claimed = False
+    progress = None
+
+    try:
+        # 2. Claim atômico (contexto + PROCESSING em 1 round-trip) e stream do S3 (sem /tmp), em paralelo
+        print(f"Abrindo stream de {bucket_name}/{s3_key}...")
+        claim_result, stream_result = await asyncio.gather(
+            timeline.run("claim", asyncio.to_thread(_claim_session, table, session_id)),
+            timeline.run("s3_open", asyncio.to_thread(S3ObjectStream, s3, bucket_name, s3_key)),
+            return_exceptions=True
+        )
+        if not isinstance(stream_result, Exception):
+            audio_stream = stream_result
+        if isinstance(claim_result, Exception):
+            raise claim_result
+        session_item, current_status = claim_result
+        claimed = session_item is not None
+        if isinstance(stream_result, Exception):
+            raise stream_result
+        if not claimed:
+            # Evento duplicado do S3 ou retry concorrente: não analisar (nem pagar o Gemini) de novo
+            print(f"Sessão {session_id} já está em {current_status}: ignorando.")
+            metrics.incr("SessionClaimSkipped", status=current_status or "UNKNOWN")
+            return {"status": "SKIPPED", "session_id": session_id, "current_status": current_status}
+        job_description = session_item.get('job_description', "")
+        progress = _load_progress(session_item)
+
+        # Gemini fora do ar (circuito aberto): adia já, sem baixar/subir áudio nem fazer polling
+        if not await gemini.available():
+            metrics.incr("SessionDeferred", reason="breaker_open")
+            raise CircuitOpenError(f"Gemini indisponível (circuit breaker aberto): sessão {session_id} adiada")
+
+        # 3. Cache por conteúdo e pré-triagem local
+        # A fila deferred sempre usa MODEL_NAME (sem roteador): a chave segue o modelo de cada
+        # caminho, para um resultado do lote nunca servir uma sessão realtime e vice-versa.
+        deferred = session_item.get('analysis_mode') == DEFERRED_MODE and not event.get('force_realtime')
+        routing_version = MODEL_NAME if deferred else router.version
+        cache = get_cache(db)
+        cache_task = None
+        hasher = None
+        if cache and is_single_part(audio_stream.head):
+            # Upload simples: o ETag já é o MD5 do conteúdo, consulta em paralelo com a pré-triagem
+            cache_task = asyncio.ensure_future(timeline.run("cache_lookup", _cache_lookup(
+                cache, audio_fingerprint(audio_stream), job_description, routing_version
+            )))
+        elif cache:
+            # Multipart: o ETag não identifica o conteúdo; o SHA-256 sai das leituras da
+            # pré-triagem (nunca de um hash declarado pelo cliente) e a consulta vem depois dela
+            hasher = ContentHasher(audio_stream)
+        screen_task = asyncio.ensure_future(
+            timeline.run("prescreen", asyncio.to_thread(prescreen, hasher or audio_stream, screen_cancel))
         )
-        
-        response_text = response.text.replace("```json", "").replace("```", "").strip()
-        ai_data = json.loads(response_text)
 
-        # 6. Salvar Resultado
-        if "error" in ai_data:
-             _update_status(session_id, "ERROR", ai_data["error"])
+        cache_key = None
+        if cache_task:
+            cache_key, cached = await cache_task
+            if cached is not None:
+                screen_cancel.set()  # a thread sai no próximo bloco; o finally espera por ela
+                return await _serve_cached(table, session_id, cache_key, cached, timeline)
+
+        screen = await screen_task
+        profile = screen.profile
+        print(f"Pré-triagem: formato={profile.format}, duração={profile.duration_s:.1f}s, "
+              f"ativo={profile.active_seconds:.1f}s")
+        if not screen.accepted:
+            print(f"Áudio rejeitado localmente ({screen.reason}).")
+            metrics.incr("PrescreenRejected", reason=screen.reason)
+            await asyncio.to_thread(_update_status, table, session_id, "ERROR", "AUDIO_INAUDIVEL")
+            timeline.emit(outcome="rejected")
+            return {"status": "ERROR", "session_id": session_id, "reason": screen.reason}
+
+        if hasher:
+            audio_fp = await asyncio.to_thread(hasher.fingerprint)  # só lê o que a pré-triagem não leu
+            cache_key, cached = await timeline.run("cache_lookup", _cache_lookup(
+                cache, audio_fp, job_description, routing_version
+            ))
+            if cached is not None:
+                return await _serve_cached(table, session_id, cache_key, cached, timeline)
+
+        mime_type = guess_mime_type(audio_stream, s3_key)
+
+        # Sessão sem urgência: entra na fila do próximo job de lote (deferred_handler)
+        if deferred:
+            await asyncio.to_thread(
+                _enqueue_deferred, table, session_id,
+                {'bucket': bucket_name, 'key': s3_key, 'mime_type': mime_type}, cache_key
+            )
+            metrics.incr("DeferredQueued")
+            timeline.emit(outcome="deferred")
+            return {"status": "QUEUED", "session_id": session_id}
+
+        analysis_start = time.perf_counter()
+        segments = plan_segments(profile, *screen.frames) if screen.frames else []
+
+        # Roteamento: modelo pela duração/bytes/tokens (do trecho mais longo, se segmentado)
+        turn_text = user_turn(job_description)
+        upload_stream = audio_stream
+        if len(segments) > 1:
+            longest = max(last - first for first, last in segments)
+            measure = router.measure(longest * profile.frame_s,
+                                     int(audio_stream.size * longest / profile.frame_count), turn_text)
         else:
-            table.update_item(
-                Key={'session_id': session_id},
-                UpdateExpression="SET #s = :status, ai_feedback = :feedback, updated_at = :time",
-                ExpressionAttributeNames={'#s': 'status'},
-                ExpressionAttributeValues={
-                    ':status': 'COMPLETED',
-                    ':feedback': ai_data,
-                    ':time': str(int(time.time()))
-                }
+            # Corta silêncio do início/fim: menos bytes enviados e menos áudio para o modelo
+            audio_seconds = profile.duration_s
+            if screen.trim:
+                upload_stream = ByteRangeView(audio_stream, *screen.trim)
+                metrics.incr("PrescreenTrimmedBytes", audio_stream.size - upload_stream.size)
+                audio_seconds = (screen.frames[1] - screen.frames[0]) * profile.frame_s
+            measure = router.measure(audio_seconds, upload_stream.size, turn_text)
+        decision = router.route(measure)
+        decision_ms = (time.perf_counter() - analysis_start) * 1000
+
+        # Context cache da vaga (por modelo) em paralelo com o envio do áudio (inline ou Files API)
+        context_task = asyncio.ensure_future(timeline.run("context_cache", _CONTEXT_CACHE.lookup(
+            gemini, decision.model, job_description, cache.table if cache else None
+        )))
+
+        if len(segments) > 1:
+            # 4/5. Gravação longa: trechos analisados em paralelo + reduce local
+            generate_start = time.perf_counter()
+            ai_data, parse_outcome = await _analyze_segments(
+                gemini, decision.model, (s3, bucket_name, s3_key), audio_stream, profile, segments,
+                mime_type, job_description, context_task, timeline, deadline, progress
             )
+            generate_ms = (time.perf_counter() - generate_start) * 1000
+            ingest_path = "segmented"
+        else:
+            # 4. Envio do áudio (inline ou Files API) em paralelo com o context cache da vaga
+            (audio_part, ingest_path), cached_content = await asyncio.gather(
+                timeline.run("ingest", _prepare_audio_part(
+                    gemini, upload_stream, mime_type,
+                    deadline=deadline, progress=progress, part=f"full:{upload_stream.size}"
+                )),
+                context_task,
+            )
+
+            # Formato desconhecido: a medição por bytes é provisória, confirma com count_tokens
+            if not decision.measure.exact:
+                count_start = time.perf_counter()
+                with timeline.stage("count_tokens"):
+                    counted = await gemini.count_tokens(decision.model, [audio_part, turn_text])
+                previous_model = decision.model
+                decision = router.route(router.with_counted_tokens(decision.measure, counted))
+                if decision.model != previous_model:
+                    cached_content = await _CONTEXT_CACHE.lookup(
+                        gemini, decision.model, job_description, cache.table if cache else None
+                    )
+                decision_ms += (time.perf_counter() - count_start) * 1000
+            print(f"Modelo: {decision.model} (rota {decision.route.name}, "
+                  f"{decision.measure.duration_s:.0f}s, ~{decision.measure.tokens} tokens)")
+
+            # 5. Prompt: parte fixa pré-compilada + vaga (referência do cache quando disponível)
+            contents, config = _build_request(audio_part, job_description, cached_content)
+
+            print("Gerando conteúdo...")
+            # Com PARTIAL_FEEDBACK_INTERVAL_SECONDS: streaming, summary/feedback parciais vão
+            # para a sessão durante a geração (escritas coalescidas)
+            interval = partial_feedback_interval()
+            writer = PartialFeedbackWriter(table, session_id, interval) if interval is not None else None
+            generate_start = time.perf_counter()
+            try:
+                with metrics.timer("GeminiGenerateMs", path=ingest_path), timeline.stage("generate"):
+                    response = await _generate(
+                        gemini, deadline, decision.model, contents, config,
+                        _estimate_tokens(decision.measure.duration_s, contents),
+                        on_text=writer.update if writer else None
+                    )
+            finally:
+                if writer:
+                    await writer.close()
+            generate_ms = (time.perf_counter() - generate_start) * 1000
+
+            # JSON via schema; texto fora do formato passa pelo extrator tolerante (sem retry)
+            ai_data, parse_outcome = parse_analysis(response)
+        metrics.incr("ModelRouted", route=decision.route.name)
+        metrics.timing("ModelGenerateMs", generate_ms, route=decision.route.name)
+        metrics.timing("AnalysisLatencyMs", (time.perf_counter() - analysis_start) * 1000, path=ingest_path)
+
+        # 6. Salvar Resultado e alimentar o cache (independentes)
+        with timeline.stage("save"):
+            writes = [asyncio.to_thread(
+                _save_result, table, session_id, ai_data, remove=RESUME_FIELDS + PARTIAL_FIELDS,
+                model_routing=decision.record(decision_ms, generate_ms)
+            )]
+            if cache and parse_outcome != "failed":
+                writes.append(asyncio.to_thread(
+                    cache.put, cache_key, ai_data, model=decision.model, prompt_version=PROMPT_VERSION
+                ))
+            await asyncio.gather(*writes)
+
+        timeline.emit(outcome="analyzed")
+        result = {"status": "COMPLETED", "session_id": session_id, "ingest_path": ingest_path,
+                  "model": decision.model}
+        if ingest_path == "segmented":
+            result["segments"] = len(segments)
+        return result
 
-        return {"status": "COMPLETED", "session_id": session_id}
 
     except Exception as e:
-        print(f"ERRO FATAL: {str(e)}")
+        if isinstance(e, DeadlineExceeded):
+            print(f"Prazo da invocação acabando ({session_id}): {str(e)}. Salvando progresso.")
+            metrics.incr("SessionResumable")
+            status = "RESUMABLE"
+        else:
+            print(f"ERRO FATAL ({session_id}): {str(e)}")
+            status = "DEFERRED" if isinstance(e, CircuitOpenError) else "RETRY_PENDING"
+        if claimed:
+            await asyncio.to_thread(_release_claim, table, session_id, str(e), status, progress)
         raise e 
     
     finally:
-        if os.path.exists(local_path):
+        # Único ponto de fechamento: a thread da pré-triagem precisa ter parado antes
+        if screen_task is not None:
+            await _stop_prescreen(screen_task, screen_cancel)
+        if audio_stream is not None:
+            audio_stream.close()
+
+def lambda_handler(event, context, resources=None):
+    """
+    Executa a análise de IA usando o novo SDK google-genai (v1.0+).
+    """
+    print(f"Worker Iniciado. Payload: {json.dumps(event)}")
+    
+    resources = resources if resources else get_resources()
+    deadline = Deadline.from_context(context)
+    return _run(_analyze_session(event, resources, _gateway(resources), deadline))
+
+def _batch_items(event):
+    """
+    Normaliza a entrada do modo lote em [(identificador, payload)].
+    Aceita: {"sessions": [...]} (Map da Step Function / invocação direta)
+            {"Records": [...]} (lote do SQS; body = payload JSON)
+    """
+    if "Records" in event:
+        items = []
+        for record in event["Records"]:
             try:
-                os.remove(local_path)
-            except:
-                pass
\ No newline at end of file
+                payload = json.loads(record.get("body") or "{}")
+            except ValueError:
+                payload = {}
+            items.append((record.get("messageId"), payload))
+        return items
+    return [(item.get("session_id"), item) for item in event.get("sessions", [])]
+
+async def _analyze_batch(items, resources, gemini, concurrency, deadline=None):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(identifier, payload):
+        async with semaphore:
+            try:
+                result = await _analyze_session(payload, resources, gemini, deadline)
+                return {"id": identifier, "ok": True, **result}
+            except Exception as e:
+                return {"id": identifier, "ok": False, "session_id": payload.get("session_id"), "error": str(e)}
+
+    return await asyncio.gather(*(run_one(i, p) for i, p in items))
+
+def batch_handler(event, context, resources=None):
+    """
+    Modo lote: analisa várias sessões por invocação, em paralelo (client.aio + asyncio).
+    Reusa os clientes "quentes" de get_resources e reporta sucesso/falha por item.
+    Para SQS devolve `batchItemFailures` (ReportBatchItemFailures): só as falhas voltam para a fila.
+    """
+    resources = resources if resources else get_resources()
+    items = _batch_items(event)
+    concurrency = int(os.environ.get("BATCH_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY))
+    print(f"Lote iniciado: {len(items)} sessões, concorrência {concurrency}")
+
+    with metrics.timer("BatchLatencyMs"):
+        results = _run(_analyze_batch(
+            items, resources, _gateway(resources, use_aio=True), concurrency, Deadline.from_context(context)
+        ))
+
+    failed = [r for r in results if not r["ok"]]
+    metrics.incr("BatchItemSucceeded", len(results) - len(failed))
+    metrics.incr("BatchItemFailed", len(failed))
+
+    response = {
+        "results": results,
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed)
+    }
+    if "Records" in event:
+        response["batchItemFailures"] = [{"itemIdentifier": r["id"]} for r in failed]
+    return response
+
+
+# --- Fila "deferred": jobs de lote (Batch API) para sessões sem urgência ---
+
+def _query_batch_state(table, state, limit=None):
+    """Sessões no estado do índice esparso, das mais antigas para as mais novas."""
+    items = []
+    params = {
+        'IndexName': BATCH_STATE_INDEX,
+        'KeyConditionExpression': Key('batch_state').eq(state),
+        'ScanIndexForward': True
+    }
+    while True:
+        if limit:
+            params['Limit'] = limit - len(items)
+        response = table.query(**params)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response or (limit and len(items) >= limit):
+            return items
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def _fail_deferred(table, item, error_msg):
+    """Falha de um item/job: volta para a fila; após DEFERRED_MAX_ATTEMPTS vira ERROR."""
+    session_id = item['session_id']
+    attempts = int(item.get('batch_attempts', 0)) + 1
+    max_attempts = int(os.environ.get("DEFERRED_MAX_ATTEMPTS", DEFAULT_DEFERRED_MAX_ATTEMPTS))
+    print(f"Sessão {session_id} falhou no lote (tentativa {attempts}/{max_attempts}): {error_msg}")
+    if attempts >= max_attempts:
+        metrics.incr("DeferredFailed")
+        _update_status(table, session_id, "ERROR", error_msg[:500], remove=DEFERRED_FIELDS)
+        return
+    metrics.incr("DeferredRequeued")
+    table.update_item(
+        Key={'session_id': session_id},
+        UpdateExpression="SET batch_state = :queued, batch_attempts = :attempts, queued_at = :now, "
+                         "error_message = :err REMOVE batch_job, batch_position",
+        ExpressionAttributeValues={
+            ':queued': 'QUEUED',
+            ':attempts': attempts,
+            ':now': int(time.time()),
+            ':err': error_msg[:500]
+        }
+    )
+
+def _finish_deferred(table, cache, item, response):
+    """Fan-out de uma resposta do lote para a sessão (mesmo parse/persistência do caminho síncrono)."""
+    ai_data, parse_outcome = parse_analysis(response)
+    _save_result(table, item['session_id'], ai_data, remove=DEFERRED_FIELDS)
+    if cache and item.get('cache_key') and parse_outcome != "failed":
+        cache.put(item['cache_key'], ai_data, model=MODEL_NAME, prompt_version=PROMPT_VERSION)
+
+async def _collect_deferred(table, cache, backend):
+    """Uma consulta por job enviado; jobs concluídos têm as respostas gravadas nas sessões."""
+    submitted = await asyncio.to_thread(_query_batch_state, table, 'SUBMITTED')
+    jobs = {}
+    for item in submitted:
+        jobs.setdefault(item['batch_job'], []).append(item)
+
+    summary = {"jobs_polled": len(jobs), "completed": 0, "requeued": 0, "pending_jobs": 0}
+    for job_name, items in jobs.items():
+        items.sort(key=lambda i: int(i.get('batch_position', 0)))
+        poll = await asyncio.to_thread(backend.poll, job_name, [i['session_id'] for i in items])
+        print(f"Job {job_name}: {poll.state} ({len(items)} sessões)")
+
+        if not poll.done and not poll.failed:
+            summary["pending_jobs"] += 1
+            continue
+
+        writes = []
+        for item in items:
+            response, error = poll.results.get(item['session_id'], (None, f"Job {poll.state}"))
+            if response is None:
+                writes.append(asyncio.to_thread(_fail_deferred, table, item, error or "SEM_RESPOSTA"))
+                summary["requeued"] += 1
+            else:
+                writes.append(asyncio.to_thread(_finish_deferred, table, cache, item, response))
+                summary["completed"] += 1
+        await asyncio.gather(*writes)
+
+    metrics.incr("DeferredCompleted", summary["completed"])
+    return summary
+
+async def _submit_deferred(table, resources, backend):
+    """
+    Monta um job com as sessões QUEUED mais antigas. Espera acumular
+    DEFERRED_BATCH_MIN_SIZE, a menos que a mais antiga já espere DEFERRED_MAX_WAIT_SECONDS.
+    Retorna o nome do job ou None.
+    """
+    s3, _, ai_client = resources
+    max_size = int(os.environ.get("DEFERRED_BATCH_MAX_SIZE", DEFAULT_DEFERRED_MAX_SIZE))
+    min_size = int(os.environ.get("DEFERRED_BATCH_MIN_SIZE", DEFAULT_DEFERRED_MIN_SIZE))
+    max_wait = int(os.environ.get("DEFERRED_MAX_WAIT_SECONDS", DEFAULT_DEFERRED_MAX_WAIT_SECONDS))
+
+    queued = await asyncio.to_thread(_query_batch_state, table, 'QUEUED', max_size)
+    if not queued:
+        return None
+    waited = int(time.time()) - int(queued[0]['queued_at'])
+    if len(queued) < min_size and waited < max_wait:
+        print(f"Fila deferred com {len(queued)} sessões (mais antiga há {waited}s): acumulando.")
+        return None
+
+    gemini = _gateway(resources)
+    if not await gemini.available():
+        print("Circuit breaker aberto: envio do lote fica para a próxima execução.")
+        return None
+    semaphore = asyncio.Semaphore(int(os.environ.get("BATCH_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY)))
+
+    async def prepare(item):
+        location = item['audio_location']
+        async with semaphore:
+            stream = await asyncio.to_thread(S3ObjectStream, s3, location['bucket'], location['key'])
+            try:
+                # Sempre Files API: bytes inline inflariam o corpo do job de lote
+                audio_part, _ = await _prepare_audio_part(gemini, stream, location['mime_type'], inline_max_bytes=0)
+            finally:
+                stream.close()
+        contents, config = _build_request(audio_part, item.get('job_description', ""), None)
+        return BatchRequest(key=item['session_id'], contents=contents, config=config)
+
+    prepared = await asyncio.gather(*(prepare(item) for item in queued), return_exceptions=True)
+    requests, ready = [], []
+    for item, result in zip(queued, prepared):
+        if isinstance(result, (RateLimitExceeded, CircuitOpenError)):
+            continue  # Sem cota/Gemini fora agora: fica na fila (sem contar tentativa) para a próxima execução
+        if isinstance(result, Exception):
+            await asyncio.to_thread(_fail_deferred, table, item, str(result))
+        else:
+            requests.append(result)
+            ready.append(item)
+    if not requests:
+        return None
+
+    job_name = await asyncio.to_thread(
+        backend.submit, MODEL_NAME, requests, f"deferred-{int(time.time())}"
+    )
+    print(f"Job de lote {job_name} enviado com {len(requests)} sessões.")
+    metrics.incr("DeferredSubmitted", len(requests))
+
+    def mark_submitted(position, item):
+        table.update_item(
+            Key={'session_id': item['session_id']},
+            UpdateExpression="SET batch_state = :submitted, batch_job = :job, batch_position = :pos, submitted_at = :now",
+            ExpressionAttributeValues={
+                ':submitted': 'SUBMITTED',
+                ':job': job_name,
+                ':pos': position,
+                ':now': int(time.time())
+            }
+        )
+
+    await asyncio.gather(*(
+        asyncio.to_thread(mark_submitted, position, item) for position, item in enumerate(ready)
+    ))
+    return job_name
+
+def deferred_handler(event, context, resources=None, backend=None):
+    """
+    Agendador da fila deferred (EventBridge): a cada execução consulta uma vez
+    cada job enviado, grava os resultados prontos e envia um novo job com as
+    sessões acumuladas. Troca latência por throughput e custo menor.
+    """
+    resources = resources if resources else get_resources()
+    backend = backend if backend else get_batch_backend(resources[2])
+    table = resources[1].Table(os.environ.get("TABLE_NAME"))
+    cache = get_cache(resources[1])
+
+    async def run():
+        summary = await _collect_deferred(table, cache, backend)
+        summary["submitted_job"] = await _submit_deferred(table, resources, backend)
+        return summary
+
+    summary = _run(run())
+    print(f"Fila deferred: {json.dumps(summary)}")
+    return summary
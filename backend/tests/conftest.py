@@ -29,7 +29,69 @@ def dynamodb_resource(aws_credentials):
         dynamodb.create_table(
             TableName=os.environ["TABLE_NAME"],
             KeySchema=[{'AttributeName': 'session_id', 'KeyType': 'HASH'}],
-            AttributeDefinitions=[{'AttributeName': 'session_id', 'AttributeType': 'S'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'session_id', 'AttributeType': 'S'},
+                {'AttributeName': 'batch_state', 'AttributeType': 'S'},
+                {'AttributeName': 'queued_at', 'AttributeType': 'N'},
+                {'AttributeName': 'owner', 'AttributeType': 'S'},
+                {'AttributeName': 'question_id', 'AttributeType': 'S'},
+                {'AttributeName': 'created_at', 'AttributeType': 'N'}
+            ],
+            # Índice esparso da fila deferred (só sessões com batch_state)
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'batch-state-index',
+                'KeySchema': [
+                    {'AttributeName': 'batch_state', 'KeyType': 'HASH'},
+                    {'AttributeName': 'queued_at', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'},
+                'ProvisionedThroughput': {'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+            }, {
+                # Histórico por candidato / por pergunta (GET /sessions)
+                'IndexName': 'owner-created-index',
+                'KeySchema': [
+                    {'AttributeName': 'owner', 'KeyType': 'HASH'},
+                    {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': [
+                    'status', 'candidate_name', 'question_id', 'analysis_mode', 'updated_at']},
+                'ProvisionedThroughput': {'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+            }, {
+                'IndexName': 'question-created-index',
+                'KeySchema': [
+                    {'AttributeName': 'question_id', 'KeyType': 'HASH'},
+                    {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': [
+                    'status', 'candidate_name', 'analysis_mode', 'updated_at']},
+                'ProvisionedThroughput': {'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+            }],
             ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
         )
-        yield dynamodb
\ No newline at end of file
+        yield dynamodb
+
+
+@pytest.fixture(scope="function")
+def cache_table(dynamodb_resource, monkeypatch):
+    """Tabela do cache de análises (mesmo mock do dynamodb_resource)."""
+    monkeypatch.setenv("CACHE_TABLE_NAME", "MockInterviewAnalysisCache-Test")
+    table = dynamodb_resource.create_table(
+        TableName="MockInterviewAnalysisCache-Test",
+        KeySchema=[{'AttributeName': 'cache_key', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'cache_key', 'AttributeType': 'S'}],
+        ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+    )
+    yield table
+
+
+@pytest.fixture(scope="function")
+def control_table(dynamodb_resource, monkeypatch):
+    """Tabela de controle (rate limiter) no mesmo mock do dynamodb_resource."""
+    monkeypatch.setenv("CONTROL_TABLE_NAME", "MockInterviewControl-Test")
+    table = dynamodb_resource.create_table(
+        TableName="MockInterviewControl-Test",
+        KeySchema=[{'AttributeName': 'control_key', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'control_key', 'AttributeType': 'S'}],
+        ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+    )
+    yield table
@@ -6,21 +6,15 @@ import requests
 import wave
 import struct
 import sys
-from decimal import Decimal # <--- Importante para corrigir o erro
 
 # --- CONFIGURAÇÃO ---
 FUNCTION_GET_URL = "mock-interview-get-upload-url-dev"
+FUNCTION_GET_SESSION = "mock-interview-get-session-dev"
+LONG_POLL_SECONDS = 20
 TABLE_NAME = "mock-interview-sessions-dev"
 REGION = "us-east-1"
 FILE_TO_UPLOAD = "test_audio.mp3"
 
-# Classe mágica para converter Decimal do DynamoDB em JSON legível
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj) # Converte Decimal para Float normal
-        return super(DecimalEncoder, self).default(obj)
-
 def create_dummy_audio():
     """Cria um arquivo de áudio válido (WAV renomeado) de 1 segundo para teste"""
     if os.path.exists(FILE_TO_UPLOAD):
@@ -41,8 +35,6 @@ def run_e2e_test():
     # 0. Setup
     create_dummy_audio()
     lambda_client = boto3.client("lambda", region_name=REGION)
-    dynamodb = boto3.resource("dynamodb", region_name=REGION)
-    table = dynamodb.Table(TABLE_NAME)
 
     # 1. Obter URL de Upload (Handshake)
     print("\n1️⃣  Solicitando URL de Upload...")
@@ -83,12 +75,19 @@ def run_e2e_test():
         print(f"   ❌ Falha no upload: {http_resp.status_code} - {http_resp.text}")
         return
 
-    # 3. Polling (Esperar a IA processar)
-    print("\n3️⃣  Aguardando processamento da IA (Polling DynamoDB)...")
-    
-    for i in range(30): # Tenta por ~60 segundos
-        response = table.get_item(Key={'session_id': session_id})
-        item = response.get('Item', {})
+    # 3. Long-poll (GET /sessions/{id}?wait=N&since=STATUS): a Lambda segura a
+    # requisição até o status mudar, em vez de 30 polls de 2 s
+    print("\n3️⃣  Aguardando processamento da IA (long-poll)...")
+
+    status = "PENDING_UPLOAD"
+    for i in range(6): # Até ~2 minutos
+        query = {"wait": str(LONG_POLL_SECONDS), "since": status, "fields": "status,ai_feedback,error_message"}
+        response = lambda_client.invoke(
+            FunctionName=FUNCTION_GET_SESSION,
+            InvocationType='RequestResponse',
+            Payload=json.dumps({"pathParameters": {"session_id": session_id}, "queryStringParameters": query})
+        )
+        item = json.loads(json.loads(response['Payload'].read())["body"])
         status = item.get('status')
         
         sys.stdout.write(f"\r   ⏳ Status atual: {status} " + ("." * (i % 4)) + "   ")
@@ -98,17 +97,12 @@ def run_e2e_test():
             print("\n\n🎉 PROCESSAMENTO CONCLUÍDO!")
             print("--------------------------------------------------")
             print(f"📄 Feedback da IA (Gemini):")
-            
-            # AQUI ESTAVA O ERRO: Agora usamos o cls=DecimalEncoder
-            print(json.dumps(item.get('ai_feedback'), indent=2, ensure_ascii=False, cls=DecimalEncoder))
-            
+            print(json.dumps(item.get('ai_feedback'), indent=2, ensure_ascii=False))
             print("--------------------------------------------------")
             return
         elif status == 'ERROR':
             print(f"\n❌ Erro no processamento: {item.get('error_message')}")
             return
-        
-        time.sleep(2)
 
     print("\n⚠️ Timeout: O processamento demorou muito.")
 
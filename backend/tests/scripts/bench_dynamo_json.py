@@ -0,0 +1,120 @@
+"""
+Benchmark: serialização de itens de sessão do DynamoDB para o corpo da resposta.
+
+Compara, num item realista (ai_feedback completo + model_routing + segmentos):
+  - resource: DecimalEncoder antigo (JSONEncoder subclasse, `o % 1`) vs dynamo_json.dumps
+  - client:   TypeDeserializer + DecimalEncoder (o que o resource faz por baixo)
+              vs dynamo_json.item_from_client + dumps
+
+Roda só em CPU, sem AWS nem moto.
+
+Uso:
+    python tests/scripts/bench_dynamo_json.py --iterations 20000 --segments 4 12
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+from core import dynamo_json  # noqa: E402
+
+
+class LegacyDecimalEncoder(json.JSONEncoder):
+    """Cópia do encoder que ficava em handlers/get_session.py."""
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            if o % 1 > 0:
+                return float(o)
+            else:
+                return int(o)
+        return super(LegacyDecimalEncoder, self).default(o)
+
+
+def build_item(segments):
+    criterion = {
+        "score": Decimal("78"),
+        "weight": Decimal("0.25"),
+        "comment": "Boa estrutura STAR, mas faltou quantificar o resultado do projeto de migração.",
+    }
+    return {
+        "session_id": "3f0c8a7e-5d1b-4f43-9a8e-2b7c6d5e4f31",
+        "status": "COMPLETED",
+        "attempts": Decimal("1"),
+        "created_at": Decimal("1760745600"),
+        "updated_at": Decimal("1760745712"),
+        "job_description": "Engenheiro(a) de software sênior, backend em Python e AWS. " * 40,
+        "ai_feedback": {
+            "score": Decimal("82"),
+            "confidence": Decimal("0.91"),
+            "summary": "Comunicação clara, exemplos concretos e boa conexão com a vaga. " * 6,
+            "strengths": ["Clareza", "Exemplos concretos", "Domínio técnico", "Postura"],
+            "improvements": ["Quantificar resultados", "Respostas mais curtas", "Fechamento"],
+            "criteria": {name: dict(criterion) for name in (
+                "comunicacao", "tecnico", "estrutura", "aderencia", "postura", "clareza")},
+            "segments": [
+                {"index": Decimal(i), "start": Decimal(i * 300), "end": Decimal(i * 300 + 299.5),
+                 "score": Decimal("74.5"), "delta": Decimal("-1.5"),
+                 "feedback": "Trecho com boas respostas; atenção a pausas longas. " * 3}
+                for i in range(segments)
+            ],
+        },
+        "model_routing": {
+            "model": "gemini-2.5-flash",
+            "route": "fast",
+            "router_version": "v1",
+            "audio_seconds": Decimal("1834.2"),
+            "estimated_tokens": Decimal("58694"),
+        },
+    }
+
+
+def bench(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--segments", type=int, nargs="+", default=[4, 12])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    serializer, deserializer = TypeSerializer(), TypeDeserializer()
+
+    print(f"{'seg':>4} | {'modo':<36} | {'tempo (s)':>9} | {'µs/item':>8} | {'ganho':>6}")
+    print("-" * 76)
+    for segments in args.segments:
+        item = build_item(segments)
+        low_level = {k: serializer.serialize(v) for k, v in item.items()}
+        # Mesmo resultado nos dois caminhos (a menos do bug de negativos do encoder antigo)
+        assert json.loads(dynamo_json.dumps(item)) == dynamo_json.item_from_client(low_level)
+
+        modes = [
+            ("resource: DecimalEncoder", lambda: json.dumps(item, cls=LegacyDecimalEncoder), None),
+            ("resource: dynamo_json.dumps", lambda: dynamo_json.dumps(item), 0),
+            ("client: TypeDeserializer + Encoder", lambda: json.dumps(
+                {k: deserializer.deserialize(v) for k, v in low_level.items()},
+                cls=LegacyDecimalEncoder), None),
+            ("client: item_from_client + dumps", lambda: dynamo_json.dumps(
+                dynamo_json.item_from_client(low_level)), 2),
+        ]
+        results = []
+        for label, fn, baseline in modes:
+            best = min(bench(fn, args.iterations) for _ in range(args.repeat))
+            results.append(best)
+            gain = "" if baseline is None else f"{results[baseline] / best:>5.2f}x"
+            print(f"{segments:>4} | {label:<36} | {best:>9.3f} | "
+                  f"{best / args.iterations * 1e6:>8.1f} | {gain:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: download_file -> /tmp -> upload  vs  S3ObjectStream -> upload.
+
+Roda 100% local com moto. O "upload" consome o stream exatamente como o
+SDK google-genai (seek/tell para medir + leituras de 8 MB), descartando os bytes.
+Use --latency-ms para simular a latência de rede por requisição ao S3.
+
+Uso:
+    python tests/scripts/bench_s3_streaming.py --size-mb 64 128 --latency-ms 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+from core.s3_stream import S3ObjectStream  # noqa: E402
+
+BUCKET = "bench-bucket"
+KEY = "uploads/bench/audio.mp3"
+SDK_CHUNK = 8 * 1024 * 1024
+
+
+def fake_sdk_upload(file_obj):
+    """Replica o padrão de leitura do upload resumable do SDK."""
+    offset = file_obj.tell()
+    file_obj.seek(0, os.SEEK_END)
+    size = file_obj.tell() - offset
+    file_obj.seek(offset, os.SEEK_SET)
+    sent = 0
+    while sent < size:
+        chunk = file_obj.read(SDK_CHUNK)
+        if not chunk:
+            break
+        sent += len(chunk)
+    return sent
+
+
+def run_download_then_upload(s3):
+    local_path = os.path.join(tempfile.gettempdir(), "bench_audio.mp3")
+    try:
+        s3.download_file(BUCKET, KEY, local_path)
+        with open(local_path, "rb") as f:
+            return fake_sdk_upload(f)
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+
+def run_streaming(s3, concurrency):
+    stream = S3ObjectStream(s3, BUCKET, KEY, max_concurrency=concurrency)
+    try:
+        return fake_sdk_upload(stream)
+    finally:
+        stream.close()
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    sent = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, sent
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+
+        # Latência artificial por requisição (antes do handler do moto responder)
+        latency = args.latency_ms / 1000.0
+        s3.meta.events.register_first("before-send.s3", lambda **kw: time.sleep(latency))
+
+        print(f"{'MB':>6} | {'modo':<22} | {'tempo (s)':>9} | {'pico py (MB)':>12} | {'/tmp (MB)':>9}")
+        print("-" * 70)
+        for size_mb in args.size_mb:
+            s3.put_object(Bucket=BUCKET, Key=KEY, Body=os.urandom(size_mb * 1024 * 1024))
+            modes = [
+                ("download + upload", run_download_then_upload, (s3,), size_mb),
+                (f"stream (conc={args.concurrency})", run_streaming, (s3, args.concurrency), 0),
+                ("stream (conc=1)", run_streaming, (s3, 1), 0),
+            ]
+            for label, fn, fn_args, tmp_mb in modes:
+                best = None
+                for _ in range(args.repeat):
+                    elapsed, peak, sent = measure(fn, *fn_args)
+                    assert sent == size_mb * 1024 * 1024
+                    if best is None or elapsed < best[0]:
+                        best = (elapsed, peak)
+                print(f"{size_mb:>6} | {label:<22} | {best[0]:>9.3f} | {best[1] / 2**20:>12.1f} | {tmp_mb:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import hashlib
+import time
+from unittest.mock import MagicMock
+import io
+from core.analysis_cache import AnalysisCache, ContentHasher, audio_fingerprint, build_cache_key, is_single_part
+
+def test_fingerprint_uses_single_part_etag():
+    stream = MagicMock()
+    stream.head = {"ETag": '"abc123"'}
+
+    assert audio_fingerprint(stream) == "md5:abc123"
+    stream.read.assert_not_called()
+
+def test_fingerprint_hashes_content_for_multipart_etag():
+    """ETag de multipart não é hash do conteúdo: precisa ler o stream."""
+    data = [b"parte1", b"parte2", b""]
+    stream = MagicMock()
+    stream.head = {"ETag": '"abc123-2"'}
+    stream.read.side_effect = data
+
+    expected = hashlib.sha256(b"parte1parte2").hexdigest()
+    assert audio_fingerprint(stream) == f"sha256:{expected}"
+
+def test_is_single_part():
+    assert is_single_part({"ETag": '"abc123"'})
+    assert not is_single_part({"ETag": '"abc123-2"'})
+    assert not is_single_part({})
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, n=-1):
+        data = super().read(n)
+        self.bytes_read += len(data)
+        return data
+
+def test_content_hasher_reuses_sequential_reads():
+    """Quem já lê o arquivo inteiro (pré-triagem) paga o hash sem uma segunda leitura."""
+    data = bytes(range(256)) * 100
+    stream = CountingStream(data)
+    hasher = ContentHasher(stream)
+
+    assert hasher.seek(0, io.SEEK_END) == len(data)
+    hasher.seek(0)
+    while hasher.read(1000):
+        pass
+
+    assert hasher.fingerprint() == "sha256:" + hashlib.sha256(data).hexdigest()
+    assert stream.bytes_read == len(data)
+
+def test_content_hasher_fills_skips_rewinds_and_the_unread_tail():
+    data = bytes(range(256)) * 100
+    stream = CountingStream(data)
+    hasher = ContentHasher(stream, chunk_size=64)
+
+    assert hasher.read(100) == data[:100]
+    hasher.seek(5000)  # salto para frente (ex: chunks do WAV antes do "data")
+    assert hasher.read(10) == data[5000:5010]
+    hasher.seek(0)  # releitura não entra de novo no hash
+    assert hasher.read(50) == data[:50]
+
+    assert hasher.fingerprint() == "sha256:" + hashlib.sha256(data).hexdigest()
+    assert hasher.tell() == 50 and hasher.read(5) == data[50:55]
+
+def test_cache_key_changes_with_each_component():
+    base = build_cache_key("md5:a", "vaga", "v1", "model-x")
+    assert base == build_cache_key("md5:a", "vaga", "v1", "model-x")
+    assert base != build_cache_key("md5:b", "vaga", "v1", "model-x")
+    assert base != build_cache_key("md5:a", "outra", "v1", "model-x")
+    assert base != build_cache_key("md5:a", "vaga", "v2", "model-x")
+    assert base != build_cache_key("md5:a", "vaga", "v1", "model-y")
+
+def test_cache_ignores_expired_items(dynamodb_resource, cache_table):
+    cache = AnalysisCache(dynamodb_resource, cache_table.name)
+    cache_table.put_item(Item={
+        "cache_key": "k1",
+        "ai_feedback": {"technical_score": 10},
+        "expire_at": int(time.time() - 10)
+    })
+
+    assert cache.get("k1") is None
+
+def test_cache_failures_do_not_break_analysis():
+    broken_db = MagicMock()
+    broken_db.Table.return_value.get_item.side_effect = Exception("DynamoDB fora")
+    broken_db.Table.return_value.put_item.side_effect = Exception("DynamoDB fora")
+    cache = AnalysisCache(broken_db, "qualquer")
+
+    assert cache.get("k1") is None
+    cache.put("k1", {"technical_score": 1})
@@ -0,0 +1,85 @@
+import base64
+import gzip
+import json
+from decimal import Decimal
+
+import pytest
+
+from core import api_response, metrics
+
+BIG = {"job_description": "Engenheiro(a) de software backend em Python e AWS. " * 60,
+       "ai_feedback": {"score": Decimal("82"), "confidence": Decimal("0.9")}}
+
+
+def _gzip_only(monkeypatch):
+    monkeypatch.setattr(api_response, "brotli", None)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip, deflate", "gzip"),
+    ("GZIP", "gzip"),
+    ("deflate", None),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*;q=0.5, gzip;q=0", None),
+    ("", None),
+])
+def test_negotiate_encoding(monkeypatch, accept, expected):
+    _gzip_only(monkeypatch)
+    assert api_response.negotiate_encoding(accept) == expected
+
+
+def test_negotiate_prefers_brotli_unless_client_ranks_gzip_higher(monkeypatch):
+    monkeypatch.setattr(api_response, "brotli", object())
+
+    assert api_response.negotiate_encoding("gzip, deflate, br") == "br"
+    assert api_response.negotiate_encoding("br;q=0.5, gzip") == "gzip"
+
+
+def test_json_response_compresses_large_bodies(monkeypatch):
+    _gzip_only(monkeypatch)
+    metrics.reset()
+    event = {"headers": {"accept-encoding": "gzip, deflate, br"}}
+
+    response = api_response.json_response(200, BIG, event, headers={"ETag": '"abc"'})
+
+    assert response["isBase64Encoded"] is True
+    assert response["headers"]["Content-Encoding"] == "gzip"
+    assert response["headers"]["Vary"] == "Accept-Encoding"
+    assert response["headers"]["ETag"] == 'W/"abc"'
+    assert response["headers"]["Access-Control-Allow-Origin"] == "*"
+    raw = gzip.decompress(base64.b64decode(response["body"]))
+    assert json.loads(raw)["ai_feedback"] == {"score": 82, "confidence": 0.9}
+    assert len(response["body"]) < len(raw)
+    assert metrics.get("ResponseCompressed", encoding="gzip") == 1
+
+
+def test_json_response_stays_plain_without_accept_encoding_or_below_threshold(monkeypatch):
+    _gzip_only(monkeypatch)
+
+    plain = api_response.json_response(200, BIG, {"headers": {}})
+    small = api_response.json_response(200, {"ok": True}, {"headers": {"Accept-Encoding": "gzip"}})
+    no_event = api_response.json_response(200, BIG)
+
+    assert json.loads(plain["body"])["ai_feedback"]["score"] == 82
+    assert plain["headers"]["Vary"] == "Accept-Encoding"
+    assert "isBase64Encoded" not in plain
+    assert small["body"] == '{"ok": true}' and "Vary" not in small["headers"]
+    assert "Content-Encoding" not in no_event["headers"]
+
+
+def test_compression_threshold_from_env(monkeypatch):
+    _gzip_only(monkeypatch)
+    monkeypatch.setenv("RESPONSE_COMPRESSION_MIN_BYTES", "100000")
+
+    response = api_response.json_response(200, BIG, {"headers": {"accept-encoding": "gzip"}})
+
+    assert "Content-Encoding" not in response["headers"]
+
+
+def test_error_response_has_cors_headers():
+    response = api_response.error_response(404, "Session not found")
+
+    assert response["statusCode"] == 404
+    assert response["headers"]["Access-Control-Allow-Origin"] == "*"
+    assert json.loads(response["body"]) == {"error": "Session not found"}
@@ -0,0 +1,164 @@
+import io
+import threading
+import wave
+
+import numpy as np
+import pytest
+from core.audio_screen import PrescreenCancelled, prescreen, profile_audio
+from core.s3_stream import ByteRangeView
+
+SAMPLE_RATE = 16000
+
+
+class _Stream(io.BytesIO):
+    """BytesIO com `size`, como o S3ObjectStream."""
+
+    @property
+    def size(self):
+        return len(self.getbuffer())
+
+
+def make_wav(segments):
+    """segments: lista de (segundos, amplitude) -> bytes WAV 16 bits mono."""
+    parts = []
+    for seconds, amplitude in segments:
+        t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+        parts.append(amplitude * np.sin(2 * np.pi * 220 * t))
+    samples = (np.concatenate(parts) * 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+
+def make_mp3(frames):
+    """
+    frames: lista de (part2_3_length, global_gain) -> frames MPEG-1 Layer III
+    (128 kbps, 44.1 kHz, mono). Só cabeçalho + side info são relevantes aqui.
+    """
+    header = bytes([0xFF, 0xFB, 0x90, 0xC0])
+    frame_len = 144 * 128000 // 44100
+    out = b"ID3" + bytes([4, 0, 0, 0, 0, 0, 10]) + b"\x00" * 10
+    for part23, gain in frames:
+        bits = np.zeros(17 * 8, dtype=np.uint8)
+        for gr in range(2):
+            start = 9 + 5 + 4 + 59 * gr
+            bits[start:start + 12] = [int(b) for b in format(part23, "012b")]
+            bits[start + 21:start + 29] = [int(b) for b in format(gain, "08b")]
+        side = np.packbits(bits).tobytes()
+        out += header + side + b"\x00" * (frame_len - 4 - len(side))
+    return out
+
+
+def test_wav_profile_duration_and_activity():
+    data = make_wav([(1.0, 0.0), (2.0, 0.5), (1.0, 0.0)])
+    profile = profile_audio(_Stream(data))
+
+    assert profile.format == "wav"
+    assert profile.duration_s == pytest.approx(4.0, abs=0.01)
+    assert profile.active_seconds == pytest.approx(2.0, abs=0.05)
+
+
+def test_silent_wav_is_rejected():
+    result = prescreen(_Stream(make_wav([(3.0, 0.0)])))
+
+    assert result.accepted is False
+    assert result.reason == "SILENCE"
+
+
+def test_empty_audio_is_rejected():
+    result = prescreen(_Stream(b""))
+
+    assert result.accepted is False
+    assert result.reason == "EMPTY"
+
+
+def test_unknown_format_is_never_rejected():
+    result = prescreen(_Stream(b"fake_audio"))
+
+    assert result.accepted is True
+    assert result.profile.format == "unknown"
+    assert result.trim is None
+
+
+def test_wav_trim_produces_valid_shorter_file():
+    """Silêncio longo nas pontas é cortado e o cabeçalho WAV é reescrito."""
+    original = make_wav([(3.0, 0.0), (2.0, 0.5), (3.0, 0.0)])
+    stream = _Stream(original)
+    result = prescreen(stream)
+
+    assert result.accepted is True
+    assert result.trim is not None
+
+    view = ByteRangeView(stream, *result.trim)
+    trimmed = view.read()
+    assert len(trimmed) == result.trimmed_size < len(original)
+
+    with wave.open(io.BytesIO(trimmed), "rb") as wav_file:
+        seconds = wav_file.getnframes() / wav_file.getframerate()
+    # 2 s de fala + margem/hangover de cada lado
+    assert 2.0 <= seconds < 3.5
+
+
+def test_short_silence_is_not_trimmed():
+    result = prescreen(_Stream(make_wav([(0.2, 0.0), (2.0, 0.5), (0.2, 0.0)])))
+
+    assert result.accepted is True
+    assert result.trim is None
+
+
+def test_mp3_side_info_profile():
+    """Frames sem bits codificados contam como silêncio; o ID3 é ignorado."""
+    frames = [(0, 0)] * 100 + [(900, 170)] * 100 + [(0, 0)] * 100
+    profile = profile_audio(_Stream(make_mp3(frames)))
+
+    assert profile.format == "mp3"
+    assert profile.frame_count == 300
+    assert profile.duration_s == pytest.approx(300 * 1152 / 44100)
+    assert int(profile.active.sum()) == 100
+    assert profile.frame_offsets[0] == 20  # depois da tag ID3 de 20 bytes
+
+
+def test_mp3_silence_rejected_and_speech_trimmed():
+    silent = prescreen(_Stream(make_mp3([(0, 0)] * 200)))
+    assert silent.accepted is False
+    assert silent.reason == "SILENCE"
+
+    data = make_mp3([(0, 0)] * 200 + [(900, 170)] * 100 + [(0, 0)] * 200)
+    result = prescreen(_Stream(data))
+    assert result.accepted is True
+    start, end, prefix = result.trim
+    assert prefix == b""
+    # O corte cai exatamente em fronteiras de frame (sync 0xFFFB)
+    assert data[start:start + 2] == b"\xff\xfb"
+    assert end - start < len(data) / 2
+
+
+def test_mp3_resyncs_after_garbage():
+    frames = make_mp3([(900, 170)] * 50)
+    data = frames[:20 + 417 * 10] + b"lixo" + frames[20 + 417 * 10:]
+    profile = profile_audio(_Stream(data))
+
+    assert profile.frame_count == 50
+
+
+def test_cancelled_prescreen_stops_reading():
+    """Sinalizado o cancelamento, a pré-triagem para no próximo bloco (não lê o resto do stream)."""
+    cancel = threading.Event()
+    stream = _Stream(make_wav([(120.0, 0.5)]))
+    reads = []
+    original_read = stream.read
+
+    def read(n=-1):
+        reads.append(n)
+        cancel.set()  # cancelado logo depois da primeira leitura
+        return original_read(n)
+
+    stream.read = read
+
+    with pytest.raises(PrescreenCancelled):
+        prescreen(stream, cancel)
+    assert len(reads) == 1
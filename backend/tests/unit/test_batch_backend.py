@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from core.batch_backend import BatchRequest, FakeBatchBackend, GeminiBatchBackend
+
+
+def _job(state, responses=None):
+    return SimpleNamespace(
+        name="batches/123",
+        state=SimpleNamespace(name=state),
+        dest=SimpleNamespace(inlined_responses=responses)
+    )
+
+
+def test_gemini_backend_submits_inline_requests_with_keys():
+    client = MagicMock()
+    client.batches.create.return_value = _job("JOB_STATE_PENDING")
+    backend = GeminiBatchBackend(client)
+
+    name = backend.submit("modelo", [BatchRequest("s-1", ["a"], None), BatchRequest("s-2", ["b"], None)], "lote")
+
+    assert name == "batches/123"
+    src = client.batches.create.call_args[1]["src"]
+    assert [r.metadata for r in src] == [{"key": "s-1"}, {"key": "s-2"}]
+
+
+def test_gemini_backend_poll_maps_responses_by_metadata_or_position():
+    ok = SimpleNamespace(text='{"technical_score": 1}')
+    client = MagicMock()
+    client.batches.get.return_value = _job("JOB_STATE_SUCCEEDED", [
+        SimpleNamespace(metadata=None, response=None, error=SimpleNamespace(message="bloqueado")),
+        SimpleNamespace(metadata={"key": "s-2"}, response=ok, error=None),
+    ])
+
+    poll = GeminiBatchBackend(client).poll("batches/123", ["s-1", "s-2"])
+
+    assert poll.done and not poll.failed
+    assert poll.results == {"s-1": (None, "bloqueado"), "s-2": (ok, None)}
+
+
+def test_gemini_backend_running_job_has_no_results():
+    client = MagicMock()
+    client.batches.get.return_value = _job("JOB_STATE_RUNNING")
+
+    poll = GeminiBatchBackend(client).poll("batches/123", ["s-1"])
+
+    assert not poll.done and not poll.failed and poll.results == {}
+
+
+def test_fake_backend_completes_after_configured_polls():
+    backend = FakeBatchBackend(responder=lambda r: f'{{"technical_score": {len(r.key)}}}', polls_until_done=2)
+    name = backend.submit("modelo", [BatchRequest("abc", [], None)])
+
+    assert backend.poll(name, ["abc"]).state == "JOB_STATE_RUNNING"
+    assert backend.poll(name, ["abc"]).state == "JOB_STATE_RUNNING"
+    poll = backend.poll(name, ["abc"])
+    assert poll.done
+    assert poll.results["abc"][0].text == '{"technical_score": 3}'
@@ -0,0 +1,125 @@
+import pytest
+from core import metrics
+from core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, get_circuit_breaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"t": 1_700_000_000.0}
+    monkeypatch.setattr("core.circuit_breaker.time.time", lambda: now["t"])
+    return now
+
+
+def _breaker(table, **kwargs):
+    kwargs.setdefault("failure_threshold", 3)
+    kwargs.setdefault("window_seconds", 60)
+    kwargs.setdefault("open_seconds", 30)
+    return CircuitBreaker(table, **kwargs)
+
+
+def _state(table):
+    return table.get_item(Key={"control_key": "breaker#gemini"}).get("Item", {}).get("state", CLOSED)
+
+
+def test_opens_after_threshold_failures_in_window(control_table, clock):
+    metrics.reset()
+    breaker = _breaker(control_table)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow() is True
+    assert _state(control_table) == CLOSED
+
+    breaker.record_failure()
+    assert _state(control_table) == OPEN
+    assert breaker.is_open() is True
+    assert breaker.allow() is False
+    assert metrics.get("BreakerTransition", to=OPEN) == 1
+
+
+def test_failures_outside_window_do_not_accumulate(control_table, clock):
+    breaker = _breaker(control_table)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    clock["t"] += 61
+    breaker.record_failure()
+
+    assert _state(control_table) == CLOSED
+
+
+def test_state_is_shared_between_workers(control_table, clock):
+    worker_a, worker_b = _breaker(control_table), _breaker(control_table)
+
+    for _ in range(3):
+        worker_a.record_failure()
+    clock["t"] += 5  # expira o cache local do worker B
+
+    assert worker_b.is_open() is True
+
+
+def test_half_open_allows_a_single_probe_then_closes(control_table, clock):
+    worker_a, worker_b = _breaker(control_table), _breaker(control_table)
+    for _ in range(3):
+        worker_a.record_failure()
+
+    clock["t"] += 31
+    assert worker_a.allow() is True      # ganhou o lease de sonda
+    assert _state(control_table) == HALF_OPEN
+    assert worker_b.allow() is False     # os demais esperam o resultado
+
+    worker_a.record_success()
+    clock["t"] += 5
+    assert _state(control_table) == CLOSED
+    assert worker_b.allow() is True
+
+
+def test_failed_probe_reopens(control_table, clock):
+    breaker = _breaker(control_table)
+    for _ in range(3):
+        breaker.record_failure()
+    clock["t"] += 31
+    assert breaker.allow() is True
+
+    breaker.record_failure()
+
+    assert _state(control_table) == OPEN
+    assert breaker.is_open() is True
+
+
+def test_stale_success_does_not_overwrite_open_circuit(control_table, clock):
+    """Worker com visão CLOSED (em cache) termina uma chamada depois que outro abriu o circuito."""
+    worker_a, worker_b = _breaker(control_table), _breaker(control_table)
+    worker_b.record_failure()  # B lê/guarda CLOSED com 1 falha
+
+    for _ in range(3):
+        worker_a.record_failure()
+    assert _state(control_table) == OPEN
+
+    worker_b.record_success()
+
+    assert _state(control_table) == OPEN
+    assert worker_b.is_open() is True  # relê o estado após perder a condição
+
+
+def test_late_probe_success_does_not_close_reopened_circuit(control_table, clock):
+    """Lease de sonda expirado: a nova sonda falhou e reabriu; o sucesso atrasado não fecha."""
+    worker_a, worker_b = _breaker(control_table), _breaker(control_table)
+    for _ in range(3):
+        worker_a.record_failure()
+    clock["t"] += 31
+    assert worker_a.allow() is True
+
+    clock["t"] += 31  # lease de A expirou: B assume a sonda e falha
+    assert worker_b.allow() is True
+    worker_b.record_failure()
+    assert _state(control_table) == OPEN
+
+    worker_a.record_success()
+
+    assert _state(control_table) == OPEN
+
+
+def test_breaker_disabled_without_control_table(dynamodb_resource, monkeypatch):
+    monkeypatch.delenv("CONTROL_TABLE_NAME", raising=False)
+    assert get_circuit_breaker(dynamodb_resource) is None
@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+import time
+from unittest.mock import MagicMock
+from core.circuit_breaker import CircuitBreaker
+from core.context_cache import ContextCacheRegistry
+from core.gemini import GeminiGateway
+from core.prompts import PROMPT_VERSION, SYSTEM_INSTRUCTION, job_context, user_turn
+
+MODEL = "gemini-test"
+LONG_JOB = "Experiência com Python, AWS Lambda, DynamoDB e arquitetura serverless. " * 80
+
+def _client(name="cachedContents/abc", ttl=3600):
+    client = MagicMock()
+    cached = MagicMock()
+    cached.name = name
+    cached.expire_time = datetime.datetime.fromtimestamp(time.time() + ttl, tz=datetime.timezone.utc)
+    client.caches.create.return_value = cached
+    return client
+
+def _lookup(registry, client, job, table=None, breaker=None):
+    """lookup passa pelo GeminiGateway (limiter + circuit breaker)."""
+    return asyncio.run(registry.lookup(GeminiGateway(client, breaker=breaker), MODEL, job, table=table))
+
+def test_prompt_templates_are_static():
+    assert "REGRAS CRÍTICAS" in SYSTEM_INSTRUCTION
+    assert job_context("") == ""
+    assert "Vaga X" in user_turn("Vaga X")
+    assert len(PROMPT_VERSION) == 12
+
+def test_short_job_description_is_not_cached():
+    """Abaixo do mínimo de tokens do Gemini não vale (nem é permitido) criar cache."""
+    client = _client()
+    registry = ContextCacheRegistry()
+
+    assert _lookup(registry, client, "Vaga Python") is None
+    client.caches.create.assert_not_called()
+
+def test_cache_is_created_once_and_reused():
+    client = _client()
+    registry = ContextCacheRegistry()
+
+    first = _lookup(registry, client, LONG_JOB)
+    second = _lookup(registry, client, LONG_JOB)
+
+    assert first == second == "cachedContents/abc"
+    client.caches.create.assert_called_once()
+    config = client.caches.create.call_args[1]["config"]
+    assert config.system_instruction == SYSTEM_INSTRUCTION
+    assert config.ttl == "3600s"
+
+def test_cache_is_shared_between_containers(dynamodb_resource, cache_table):
+    client = _client()
+    _lookup(ContextCacheRegistry(), client, LONG_JOB, table=cache_table)
+
+    # Outro container (registro vazio) encontra o cache na tabela
+    other_client = _client(name="cachedContents/outro")
+    name = _lookup(ContextCacheRegistry(), other_client, LONG_JOB, table=cache_table)
+
+    assert name == "cachedContents/abc"
+    other_client.caches.create.assert_not_called()
+
+def test_expiring_cache_is_recreated():
+    client = _client(ttl=30)  # dentro da margem de expiração
+    registry = ContextCacheRegistry()
+
+    _lookup(registry, client, LONG_JOB)
+    _lookup(registry, client, LONG_JOB)
+
+    assert client.caches.create.call_count == 2
+
+def test_creation_failure_falls_back_and_backs_off():
+    client = MagicMock()
+    client.caches.create.side_effect = Exception("modelo não suporta cache")
+    registry = ContextCacheRegistry()
+
+    assert _lookup(registry, client, LONG_JOB) is None
+    assert _lookup(registry, client, LONG_JOB) is None
+    client.caches.create.assert_called_once()
+
+def test_open_circuit_skips_cache_creation(control_table):
+    """Circuito aberto: nada de caches.create no Gemini, a análise segue sem cache."""
+    breaker = CircuitBreaker(control_table, failure_threshold=1)
+    breaker.record_failure()
+    client = _client()
+
+    assert _lookup(ContextCacheRegistry(), client, LONG_JOB, breaker=breaker) is None
+    client.caches.create.assert_not_called()
@@ -0,0 +1,68 @@
+import asyncio
+import math
+
+import pytest
+
+from core.deadline import Deadline, DeadlineExceeded
+
+
+class FakeLambdaContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def test_without_lambda_context_there_is_no_deadline():
+    deadline = Deadline.from_context({})
+
+    assert not deadline.bounded
+    assert deadline.remaining() == math.inf
+    assert deadline.budget(1.0) == 1.0
+
+
+def test_remaining_discounts_the_reserve():
+    deadline = Deadline.from_context(FakeLambdaContext(30_000))
+
+    assert deadline.bounded
+    assert 24 < deadline.remaining() <= 25
+    assert deadline.budget(2.0) == 2.0
+
+
+def test_require_raises_when_not_enough_time():
+    deadline = Deadline(remaining_ms=8_000, reserve_seconds=5)
+
+    deadline.require(2, "poll")
+    with pytest.raises(DeadlineExceeded):
+        deadline.require(10, "generate")
+
+
+def test_run_bounds_the_call_to_the_deadline():
+    deadline = Deadline(remaining_ms=100, reserve_seconds=0)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(deadline.run(asyncio.sleep(5), "generate"))
+
+
+def test_run_keeps_timeouts_raised_by_the_call_itself():
+    deadline = Deadline(remaining_ms=60_000, reserve_seconds=0)
+
+    async def slow_poll():
+        raise TimeoutError("arquivo preso em PROCESSING")
+
+    with pytest.raises(TimeoutError) as raised:
+        asyncio.run(deadline.run(slow_poll(), "file_poll"))
+    assert not isinstance(raised.value, DeadlineExceeded)
+
+
+def test_run_skips_the_call_without_minimum_time():
+    deadline = Deadline(remaining_ms=1_000, reserve_seconds=0)
+    called = []
+
+    async def generate():
+        called.append(True)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(deadline.run(generate(), "generate", min_seconds=10))
+    assert called == []
@@ -0,0 +1,64 @@
+from unittest.mock import MagicMock
+
+import pytest
+from core import dynamo_batch
+
+TABLE = "MockInterviewSessions-Test"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("core.dynamo_batch.time.sleep", sleeps.append)
+    return sleeps
+
+
+def _key(sid):
+    return {"session_id": {"S": sid}}
+
+
+def test_batch_get_chunks_keys_and_keeps_the_projection():
+    db = MagicMock()
+    db.batch_get_item.side_effect = lambda RequestItems: {
+        "Responses": {TABLE: RequestItems[TABLE]["Keys"]}
+    }
+    keys = [_key(f"s{i}") for i in range(150)]
+
+    items, unprocessed = dynamo_batch.batch_get(db, TABLE, keys, ProjectionExpression="#f0",
+                                                ExpressionAttributeNames={"#f0": "status"})
+
+    assert items == keys and unprocessed == []
+    requests = [call[1]["RequestItems"][TABLE] for call in db.batch_get_item.call_args_list]
+    assert [len(r["Keys"]) for r in requests] == [100, 50]
+    assert all(r["ProjectionExpression"] == "#f0" for r in requests)
+
+
+def test_batch_get_resends_only_unprocessed_keys_with_backoff(no_backoff):
+    db = MagicMock()
+    db.batch_get_item.side_effect = [
+        {"Responses": {TABLE: [_key("a")]}, "UnprocessedKeys": {TABLE: {"Keys": [_key("b")]}}},
+        {"Responses": {TABLE: [_key("b")]}, "UnprocessedKeys": {}},
+    ]
+
+    items, unprocessed = dynamo_batch.batch_get(db, TABLE, [_key("a"), _key("b")])
+
+    assert items == [_key("a"), _key("b")] and unprocessed == []
+    assert db.batch_get_item.call_args[1]["RequestItems"] == {TABLE: {"Keys": [_key("b")]}}
+    assert len(no_backoff) == 1 and 0 <= no_backoff[0] <= dynamo_batch.BASE_DELAY
+
+
+def test_batch_put_gives_up_after_max_attempts(no_backoff):
+    db = MagicMock()
+
+    def throttled(RequestItems):
+        requests = RequestItems[TABLE]
+        return {"UnprocessedItems": {TABLE: requests[-1:]}} if requests[-1]["PutRequest"]["Item"]["id"] == 29 else {}
+    db.batch_write_item.side_effect = throttled
+    items = [{"id": i} for i in range(30)]
+
+    unprocessed = dynamo_batch.batch_put(db, TABLE, items)
+
+    assert unprocessed == [{"id": 29}]
+    assert db.batch_write_item.call_count == 1 + dynamo_batch.MAX_ATTEMPTS  # bloco de 25 + bloco de 5 reenviado
+    assert len(no_backoff) == dynamo_batch.MAX_ATTEMPTS - 1
+    assert all(0 <= delay <= dynamo_batch.BASE_DELAY * 2 ** i for i, delay in enumerate(no_backoff))
@@ -0,0 +1,75 @@
+import json
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.types import Binary, TypeSerializer
+
+from core import dynamo_json
+
+
+ITEM = {
+    "session_id": "s1",
+    "status": "COMPLETED",
+    "attempts": Decimal("2"),
+    "ai_feedback": {
+        "score": Decimal("85"),
+        "confidence": Decimal("0.93"),
+        "delta": Decimal("-1.5"),
+        "big": Decimal("1E+3"),
+        "strengths": ["clareza", "exemplos"],
+        "flags": None,
+        "approved": True,
+    },
+    "tags": {"b", "a"},
+    "scores": {Decimal("3"), Decimal("1.5")},
+    "blob": Binary(b"\x00\x01"),
+}
+
+EXPECTED = {
+    "session_id": "s1",
+    "status": "COMPLETED",
+    "attempts": 2,
+    "ai_feedback": {
+        "score": 85,
+        "confidence": 0.93,
+        "delta": -1.5,
+        "big": 1000,
+        "strengths": ["clareza", "exemplos"],
+        "flags": None,
+        "approved": True,
+    },
+    "tags": ["a", "b"],
+    "scores": [1.5, 3],
+    "blob": "AAE=",
+}
+
+
+def test_dumps_converts_dynamodb_types():
+    assert json.loads(dynamo_json.dumps(ITEM)) == EXPECTED
+
+
+def test_dumps_keeps_negative_fractions_and_integral_types():
+    # O DecimalEncoder antigo (o % 1 > 0) transformava -1.5 em -1
+    body = dynamo_json.dumps({"a": Decimal("-1.5"), "b": Decimal("-2"), "c": Decimal("2.0")})
+
+    assert body == '{"a": -1.5, "b": -2, "c": 2}'
+
+
+def test_dumps_keeps_accents_unescaped():
+    assert dynamo_json.dumps({"t": "ótima comunicação"}) == '{"t": "ótima comunicação"}'
+
+
+def test_dumps_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        dynamo_json.dumps({"x": object()})
+
+
+def test_item_from_client_matches_resource_path():
+    serializer = TypeSerializer()
+    low_level = {k: serializer.serialize(v) for k, v in ITEM.items()}
+    low_level["blob"] = {"B": b"\x00\x01"}  # o client devolve bytes, não Binary
+
+    item = dynamo_json.item_from_client(low_level)
+
+    assert item == EXPECTED
+    assert type(item["attempts"]) is int
@@ -0,0 +1,173 @@
+import asyncio
+import io
+from unittest.mock import MagicMock
+
+import pytest
+from core import metrics
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from core.gemini import GeminiGateway, RetryPolicy
+
+NO_WAIT = {op: RetryPolicy(attempts=3, base_delay=0, max_delay=0) for op in ("upload", "get", "generate")}
+
+
+class ServerError(Exception):
+    code = 503
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+def test_transient_errors_are_retried_per_operation():
+    metrics.reset()
+    client = MagicMock()
+    client.models.generate_content.side_effect = [ServerError("UNAVAILABLE"), "ok"]
+    gateway = GeminiGateway(client, retry_policies=NO_WAIT)
+
+    assert asyncio.run(gateway.generate(model="m", contents=[], config=None)) == "ok"
+    assert client.models.generate_content.call_count == 2
+    assert metrics.get("GeminiRetry", operation="generate") == 1
+
+
+def test_non_transient_errors_fail_immediately():
+    client = MagicMock()
+    client.files.get.side_effect = BadRequest("INVALID_ARGUMENT")
+    gateway = GeminiGateway(client, retry_policies=NO_WAIT)
+
+    with pytest.raises(BadRequest):
+        asyncio.run(gateway.get_file(name="files/1"))
+    assert client.files.get.call_count == 1
+
+
+def test_upload_retry_rewinds_the_stream():
+    positions = []
+
+    def upload(file, config):
+        positions.append(file.tell())
+        file.read()
+        if len(positions) == 1:
+            raise ConnectionError("reset")
+        return "file"
+
+    client = MagicMock()
+    client.files.upload.side_effect = upload
+    gateway = GeminiGateway(client, retry_policies=NO_WAIT)
+
+    assert asyncio.run(gateway.upload(file=io.BytesIO(b"audio"), config={})) == "file"
+    assert positions == [0, 0]
+
+
+def test_every_attempt_takes_limiter_quota():
+    """Retentativa é uma requisição nova: consome cota (requisição + tokens) de novo."""
+    acquired = []
+
+    class Limiter:
+        async def acquire(self, tokens=1, operation="generate"):
+            acquired.append((tokens, operation))
+
+    client = MagicMock()
+    client.models.generate_content.side_effect = [ServerError("UNAVAILABLE"), ServerError("UNAVAILABLE"), "ok"]
+    gateway = GeminiGateway(client, limiter=Limiter(), retry_policies=NO_WAIT)
+
+    assert asyncio.run(gateway.generate(model="m", contents=[], config=None, tokens=500)) == "ok"
+    assert acquired == [(500, "generate")] * 3
+
+
+def test_exhausted_retries_feed_the_breaker_and_open_circuit_fails_fast(control_table):
+    client = MagicMock()
+    client.models.generate_content.side_effect = ServerError("UNAVAILABLE")
+    breaker = CircuitBreaker(control_table, failure_threshold=1, window_seconds=60, open_seconds=60)
+    gateway = GeminiGateway(client, breaker=breaker, retry_policies=NO_WAIT)
+
+    with pytest.raises(ServerError):
+        asyncio.run(gateway.generate(model="m", contents=[], config=None))
+    assert client.models.generate_content.call_count == 3
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(gateway.generate(model="m", contents=[], config=None))
+    assert client.models.generate_content.call_count == 3
+    assert asyncio.run(gateway.available()) is False
+
+
+def test_generate_stream_delivers_accumulated_text_and_restarts_on_retry():
+    from types import SimpleNamespace
+
+    chunks = [SimpleNamespace(text='{"summary": "Bo'), SimpleNamespace(text=None), SimpleNamespace(text='a"}')]
+
+    def stream(**kwargs):
+        if client.models.generate_content_stream.call_count == 1:
+            yield chunks[0]
+            raise ServerError("UNAVAILABLE")
+        yield from chunks
+
+    client = MagicMock()
+    client.models.generate_content_stream.side_effect = stream
+    gateway = GeminiGateway(client, retry_policies=NO_WAIT)
+    seen = []
+
+    response = asyncio.run(gateway.generate_stream(model="m", contents=[], config=None, on_text=seen.append))
+
+    assert response.text == '{"summary": "Boa"}'
+    assert seen == ['{"summary": "Bo', '{"summary": "Bo', '{"summary": "Boa"}']
+
+
+def test_generate_stream_uses_aio_client():
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock
+
+    async def chunks():
+        for text in ('{"a"', ': 1}'):
+            yield SimpleNamespace(text=text)
+
+    client = MagicMock()
+    client.aio.models.generate_content_stream = AsyncMock(side_effect=lambda **kwargs: chunks())
+    gateway = GeminiGateway(client, use_aio=True, retry_policies=NO_WAIT)
+    seen = []
+
+    response = asyncio.run(gateway.generate_stream(model="m", contents=[], config=None, on_text=seen.append))
+
+    assert response.text == '{"a": 1}'
+    assert seen == ['{"a"', '{"a": 1}']
+    client.models.generate_content_stream.assert_not_called()
+
+
+def test_aio_upload_reads_the_stream_off_the_event_loop():
+    """
+    Cenário: Modo lote (aio) com um stream lento (GETs por faixa do S3 são bloqueantes).
+    Verifica: O upload lê o stream numa thread e as outras corrotinas continuam andando.
+    """
+    import time
+    from unittest.mock import AsyncMock
+
+    class SlowStream(io.BytesIO):
+        def read(self, size=-1):
+            time.sleep(0.05)
+            return super().read(size)
+
+    def upload(file, config):
+        while file.read(2):
+            pass
+        return "file"
+
+    client = MagicMock()
+    client.files.upload.side_effect = upload
+    client.aio.files.upload = AsyncMock(side_effect=upload)  # como o SDK: read() no event loop
+    gateway = GeminiGateway(client, use_aio=True, retry_policies=NO_WAIT)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        task = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0)
+        try:
+            return await gateway.upload(file=SlowStream(b"0123456789"), config={})
+        finally:
+            task.cancel()
+
+    assert asyncio.run(scenario()) == "file"
+    client.aio.files.upload.assert_not_called()
+    assert len(ticks) >= 10
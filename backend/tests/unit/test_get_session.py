@@ -1,7 +1,16 @@
+import base64
 import json
 import pytest
+import boto3
 from unittest.mock import MagicMock
-from handlers.get_session import lambda_handler
+from handlers.get_session import get_terminal_cache, lambda_handler
+
+@pytest.fixture(autouse=True)
+def empty_terminal_cache(monkeypatch):
+    """O cache de sessões terminais vive no módulo (warm start): cada teste começa com um novo."""
+    monkeypatch.setattr("handlers.get_session._TERMINAL_CACHE", None)
+    # Client criado dentro do mock do moto de cada teste
+    monkeypatch.setattr("handlers.get_session._DYNAMODB_CLIENT", None)
 
 # --- Testes de Sucesso ---
 
@@ -36,6 +45,24 @@ def test_get_session_not_found(dynamodb_resource):
     assert response["statusCode"] == 404
     assert "not found" in response["body"]
 
+def test_get_session_exposes_partial_feedback_while_processing(dynamodb_resource):
+    """Durante a geração em streaming o front recebe o texto parcial; concluída, só o resultado final."""
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    table.put_item(Item={"session_id": "em-andamento", "status": "PROCESSING",
+                         "partial_feedback": {"summary": "Boa comunica"}})
+    table.put_item(Item={"session_id": "pendente", "status": "PROCESSING"})
+    table.put_item(Item={"session_id": "pronta", "status": "COMPLETED", "ai_feedback": {"summary": "ok"},
+                         "partial_feedback": {"summary": "o"}})
+
+    def body(session_id):
+        response = lambda_handler({"pathParameters": {"session_id": session_id}}, {},
+                                  dynamodb_resource=dynamodb_resource)
+        return json.loads(response["body"])
+
+    assert body("em-andamento")["partial_feedback"] == {"summary": "Boa comunica"}
+    assert body("pendente")["partial_feedback"] is None
+    assert "partial_feedback" not in body("pronta")
+
 # --- Testes de Erro (Novos) ---
 
 def test_get_session_missing_id_parameter(dynamodb_resource):
@@ -54,15 +81,385 @@ def test_get_session_dynamodb_failure(dynamodb_resource):
     # Criamos um mock que QUEBRA quando chamado
     mock_db_broken = MagicMock()
     mock_table = MagicMock()
+    mock_client = MagicMock()
     # Configura o get_item para lançar uma exceção genérica
-    mock_table.get_item.side_effect = Exception("DynamoDB Explodiu")
+    mock_client.get_item.side_effect = Exception("DynamoDB Explodiu")
     mock_db_broken.Table.return_value = mock_table
     
     event = {"pathParameters": {"session_id": "123"}}
 
     # Act
-    response = lambda_handler(event, {}, dynamodb_resource=mock_db_broken)
+    response = lambda_handler(event, {}, dynamodb_resource=mock_db_broken, dynamodb_client=mock_client)
     
     # Assert
     assert response["statusCode"] == 500
-    assert "Internal Server Error" in response["body"]
\ No newline at end of file
+    assert "Internal Server Error" in response["body"]
+# --- Projeção e GET condicional (polling) ---
+
+def _seed_processing(dynamodb_resource):
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    table.put_item(Item={
+        "session_id": "session-123",
+        "status": "PROCESSING",
+        "attempts": 1,
+        "job_description": "x" * 5000,
+    })
+    return table
+
+def test_get_session_fields_become_a_projection(dynamodb_resource):
+    """?fields= vira ProjectionExpression: o job_description não é lido nem devolvido."""
+    _seed_processing(dynamodb_resource)
+    event = {"pathParameters": {"session_id": "session-123"},
+             "queryStringParameters": {"fields": "status,ai_feedback"}}
+
+    response = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {"session_id": "session-123", "status": "PROCESSING"}
+
+def test_get_session_rejects_unknown_fields(dynamodb_resource):
+    _seed_processing(dynamodb_resource)
+    event = {"pathParameters": {"session_id": "session-123"},
+             "queryStringParameters": {"fields": "status,s3_key"}}
+
+    response = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+
+    assert response["statusCode"] == 400
+    assert "s3_key" in response["body"]
+
+def test_get_session_never_returns_internal_attributes(dynamodb_resource):
+    """Sem ?fields=, só os campos públicos: upload_id, resume, lease, chaves de cache e do lote ficam na tabela."""
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    table.put_item(Item={
+        "session_id": "session-123", "status": "QUEUED", "candidate_name": "Ana", "attempts": 1,
+        "s3_key": "uploads/session-123/audio.mp3", "upload_id": "mp-1", "lease_until": 1,
+        "resume": {"files": {}}, "audio_location": {"bucket": "b", "key": "k"}, "cache_key": "c" * 64,
+        "owner": "ana", "batch_state": "QUEUED", "batch_attempts": 0,
+    })
+
+    single = lambda_handler({"pathParameters": {"session_id": "session-123"}}, {},
+                            dynamodb_resource=dynamodb_resource)
+    batch = lambda_handler(_batch_event(["session-123"]), {}, dynamodb_resource=dynamodb_resource)
+
+    expected = {"session_id": "session-123", "status": "QUEUED", "candidate_name": "Ana", "attempts": 1}
+    assert json.loads(single["body"]) == expected
+    assert json.loads(batch["body"])["sessions"] == [expected]
+
+def test_get_session_if_none_match_returns_304_until_something_changes(dynamodb_resource):
+    """Polling sem mudança: 304 sem corpo; status novo (ou mais texto parcial) gera outro ETag."""
+    table = _seed_processing(dynamodb_resource)
+    event = {"pathParameters": {"session_id": "session-123"},
+             "queryStringParameters": {"fields": "status,partial_feedback,ai_feedback"}}
+
+    first = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+    etag = first["headers"]["ETag"]
+    event["headers"] = {"if-none-match": etag}
+
+    unchanged = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+    assert unchanged["statusCode"] == 304
+    assert unchanged["body"] == ""
+    assert unchanged["headers"]["ETag"] == etag
+
+    table.update_item(Key={"session_id": "session-123"}, UpdateExpression="SET partial_feedback = :p",
+                      ExpressionAttributeValues={":p": {"summary": "Boa comunica"}})
+    partial = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+    assert partial["statusCode"] == 200
+    assert json.loads(partial["body"])["partial_feedback"] == {"summary": "Boa comunica"}
+
+    event["headers"] = {"If-None-Match": partial["headers"]["ETag"]}
+    table.update_item(Key={"session_id": "session-123"},
+                      UpdateExpression="SET #s = :s, updated_at = :t REMOVE partial_feedback",
+                      ExpressionAttributeNames={"#s": "status"},
+                      ExpressionAttributeValues={":s": "COMPLETED", ":t": "1700000000"})
+    done = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+    assert done["statusCode"] == 200
+    assert json.loads(done["body"])["status"] == "COMPLETED"
+
+def test_get_session_etag_depends_on_the_projection(dynamodb_resource):
+    _seed_processing(dynamodb_resource)
+    base = {"pathParameters": {"session_id": "session-123"}}
+
+    full = lambda_handler(base, {}, dynamodb_resource=dynamodb_resource)
+    projected = lambda_handler({**base, "queryStringParameters": {"fields": "status"}}, {},
+                               dynamodb_resource=dynamodb_resource)
+
+    assert full["headers"]["ETag"] != projected["headers"]["ETag"]
+
+# --- Long-poll (?wait=N&since=STATUS) ---
+
+def test_get_session_long_poll_returns_when_status_changes(dynamodb_resource, monkeypatch):
+    """Segura a requisição relendo com backoff e responde na primeira leitura com status novo."""
+    import time
+    table = _seed_processing(dynamodb_resource)
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            table.update_item(Key={"session_id": "session-123"},
+                              UpdateExpression="SET #s = :s, ai_feedback = :f",
+                              ExpressionAttributeNames={"#s": "status"},
+                              ExpressionAttributeValues={":s": "COMPLETED", ":f": {"technical_score": 90}})
+
+    monkeypatch.setattr(time, "sleep", fake_sleep)
+    event = {"pathParameters": {"session_id": "session-123"},
+             "queryStringParameters": {"wait": "20", "since": "PROCESSING", "fields": "status,ai_feedback"}}
+
+    response = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["status"] == "COMPLETED"
+    assert sleeps == [0.25, 0.5, 1.0]
+
+def test_get_session_long_poll_answers_right_away_when_status_already_differs(dynamodb_resource, monkeypatch):
+    import time
+    _seed_processing(dynamodb_resource)
+    monkeypatch.setattr(time, "sleep", lambda s: pytest.fail("não deveria esperar"))
+    event = {"pathParameters": {"session_id": "session-123"},
+             "queryStringParameters": {"wait": "20", "since": "PENDING_UPLOAD"}}
+
+    response = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+
+    assert json.loads(response["body"])["status"] == "PROCESSING"
+
+def test_get_session_long_poll_gives_up_after_wait(dynamodb_resource, monkeypatch):
+    """Sem mudança: responde com o status atual ao fim do wait (limitado por LONG_POLL_MAX_WAIT_SECONDS)."""
+    import time
+    _seed_processing(dynamodb_resource)
+    monkeypatch.setenv("LONG_POLL_MAX_WAIT_SECONDS", "0.5")
+    event = {"pathParameters": {"session_id": "session-123"},
+             "queryStringParameters": {"wait": "60"}}
+
+    start = time.monotonic()
+    response = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+
+    assert 0.4 <= time.monotonic() - start < 2
+    assert json.loads(response["body"])["status"] == "PROCESSING"
+
+def test_get_session_rejects_invalid_wait(dynamodb_resource):
+    event = {"pathParameters": {"session_id": "session-123"}, "queryStringParameters": {"wait": "abc"}}
+
+    response = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+
+    assert response["statusCode"] == 400
+
+# --- Cache de sessões terminais ---
+
+def test_get_session_terminal_result_is_served_from_memory(dynamodb_resource):
+    """COMPLETED não muda: a segunda leitura não vai ao DynamoDB e a resposta leva Cache-Control longo."""
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    table.put_item(Item={"session_id": "pronta", "status": "COMPLETED", "ai_feedback": {"technical_score": 90}})
+    event = {"pathParameters": {"session_id": "pronta"}}
+    cache = get_terminal_cache()
+
+    first = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+    table.delete_item(Key={"session_id": "pronta"})  # Prova de que a segunda vem da memória
+    second = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+
+    assert second["statusCode"] == 200
+    assert second["body"] == first["body"]
+    assert second["headers"]["ETag"] == first["headers"]["ETag"]
+    assert second["headers"]["Cache-Control"] == "private, max-age=86400, immutable"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_get_session_in_progress_is_not_cached(dynamodb_resource):
+    _seed_processing(dynamodb_resource)
+    event = {"pathParameters": {"session_id": "session-123"}, "queryStringParameters": {"fields": "status"}}
+
+    response = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+
+    assert response["headers"]["Cache-Control"] == "no-cache"
+    assert len(get_terminal_cache()) == 0
+
+# --- Consulta em lote (POST /sessions/batch-get) ---
+
+class CountingClient:
+    """Repassa para o client do moto contando as chamadas de BatchGetItem."""
+    def __init__(self):
+        self.client = boto3.client("dynamodb", region_name="us-east-1")
+        self.batch_calls = []
+
+    def batch_get_item(self, **kwargs):
+        self.batch_calls.append(kwargs)
+        return self.client.batch_get_item(**kwargs)
+
+def _batch_event(ids, fields=None):
+    body = {"ids": ids}
+    if fields:
+        body["fields"] = fields
+    return {"routeKey": "POST /sessions/batch-get", "body": json.dumps(body)}
+
+def test_batch_get_returns_sessions_in_order_with_projection(dynamodb_resource):
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    for i in range(150):
+        table.put_item(Item={"session_id": f"s{i:03d}", "status": "PROCESSING",
+                             "attempts": 1, "job_description": "x" * 5000})
+    client = CountingClient()
+    ids = [f"s{i:03d}" for i in reversed(range(150))] + ["nao-existe"]
+
+    response = lambda_handler(_batch_event(ids, ["status"]), {},
+                              dynamodb_resource=dynamodb_resource, dynamodb_client=client)
+    body = json.loads(response["body"])
+
+    assert response["statusCode"] == 200
+    assert len(client.batch_calls) == 2  # 151 chaves -> blocos de 100 + 51
+    assert [s["session_id"] for s in body["sessions"]] == ids[:-1]
+    assert body["sessions"][0] == {"session_id": "s149", "status": "PROCESSING"}
+    assert body["missing"] == ["nao-existe"]
+    assert body["unprocessed"] == []
+
+def test_batch_get_reports_keys_still_unprocessed(monkeypatch):
+    import time
+    monkeypatch.setattr(time, "sleep", lambda s: None)
+    client = MagicMock()
+    client.batch_get_item.return_value = {
+        "Responses": {}, "UnprocessedKeys": {"MockInterviewSessions-Test": {"Keys": [{"session_id": {"S": "a"}}]}}
+    }
+
+    response = lambda_handler(_batch_event(["a"]), {}, dynamodb_resource=MagicMock(), dynamodb_client=client)
+    body = json.loads(response["body"])
+
+    assert client.batch_get_item.call_count == 5
+    assert body == {"sessions": [], "missing": [], "unprocessed": ["a"]}
+
+def test_batch_get_uses_terminal_cache(dynamodb_resource):
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    table.put_item(Item={"session_id": "pronta", "status": "COMPLETED"})
+    table.put_item(Item={"session_id": "rodando", "status": "PROCESSING"})
+    client = CountingClient()
+
+    for _ in range(2):
+        lambda_handler(_batch_event(["pronta", "rodando"]), {},
+                       dynamodb_resource=dynamodb_resource, dynamodb_client=client)
+
+    keys = client.batch_calls[1]["RequestItems"]["MockInterviewSessions-Test"]["Keys"]
+    assert keys == [{"session_id": {"S": "rodando"}}]
+
+@pytest.mark.parametrize("body", [{}, {"ids": []}, {"ids": "a,b"}, {"ids": ["a"], "fields": ["s3_key"]}])
+def test_batch_get_rejects_invalid_body(dynamodb_resource, body):
+    event = {"routeKey": "POST /sessions/batch-get", "body": json.dumps(body)}
+
+    assert lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)["statusCode"] == 400
+
+# --- Compressão (Accept-Encoding) ---
+
+def test_get_session_compresses_large_items_and_revalidates_with_weak_etag(dynamodb_resource, monkeypatch):
+    """Item grande (job_description + feedback) sai em gzip; o ETag fraco continua valendo no If-None-Match."""
+    import base64
+    import gzip
+    monkeypatch.setattr("core.api_response.brotli", None)
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    table.put_item(Item={"session_id": "session-123", "status": "COMPLETED",
+                         "job_description": "Vaga de backend Python/AWS. " * 150,
+                         "ai_feedback": {"score": 88, "summary": "Boa comunicação. " * 40}})
+    event = {"pathParameters": {"session_id": "session-123"},
+             "headers": {"accept-encoding": "gzip, deflate, br"}}
+
+    response = lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+
+    assert response["isBase64Encoded"] is True
+    assert response["headers"]["Content-Encoding"] == "gzip"
+    body = json.loads(gzip.decompress(base64.b64decode(response["body"])))
+    assert body["ai_feedback"]["score"] == 88
+
+    event["headers"]["if-none-match"] = response["headers"]["ETag"]
+    assert response["headers"]["ETag"].startswith("W/")
+    assert lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)["statusCode"] == 304
+
+# --- Histórico (GET /sessions) ---
+
+def _seed_history(dynamodb_resource):
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    for i in range(5):
+        table.put_item(Item={"session_id": f"maria-{i}", "owner": "maria silva", "candidate_name": "Maria Silva",
+                             "question_id": "Q1" if i % 2 == 0 else "Q2", "status": "COMPLETED",
+                             "created_at": 1700000000 + i, "job_description": "x" * 100,
+                             "ai_feedback": {"score": 80}})
+    table.put_item(Item={"session_id": "joao-0", "owner": "joao", "candidate_name": "João",
+                         "question_id": "Q1", "status": "PROCESSING", "created_at": 1700000100})
+    return table
+
+def _list(dynamodb_resource, **params):
+    event = {"routeKey": "GET /sessions", "queryStringParameters": params}
+    return lambda_handler(event, {}, dynamodb_resource=dynamodb_resource)
+
+def test_list_sessions_by_candidate_pages_newest_first(dynamodb_resource):
+    _seed_history(dynamodb_resource)
+
+    whole = json.loads(_list(dynamodb_resource, candidate=" MARIA  Silva")["body"])
+    assert [s["session_id"] for s in whole["sessions"]] == [f"maria-{i}" for i in range(4, -1, -1)]
+    assert whole["next_cursor"] is None
+    # Só os atributos projetados do resumo (nada de job_description/ai_feedback/owner)
+    assert set(whole["sessions"][0]) <= {"session_id", "status", "candidate_name", "question_id",
+                                         "analysis_mode", "created_at", "updated_at"}
+
+    # Páginas de 2 pelo cursor. O moto 5.0 aplica o Limit antes de ordenar, então aqui
+    # conferimos só a cobertura: todas as sessões, nenhuma repetida, 3 páginas.
+    seen, pages, cursor = [], 0, None
+    while pages == 0 or cursor:
+        params = {"candidate": "maria silva", "limit": "2", **({"cursor": cursor} if cursor else {})}
+        page = json.loads(_list(dynamodb_resource, **params)["body"])
+        seen += [s["session_id"] for s in page["sessions"]]
+        cursor = page["next_cursor"]
+        pages += 1
+    assert sorted(seen) == [f"maria-{i}" for i in range(5)]
+    assert pages == 3
+
+def test_list_sessions_by_question_and_by_candidate_and_question(dynamodb_resource):
+    _seed_history(dynamodb_resource)
+
+    by_question = json.loads(_list(dynamodb_resource, question_id="Q1")["body"])
+    both = json.loads(_list(dynamodb_resource, candidate="Maria Silva", question_id="Q2")["body"])
+
+    assert [s["session_id"] for s in by_question["sessions"]] == ["joao-0", "maria-4", "maria-2", "maria-0"]
+    assert by_question["next_cursor"] is None
+    assert [s["session_id"] for s in both["sessions"]] == ["maria-3", "maria-1"]
+
+def test_list_sessions_filtered_pages_are_filled(dynamodb_resource):
+    """Candidato + pergunta rara: a página vem cheia e o cursor aponta para o último resumo devolvido."""
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    for i in range(30):
+        table.put_item(Item={"session_id": f"ana-{i:02d}", "owner": "ana", "candidate_name": "Ana",
+                             "question_id": "Q9" if i % 10 == 0 else "Q1", "status": "COMPLETED",
+                             "created_at": 1700000000 + i})
+
+    page = json.loads(_list(dynamodb_resource, candidate="Ana", question_id="Q9", limit="2")["body"])
+
+    assert [s["session_id"] for s in page["sessions"]] == ["ana-20", "ana-10"]
+    cursor = page["next_cursor"]
+    key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    assert key == {"owner": "ana", "created_at": 1700000010, "session_id": "ana-10"}
+
+
+def test_list_sessions_filtered_query_repeats_until_page_is_full():
+    """Blocos do índice sem nenhum resumo da pergunta não viram páginas vazias: a Query continua."""
+    key = lambda i: {"owner": "ana", "created_at": 1700000000 + i, "session_id": f"ana-{i}"}
+    summary = lambda i: {"session_id": f"ana-{i}", "created_at": 1700000000 + i, "question_id": "Q9"}
+    table = MagicMock()
+    table.query.side_effect = [
+        {"Items": [], "LastEvaluatedKey": key(90)},
+        {"Items": [summary(50)], "LastEvaluatedKey": key(40)},
+        {"Items": [summary(30), summary(20)], "LastEvaluatedKey": key(10)},
+    ]
+    db = MagicMock()
+    db.Table.return_value = table
+
+    page = json.loads(_list(db, candidate="Ana", question_id="Q9", limit="2")["body"])
+
+    assert [s["session_id"] for s in page["sessions"]] == ["ana-50", "ana-30"]
+    calls = [c[1] for c in table.query.call_args_list]
+    assert "ExclusiveStartKey" not in calls[0]
+    assert [c["ExclusiveStartKey"] for c in calls[1:]] == [key(90), key(40)]
+    cursor = page["next_cursor"]
+    assert json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))) == key(30)
+
+
+def test_list_sessions_rejects_missing_filters_and_foreign_cursors(dynamodb_resource):
+    _seed_history(dynamodb_resource)
+    maria_cursor = json.loads(_list(dynamodb_resource, candidate="maria silva", limit="1")["body"])["next_cursor"]
+
+    assert _list(dynamodb_resource)["statusCode"] == 400
+    assert _list(dynamodb_resource, candidate="Anonymous")["statusCode"] == 400
+    assert _list(dynamodb_resource, candidate="joao", cursor=maria_cursor)["statusCode"] == 400
+    assert _list(dynamodb_resource, candidate="joao", cursor="%%%")["statusCode"] == 400
+    assert _list(dynamodb_resource, candidate="joao", limit="abc")["statusCode"] == 400
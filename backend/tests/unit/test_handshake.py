@@ -74,4 +74,198 @@ def test_handshake_internal_server_error(s3_client, dynamodb_resource):
     # Assert
     assert response["statusCode"] == 500
     # Verifica se o erro capturado é o que lançamos
-    assert "Erro Fatal S3" in response["body"]
\ No newline at end of file
+    assert "Erro Fatal S3" in response["body"]
+
+
+def test_handshake_deferred_analysis_mode(s3_client, dynamodb_resource):
+    """Sessões sem urgência são marcadas para a fila deferred; valores inválidos viram realtime."""
+    mock_clients = (s3_client, dynamodb_resource)
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+
+    deferred = json.loads(lambda_handler({"body": json.dumps({"analysis_mode": "deferred"})}, {}, clients=mock_clients)["body"])
+    invalid = json.loads(lambda_handler({"body": json.dumps({"analysis_mode": "turbo"})}, {}, clients=mock_clients)["body"])
+
+    assert table.get_item(Key={'session_id': deferred['session_id']})['Item']['analysis_mode'] == "deferred"
+    assert 'analysis_mode' not in table.get_item(Key={'session_id': invalid['session_id']})['Item']
+
+
+def test_handshake_writes_listing_index_attributes(s3_client, dynamodb_resource):
+    """created_at sempre; owner (normalizado) só quando o candidato se identifica."""
+    mock_clients = (s3_client, dynamodb_resource)
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+
+    named = json.loads(lambda_handler({"body": json.dumps({"candidate_name": "  Maria  Silva ", "question_id": 7})},
+                                      {}, clients=mock_clients)["body"])
+    anonymous = json.loads(lambda_handler({"body": "{}"}, {}, clients=mock_clients)["body"])
+
+    item = table.get_item(Key={'session_id': named['session_id']})['Item']
+    assert item['owner'] == "maria silva"
+    assert item['question_id'] == "7"
+    assert item['created_at'] > 0
+    anonymous_item = table.get_item(Key={'session_id': anonymous['session_id']})['Item']
+    assert 'owner' not in anonymous_item
+    # Sem pergunta: fora do question-created-index (nada de partição quente com um padrão)
+    assert 'question_id' not in anonymous_item
+
+
+# --- Upload multipart (gravações longas) ---
+
+PART = 5 * 1024 * 1024
+
+
+def _start_multipart(mock_clients, monkeypatch, file_size):
+    monkeypatch.setenv("MULTIPART_THRESHOLD_BYTES", str(PART))
+    monkeypatch.setenv("MULTIPART_PART_SIZE_BYTES", str(PART))
+    response = lambda_handler({"body": json.dumps({"file_size": file_size})}, {}, clients=mock_clients)
+    assert response["statusCode"] == 201
+    return json.loads(response["body"])
+
+
+def _complete(mock_clients, session_id, parts):
+    event = {"routeKey": "POST /sessions/{session_id}/complete-upload",
+             "pathParameters": {"session_id": session_id},
+             "body": json.dumps({"parts": parts})}
+    return lambda_handler(event, {}, clients=mock_clients)
+
+
+def _upload_part(url, data):
+    import requests
+    response = requests.put(url, data=data)
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+
+def test_multipart_upload_with_retried_part(s3_client, dynamodb_resource, monkeypatch):
+    """Partes em paralelo pelas URLs assinadas; a que falhou volta com URL nova no 409."""
+    mock_clients = (s3_client, dynamodb_resource)
+    started = _start_multipart(mock_clients, monkeypatch, 2 * PART + 10)
+
+    assert started["upload_mode"] == "multipart"
+    assert started["part_size"] == PART
+    assert [p["part_number"] for p in started["parts"]] == [1, 2, 3]
+    item = dynamodb_resource.Table("MockInterviewSessions-Test").get_item(
+        Key={'session_id': started['session_id']})['Item']
+    assert item["upload_id"] == started["upload_id"] and item["upload_part_count"] == 3
+
+    chunks = [b"a" * PART, b"b" * PART, b"c" * 10]
+    urls = {p["part_number"]: p["url"] for p in started["parts"]}
+    parts = [{"part_number": n, "etag": _upload_part(urls[n], chunks[n - 1])} for n in (1, 3)]
+
+    # A parte 2 "falhou": o fechamento devolve só ela, com URL nova
+    retry = _complete(mock_clients, started["session_id"], parts)
+    assert retry["statusCode"] == 409
+    retry_body = json.loads(retry["body"])
+    assert retry_body["missing_parts"] == [2]
+    parts.append({"part_number": 2, "etag": _upload_part(retry_body["parts"][0]["url"], chunks[1])})
+
+    done = _complete(mock_clients, started["session_id"], parts)
+    assert done["statusCode"] == 200
+    obj = s3_client.get_object(Bucket="mock-interview-tests-bucket",
+                               Key=f"uploads/{started['session_id']}/audio.mp3")
+    assert obj["Body"].read() == b"".join(chunks)
+    # Repetir o fechamento é inofensivo
+    assert _complete(mock_clients, started["session_id"], parts)["statusCode"] == 200
+
+
+def test_small_or_undeclared_size_keeps_single_put(s3_client, dynamodb_resource, monkeypatch):
+    mock_clients = (s3_client, dynamodb_resource)
+    monkeypatch.setenv("MULTIPART_THRESHOLD_BYTES", str(PART))
+
+    small = json.loads(lambda_handler({"body": json.dumps({"file_size": 1000})}, {}, clients=mock_clients)["body"])
+    undeclared = json.loads(lambda_handler({"body": "{}"}, {}, clients=mock_clients)["body"])
+
+    assert small["upload_mode"] == undeclared["upload_mode"] == "single"
+    assert "upload_url" in small
+
+
+def test_multipart_rejects_invalid_requests(s3_client, dynamodb_resource, monkeypatch):
+    mock_clients = (s3_client, dynamodb_resource)
+    monkeypatch.setenv("MAX_UPLOAD_BYTES", str(10 * PART))
+
+    def create(size):
+        return lambda_handler({"body": json.dumps({"file_size": size})}, {}, clients=mock_clients)["statusCode"]
+
+    assert create(-1) == 400
+    assert create("big") == 400
+    assert create(11 * PART) == 400
+
+    single = json.loads(lambda_handler({"body": "{}"}, {}, clients=mock_clients)["body"])
+    assert _complete(mock_clients, single["session_id"], [])["statusCode"] == 409
+    assert _complete(mock_clients, "nao-existe", [])["statusCode"] == 404
+
+    started = _start_multipart(mock_clients, monkeypatch, PART + 1)
+    assert _complete(mock_clients, started["session_id"], [{"part_number": 7, "etag": "x"}])["statusCode"] == 400
+    bad_etags = [{"part_number": 1, "etag": '"x"'}, {"part_number": 2, "etag": '"y"'}]
+    assert _complete(mock_clients, started["session_id"], bad_etags)["statusCode"] == 409
+
+
+# --- Criação em lote (POST /sessions/batch) ---
+
+def _batch_create(mock_clients, sessions):
+    event = {"routeKey": "POST /sessions/batch", "body": json.dumps({"sessions": sessions})}
+    return lambda_handler(event, {}, clients=mock_clients)
+
+
+def test_batch_create_writes_all_sessions_in_chunks(s3_client, dynamodb_resource):
+    """60 sessões = 3 BatchWriteItem (25 + 25 + 10), todas com URL, na ordem das entradas."""
+    mock_clients = (s3_client, dynamodb_resource)
+    entries = [{"candidate_name": f"Candidato {i}", "question_id": f"Q{i % 3}",
+                "job_description": "Vaga de dados", "analysis_mode": "deferred" if i == 0 else "realtime"}
+               for i in range(60)]
+
+    response = _batch_create(mock_clients, entries)
+
+    assert response["statusCode"] == 201
+    body = json.loads(response["body"])
+    assert body["failed"] == []
+    assert [s["index"] for s in body["sessions"]] == list(range(60))
+    assert all(isinstance(s["upload_url"], str) for s in body["sessions"])
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    first = table.get_item(Key={'session_id': body["sessions"][0]["session_id"]})['Item']
+    assert first["status"] == "PENDING_UPLOAD" and first["analysis_mode"] == "deferred"
+    assert first["owner"] == "candidato 0" and first["question_id"] == "Q0"
+    last = table.get_item(Key={'session_id': body["sessions"][59]["session_id"]})['Item']
+    assert last["s3_key"] == f"uploads/{last['session_id']}/audio.mp3"
+
+
+def test_batch_create_retries_unprocessed_items(s3_client, dynamodb_resource, monkeypatch):
+    """UnprocessedItems são reenviados; o que sobra após as tentativas volta em failed, sem URL."""
+    monkeypatch.setattr("core.dynamo_batch.time.sleep", lambda s: None)
+    real_batch_write = dynamodb_resource.batch_write_item
+    calls = []
+
+    def throttled(RequestItems):
+        calls.append(RequestItems)
+        (table_name, requests), = RequestItems.items()
+        if len(calls) == 1:
+            # Primeira chamada: grava só a primeira entrada, devolve o resto
+            real_batch_write(RequestItems={table_name: requests[:1]})
+            return {"UnprocessedItems": {table_name: requests[1:]}}
+        if requests[-1]["PutRequest"]["Item"]["candidate_name"] == "Sempre throttled":
+            if requests[:-1]:
+                real_batch_write(RequestItems={table_name: requests[:-1]})
+            return {"UnprocessedItems": {table_name: requests[-1:]}}
+        return real_batch_write(RequestItems=RequestItems)
+
+    monkeypatch.setattr(dynamodb_resource, "batch_write_item", throttled)
+    mock_clients = (s3_client, dynamodb_resource)
+
+    body = json.loads(_batch_create(mock_clients, [{"candidate_name": "A"}, {"candidate_name": "B"},
+                                                   {"candidate_name": "Sempre throttled"}])["body"])
+
+    assert [s["index"] for s in body["sessions"]] == [0, 1]
+    assert [f["index"] for f in body["failed"]] == [2]
+    assert len(calls) == 5  # dynamo_batch.MAX_ATTEMPTS
+    table = dynamodb_resource.Table("MockInterviewSessions-Test")
+    assert all("Item" in table.get_item(Key={'session_id': s["session_id"]}) for s in body["sessions"])
+
+
+def test_batch_create_validates_entries(s3_client, dynamodb_resource, monkeypatch):
+    mock_clients = (s3_client, dynamodb_resource)
+    monkeypatch.setenv("BATCH_CREATE_MAX_ENTRIES", "3")
+
+    assert _batch_create(mock_clients, [])["statusCode"] == 400
+    assert _batch_create(mock_clients, [{}] * 4)["statusCode"] == 400
+    invalid = _batch_create(mock_clients, [{}, "x", {"job_description": 5}])
+    assert invalid["statusCode"] == 400
+    assert "[1, 2]" in invalid["body"]
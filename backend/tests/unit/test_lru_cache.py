@@ -0,0 +1,27 @@
+from core import metrics
+from core.lru_cache import LRUCache
+
+
+def test_evicts_least_recently_used():
+    metrics.reset()
+    cache = LRUCache(max_entries=2, ttl_seconds=60, name="Test")
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+    assert metrics.get("TestEviction") == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_entries_expire():
+    cache = LRUCache(max_entries=10, ttl_seconds=0)
+
+    cache.put("a", 1)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
@@ -0,0 +1,67 @@
+import json
+
+from core.model_router import DEFAULT_ROUTES, ModelRoute, ModelRouter
+
+
+def test_routes_by_duration_to_fast_standard_and_long_context():
+    router = ModelRouter()
+
+    assert router.route(router.measure(30, 500_000)).route.name == "fast"
+    assert router.route(router.measure(600, 10_000_000)).route.name == "standard"
+    assert router.route(router.measure(3600, 60_000_000)).route.name == "long_context"
+
+
+def test_prompt_tokens_count_towards_the_limits():
+    router = ModelRouter([
+        ModelRoute("fast", "a", max_tokens=1000),
+        ModelRoute("standard", "b"),
+    ])
+
+    assert router.route(router.measure(30, 0)).model == "a"  # 960 tokens
+    assert router.route(router.measure(30, 0, "x" * 400)).model == "b"  # + 100 do prompt
+
+
+def test_unknown_duration_is_estimated_from_bytes_and_corrected_by_count_tokens():
+    router = ModelRouter()
+
+    measure = router.measure(0, 160_000)
+    assert not measure.exact
+    assert measure.duration_s == 10
+
+    counted = router.with_counted_tokens(measure, 32_000)
+    assert counted.exact
+    assert counted.tokens == 32_000
+    assert counted.duration_s == 1000
+    assert router.route(counted).route.name == "standard"
+
+
+def test_last_route_is_the_fallback():
+    router = ModelRouter([ModelRoute("only", "a", max_seconds=10)])
+
+    assert router.route(router.measure(100, 0)).model == "a"
+
+
+def test_routes_from_env_change_the_version(monkeypatch):
+    default_version = ModelRouter().version
+    monkeypatch.setenv("MODEL_ROUTES", json.dumps([{"name": "all", "model": "gemini-x"}]))
+
+    router = ModelRouter()
+
+    assert router.routes == (ModelRoute("all", "gemini-x"),)
+    assert router.version != default_version
+
+
+def test_invalid_routes_env_falls_back_to_defaults(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTES", json.dumps([{"nome": "x"}]))
+
+    assert ModelRouter().routes == DEFAULT_ROUTES
+
+
+def test_record_is_dynamodb_friendly():
+    router = ModelRouter()
+    record = router.route(router.measure(12.345, 1000)).record(3.7, 1520.2)
+
+    assert record["route"] == "fast"
+    assert str(record["duration_s"]) == "12.35"
+    assert record["decision_ms"] == 3 and record["generate_ms"] == 1520
+    assert not any(isinstance(v, float) for v in record.values())
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+
+from core import metrics
+from core.partial_feedback import PartialFeedbackWriter
+
+TABLE_NAME = "MockInterviewSessions-Test"
+
+
+def _chunks(n):
+    text = '{"technical_score": 80, "summary": "'
+    for i in range(n):
+        text += f"parte {i:03d} " * 5
+        yield text
+
+
+def test_first_chunk_is_written_right_away_and_the_rest_coalesced(dynamodb_resource):
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": "s1", "status": "PROCESSING"})
+    writer = PartialFeedbackWriter(table, "s1", interval=60)
+
+    async def run():
+        for text in _chunks(20):
+            writer.update(text)
+            await asyncio.sleep(0.01)
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert writer.writes == 1  # O resto caiu dentro do intervalo e foi descartado pelo close
+    partial = table.get_item(Key={"session_id": "s1"})["Item"]["partial_feedback"]
+    assert partial["summary"].startswith("parte 000")
+
+
+def test_updates_are_flushed_once_per_interval(dynamodb_resource):
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": "s1", "status": "PROCESSING"})
+    writer = PartialFeedbackWriter(table, "s1", interval=0.05, min_chars=1)
+    texts = list(_chunks(30))
+
+    async def run():
+        for text in texts:
+            writer.update(text)
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert 2 <= writer.writes < len(texts)
+    partial = table.get_item(Key={"session_id": "s1"})["Item"]["partial_feedback"]
+    assert partial["summary"] == texts[-1].split('"summary": "')[1]
+
+
+def test_never_overwrites_a_finished_session(dynamodb_resource):
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": "s1", "status": "COMPLETED"})
+    writer = PartialFeedbackWriter(table, "s1", interval=1)
+
+    async def run():
+        writer.update('{"summary": "atrasado')
+        await asyncio.sleep(0.05)  # A escrita sai (e falha na condição PROCESSING)
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert writer.writes == 0
+    assert "partial_feedback" not in table.get_item(Key={"session_id": "s1"})["Item"]
+
+
+def test_chunk_arriving_during_a_write_is_flushed_after_it(dynamodb_resource):
+    """Texto que chega com a escrita em voo não se perde: sai logo depois dela."""
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": "s1", "status": "PROCESSING"})
+    writer = PartialFeedbackWriter(table, "s1", interval=0.01, min_chars=1)
+    texts = list(_chunks(2))
+    release = threading.Event()
+    write = writer._write
+
+    def blocked_write(fields):
+        release.wait(5)  # A primeira escrita fica presa até o segundo chunk chegar
+        write(fields)
+
+    writer._write = blocked_write
+
+    async def run():
+        writer.update(texts[0])
+        await asyncio.sleep(0.05)
+        assert writer._writing
+        writer.update(texts[1])
+        release.set()
+        await asyncio.sleep(0.1)
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert writer.writes == 2
+    partial = table.get_item(Key={"session_id": "s1"})["Item"]["partial_feedback"]
+    assert partial["summary"] == texts[-1].split('"summary": "')[1]
+
+
+def test_unexpected_write_error_is_counted_and_close_does_not_raise(dynamodb_resource):
+    metrics.reset()
+    table = dynamodb_resource.Table(TABLE_NAME)
+    writer = PartialFeedbackWriter(table, "s1", interval=1)
+
+    def broken_write(fields):
+        raise ValueError("payload inválido")
+
+    writer._write = broken_write
+
+    async def run():
+        writer.update('{"summary": "texto')
+        await asyncio.sleep(0.05)
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert writer.writes == 0
+    assert metrics.get("PartialFeedbackWriteErrors") == 1
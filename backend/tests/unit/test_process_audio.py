@@ -1,7 +1,8 @@
 import pytest
 import json
 from unittest.mock import MagicMock
-from handlers.process_audio import lambda_handler
+from core import metrics
+from handlers.process_audio import batch_handler, deferred_handler, lambda_handler
 
 # Dados de teste
 SESSION_ID = "test-session-123"
@@ -9,6 +10,12 @@ BUCKET_NAME = "mock-interview-tests-bucket"
 S3_KEY = f"uploads/{SESSION_ID}/audio.mp3"
 TABLE_NAME = "MockInterviewSessions-Test"
 
+
+@pytest.fixture(autouse=True)
+def files_api_path(monkeypatch):
+    """Por padrão os testes cobrem o caminho Files API (upload + polling)."""
+    monkeypatch.setenv("INLINE_AUDIO_MAX_BYTES", "0")
+
 @pytest.fixture
 def mock_genai_client():
     """
@@ -35,6 +42,7 @@ def mock_genai_client():
     client_mock.files.upload.return_value = mock_file
     client_mock.files.get.return_value = mock_file
     client_mock.models.generate_content.return_value = mock_response
+    client_mock.models.count_tokens.return_value.total_tokens = 320
 
     return client_mock
 
@@ -153,4 +161,1007 @@ def test_process_audio_gemini_file_processing_failed(s3_client, dynamodb_resourc
     with pytest.raises(ValueError) as excinfo:
         lambda_handler(event, {}, resources=resources)
         
-    assert "falhou no Gemini" in str(excinfo.value)
\ No newline at end of file
+    assert "falhou no Gemini" in str(excinfo.value)
+
+
+def test_process_audio_streams_from_s3_without_tmp_file(s3_client, dynamodb_resource, mock_genai_client):
+    """
+    Cenário: Upload para o Gemini deve receber um stream do S3 (sem /tmp).
+    Verifica: O SDK recebe um IOBase com o conteúdo completo e o mime_type correto.
+    """
+    # Arrange
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"stream_audio" * 100)
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PROCESSING"})
+
+    uploaded = {}
+    def fake_upload(file, config):
+        # Lê como o SDK faz: mede com seek/tell e depois consome o stream
+        file.seek(0, 2)
+        uploaded["size"] = file.tell()
+        file.seek(0)
+        uploaded["data"] = file.read()
+        uploaded["config"] = config
+        return mock_genai_client.files.get.return_value
+    mock_genai_client.files.upload.side_effect = fake_upload
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}
+
+    # Act
+    lambda_handler(event, {}, resources=resources)
+
+    # Assert
+    assert uploaded["size"] == 1200
+    assert uploaded["data"] == b"stream_audio" * 100
+    assert uploaded["config"]["mime_type"] == "audio/mpeg"
+
+
+def test_process_audio_cache_hit_skips_gemini(s3_client, dynamodb_resource, cache_table, mock_genai_client):
+    """
+    Cenário: A mesma gravação é enviada duas vezes para a mesma vaga.
+    Verifica: A segunda análise vem do cache, sem upload nem generate_content.
+    """
+    # Arrange
+    metrics.reset()
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"same_audio")
+    other_key = "uploads/other-session/audio.mp3"
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=other_key, Body=b"same_audio")
+
+    table = dynamodb_resource.Table(TABLE_NAME)
+    for sid in (SESSION_ID, "other-session"):
+        table.put_item(Item={"session_id": sid, "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+
+    # Act
+    first = lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+    second = lambda_handler({"session_id": "other-session", "bucket": BUCKET_NAME, "key": other_key}, {}, resources=resources)
+
+    # Assert
+    assert "cache" not in first
+    assert second["cache"] == "HIT"
+    mock_genai_client.files.upload.assert_called_once()
+    mock_genai_client.models.generate_content.assert_called_once()
+
+    item = table.get_item(Key={'session_id': "other-session"})['Item']
+    assert item['status'] == "COMPLETED"
+    assert item['cache_hit'] is True
+    assert item['ai_feedback']['technical_score'] == 85
+
+    assert metrics.get("AnalysisCacheMiss") == 1
+    assert metrics.get("AnalysisCacheHit") == 1
+
+
+def test_process_audio_cache_hit_waits_for_prescreen_before_closing(s3_client, dynamodb_resource, cache_table, mock_genai_client, monkeypatch):
+    """
+    Cache HIT com a pré-triagem ainda lendo: a thread é avisada (cancel) e o stream
+    só é fechado depois que ela sai.
+    """
+    from core.audio_screen import PrescreenCancelled
+    import handlers.process_audio as process_audio
+
+    metrics.reset()
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"same_audio")
+    other_key = "uploads/other-session/audio.mp3"
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=other_key, Body=b"same_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    for sid in (SESSION_ID, "other-session"):
+        table.put_item(Item={"session_id": sid, "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+
+    seen = {}
+
+    def slow_prescreen(stream, cancel):
+        # Simula uma pré-triagem longa: só sai quando cancelada
+        seen["cancelled"] = cancel.wait(5)
+        seen["closed_while_running"] = stream.closed
+        raise PrescreenCancelled("cancelada")
+
+    monkeypatch.setattr(process_audio, "prescreen", slow_prescreen)
+
+    result = lambda_handler({"session_id": "other-session", "bucket": BUCKET_NAME, "key": other_key}, {}, resources=resources)
+
+    assert result["cache"] == "HIT"
+    assert seen == {"cancelled": True, "closed_while_running": False}
+    assert metrics.get("PrescreenCancelled") == 1
+
+
+def test_process_audio_multipart_cache_key_is_computed_from_the_content(s3_client, dynamodb_resource, cache_table, mock_genai_client):
+    """
+    Cenário: Objeto enviado em multipart (ETag composto); a sessão traz um content_sha256 declarado que não bate.
+    Verifica: O hash declarado é ignorado (sem HIT com o resultado de outra gravação); a chave usa o SHA-256
+    calculado no servidor, então a mesma gravação reenviada reaproveita o resultado.
+    """
+    import hashlib
+    from core.analysis_cache import AnalysisCache, build_cache_key
+    from core.model_router import ModelRouter
+    from core.prompts import PROMPT_VERSION
+
+    body = b"multipart_audio"
+    upload = s3_client.create_multipart_upload(Bucket=BUCKET_NAME, Key=S3_KEY)
+    etag = s3_client.upload_part(Bucket=BUCKET_NAME, Key=S3_KEY, UploadId=upload["UploadId"],
+                                 PartNumber=1, Body=body)["ETag"]
+    s3_client.complete_multipart_upload(Bucket=BUCKET_NAME, Key=S3_KEY, UploadId=upload["UploadId"],
+                                        MultipartUpload={"Parts": [{"PartNumber": 1, "ETag": etag}]})
+    assert "-" in s3_client.head_object(Bucket=BUCKET_NAME, Key=S3_KEY)["ETag"]
+
+    cache = AnalysisCache(dynamodb_resource, "MockInterviewAnalysisCache-Test")
+    declared = "ab" * 32  # hash de uma gravação "boa" conhecida
+    cache.put(build_cache_key(f"sha256:{declared}", "Vaga Python", PROMPT_VERSION, ModelRouter().version),
+              {"technical_score": 99})
+    table = dynamodb_resource.Table(TABLE_NAME)
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+
+    table.put_item(Item={"session_id": "forjada", "status": "PENDING_UPLOAD",
+                         "job_description": "Vaga Python", "content_sha256": declared})
+    forged = lambda_handler({"session_id": "forjada", "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+    assert forged["status"] == "COMPLETED" and "cache" not in forged
+    mock_genai_client.models.generate_content.assert_called_once()
+
+    real = hashlib.sha256(body).hexdigest()
+    assert cache.get(build_cache_key(f"sha256:{real}", "Vaga Python", PROMPT_VERSION, ModelRouter().version))
+    table.put_item(Item={"session_id": "repetida", "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+    again = lambda_handler({"session_id": "repetida", "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+    assert again["cache"] == "HIT"
+    assert mock_genai_client.models.generate_content.call_count == 1
+
+
+def test_process_audio_cache_miss_on_different_job(s3_client, dynamodb_resource, cache_table, mock_genai_client):
+    """Mesma gravação, vaga diferente: o resultado em cache não pode ser reaproveitado."""
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"same_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}
+
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+    lambda_handler(event, {}, resources=resources)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": "Vaga Java"})
+    result = lambda_handler(event, {}, resources=resources)
+
+    assert "cache" not in result
+    assert mock_genai_client.models.generate_content.call_count == 2
+
+
+def test_process_audio_rejects_silent_audio_locally(s3_client, dynamodb_resource, mock_genai_client):
+    """
+    Cenário: WAV só com silêncio.
+    Verifica: Pré-triagem marca ERROR (AUDIO_INAUDIVEL) sem upload nem chamada ao modelo.
+    """
+    # Arrange
+    import io, wave
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(16000)
+        wav_file.writeframes(b"\x00\x00" * 16000 * 2)
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=buf.getvalue())
+
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD"})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}
+
+    # Act
+    result = lambda_handler(event, {}, resources=resources)
+
+    # Assert
+    assert result["status"] == "ERROR"
+    assert result["reason"] == "SILENCE"
+    mock_genai_client.files.upload.assert_not_called()
+    mock_genai_client.models.generate_content.assert_not_called()
+
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['status'] == "ERROR"
+    assert item['error_message'] == "AUDIO_INAUDIVEL"
+
+
+def test_process_audio_inline_fast_path(s3_client, dynamodb_resource, mock_genai_client, monkeypatch):
+    """
+    Cenário: Gravação abaixo do limite de inline.
+    Verifica: Bytes vão direto no generate_content, sem files.upload/polling, e a latência é medida por caminho.
+    """
+    # Arrange
+    monkeypatch.setenv("INLINE_AUDIO_MAX_BYTES", "1024")
+    metrics.reset()
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"short_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD"})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}
+
+    # Act
+    result = lambda_handler(event, {}, resources=resources)
+
+    # Assert
+    assert result["ingest_path"] == "inline"
+    mock_genai_client.files.upload.assert_not_called()
+    mock_genai_client.files.get.assert_not_called()
+
+    audio_part = mock_genai_client.models.generate_content.call_args[1]["contents"][0]
+    assert audio_part.inline_data.data == b"short_audio"
+    assert audio_part.inline_data.mime_type == "audio/mpeg"
+
+    assert metrics.get("AudioBytes", path="inline") == len(b"short_audio")
+    assert metrics.get("AnalysisLatencyMs", path="inline") > 0
+
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['status'] == "COMPLETED"
+
+
+def test_process_audio_large_file_uses_files_api(s3_client, dynamodb_resource, mock_genai_client, monkeypatch):
+    """Acima do limite o caminho continua sendo a Files API."""
+    monkeypatch.setenv("INLINE_AUDIO_MAX_BYTES", "4")
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"longer_audio")
+    dynamodb_resource.Table(TABLE_NAME).put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD"})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    result = lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+
+    assert result["ingest_path"] == "files_api"
+    mock_genai_client.files.upload.assert_called_once()
+
+
+def test_process_audio_uses_context_cache_for_long_job(s3_client, dynamodb_resource, mock_genai_client):
+    """
+    Cenário: Descrição de vaga longa (acima do mínimo de tokens do cache).
+    Verifica: generate_content recebe só o áudio + referência do cached content.
+    """
+    # Arrange
+    long_job = "Requisitos: Python avançado, AWS, mensageria, observabilidade. " * 80
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    dynamodb_resource.Table(TABLE_NAME).put_item(Item={
+        "session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": long_job
+    })
+    mock_genai_client.caches.create.return_value.name = "cachedContents/vaga-1"
+    mock_genai_client.caches.create.return_value.expire_time = None
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}
+
+    # Act
+    lambda_handler(event, {}, resources=resources)
+
+    # Assert
+    call = mock_genai_client.models.generate_content.call_args[1]
+    assert call["config"].cached_content == "cachedContents/vaga-1"
+    assert call["config"].system_instruction is None
+    assert long_job not in str(call["contents"])
+
+
+def test_process_audio_malformed_response_does_not_raise(s3_client, dynamodb_resource, cache_table, mock_genai_client):
+    """
+    Cenário: O modelo devolve texto fora do formato.
+    Verifica: Sessão vira ERROR (sem exceção -> sem Retry da Step Function) e nada vai para o cache.
+    """
+    # Arrange
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD"})
+
+    mock_response = MagicMock()
+    mock_response.parsed = None
+    mock_response.text = "Desculpe, não consegui avaliar."
+    mock_genai_client.models.generate_content.return_value = mock_response
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}
+
+    # Act
+    lambda_handler(event, {}, resources=resources)
+
+    # Assert
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['status'] == "ERROR"
+    assert item['error_message'] == "RESPOSTA_INVALIDA"
+    assert cache_table.scan()['Count'] == 0
+
+    config = mock_genai_client.models.generate_content.call_args[1]["config"]
+    assert config.response_mime_type == "application/json"
+
+
+# --- Modo Lote (batch_handler) ---
+
+@pytest.fixture
+def mock_genai_aio(mock_genai_client):
+    """client.aio com métodos awaitable; mede o pico de gerações simultâneas."""
+    import asyncio
+    from unittest.mock import AsyncMock
+
+    state = {"running": 0, "peak": 0}
+    response = mock_genai_client.models.generate_content.return_value
+
+    async def generate(**kwargs):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        return response
+
+    mock_genai_client.aio.files.upload = AsyncMock(return_value=mock_genai_client.files.upload.return_value)
+    mock_genai_client.aio.files.get = AsyncMock(return_value=mock_genai_client.files.get.return_value)
+    mock_genai_client.aio.models.generate_content = AsyncMock(side_effect=generate)
+    mock_genai_client.aio.models.count_tokens = AsyncMock(return_value=mock_genai_client.models.count_tokens.return_value)
+    mock_genai_client.state = state
+    return mock_genai_client
+
+
+def _seed_sessions(s3_client, dynamodb_resource, session_ids):
+    table = dynamodb_resource.Table(TABLE_NAME)
+    for sid in session_ids:
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=f"uploads/{sid}/audio.mp3", Body=f"audio-{sid}".encode())
+        table.put_item(Item={"session_id": sid, "status": "PENDING_UPLOAD"})
+    return table
+
+
+def test_batch_handler_analyzes_sessions_concurrently(s3_client, dynamodb_resource, mock_genai_aio, monkeypatch):
+    """
+    Cenário: Lote de 6 sessões vindo de um Map da Step Function, concorrência 3.
+    Verifica: Todas concluídas via client.aio, respeitando o limite de concorrência.
+    """
+    # Arrange
+    monkeypatch.setenv("BATCH_CONCURRENCY", "3")
+    ids = [f"batch-{i}" for i in range(6)]
+    table = _seed_sessions(s3_client, dynamodb_resource, ids)
+    event = {"sessions": [{"session_id": sid, "bucket": BUCKET_NAME, "key": f"uploads/{sid}/audio.mp3"} for sid in ids]}
+
+    # Act
+    result = batch_handler(event, {}, resources=(s3_client, dynamodb_resource, mock_genai_aio))
+
+    # Assert
+    assert result["succeeded"] == 6
+    assert result["failed"] == 0
+    assert 1 < mock_genai_aio.state["peak"] <= 3
+    mock_genai_aio.models.generate_content.assert_not_called()  # sync não é usado no lote
+    for sid in ids:
+        assert table.get_item(Key={'session_id': sid})['Item']['status'] == "COMPLETED"
+
+
+def test_batch_handler_reports_sqs_item_failures(s3_client, dynamodb_resource, mock_genai_aio):
+    """
+    Cenário: Lote SQS com uma sessão cujo áudio não existe.
+    Verifica: Só a mensagem com falha volta em batchItemFailures.
+    """
+    # Arrange
+    _seed_sessions(s3_client, dynamodb_resource, ["ok-1", "ok-2"])
+    payloads = [
+        ("m1", {"session_id": "ok-1", "bucket": BUCKET_NAME, "key": "uploads/ok-1/audio.mp3"}),
+        ("m2", {"session_id": "missing", "bucket": BUCKET_NAME, "key": "uploads/missing/audio.mp3"}),
+        ("m3", {"session_id": "ok-2", "bucket": BUCKET_NAME, "key": "uploads/ok-2/audio.mp3"}),
+        ("m4", {}),
+    ]
+    event = {"Records": [{"messageId": mid, "body": json.dumps(p)} for mid, p in payloads]}
+
+    # Act
+    result = batch_handler(event, {}, resources=(s3_client, dynamodb_resource, mock_genai_aio))
+
+    # Assert
+    assert result["succeeded"] == 2
+    assert result["failed"] == 2
+    assert result["batchItemFailures"] == [{"itemIdentifier": "m2"}, {"itemIdentifier": "m4"}]
+    errors = {r["id"]: r["error"] for r in result["results"] if not r["ok"]}
+    assert "Payload inválido" in errors["m4"]
+
+
+def test_process_audio_overlaps_independent_io(s3_client, dynamodb_resource, mock_genai_client):
+    """
+    Cenário: DynamoDB (claim) e S3 (HeadObject) lentos, ~200 ms cada.
+    Verifica: As etapas rodam em paralelo (pipeline < soma serial) e cada estágio é medido.
+    """
+    import time as _time
+
+    # Arrange
+    metrics.reset()
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    dynamodb_resource.Table(TABLE_NAME).put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD"})
+
+    def slow(fn):
+        def wrapper(**kwargs):
+            _time.sleep(0.2)
+            return fn(**kwargs)
+        return wrapper
+
+    class SlowDB:
+        def Table(self, name):
+            table = dynamodb_resource.Table(name)
+            table.update_item = slow(table.update_item)
+            return table
+
+    s3_client.head_object = slow(s3_client.head_object)
+    resources = (s3_client, SlowDB(), mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}
+
+    # Act
+    lambda_handler(event, {}, resources=resources)
+
+    # Assert
+    context_ms = metrics.get("StageMs", stage="claim", outcome="analyzed")
+    s3_open_ms = metrics.get("StageMs", stage="s3_open", outcome="analyzed")
+    assert context_ms >= 200 and s3_open_ms >= 200
+    assert metrics.get("StageMs", stage="generate", outcome="analyzed") > 0
+    # save também usa update_item (lento): desconta do total
+    save_ms = metrics.get("StageMs", stage="save", outcome="analyzed")
+    assert metrics.get("PipelineMs", outcome="analyzed") - save_ms < context_ms + s3_open_ms
+
+
+# --- Claim atômico da sessão ---
+
+@pytest.mark.parametrize("item", [
+    {"status": "COMPLETED"},
+    {"status": "ERROR"},
+    {"status": "PROCESSING", "lease_until": 4102444800},  # lease ainda válido (outro worker)
+])
+def test_process_audio_duplicate_event_is_skipped(s3_client, dynamodb_resource, mock_genai_client, item):
+    """
+    Cenário: Evento duplicado do S3 / retry concorrente para uma sessão que não está livre.
+    Verifica: Nenhuma chamada ao Gemini e o item não é alterado.
+    """
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, **item})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    result = lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+
+    assert result == {"status": "SKIPPED", "session_id": SESSION_ID, "current_status": item["status"]}
+    mock_genai_client.files.upload.assert_not_called()
+    mock_genai_client.models.generate_content.assert_not_called()
+    assert table.get_item(Key={'session_id': SESSION_ID})['Item']['status'] == item["status"]
+
+
+def test_process_audio_missing_session_is_not_claimed(s3_client, dynamodb_resource, mock_genai_client):
+    """
+    Cenário: Evento para uma sessão que não existe (TTL expirou, apagada ou evento forjado).
+    Verifica: O claim falha, nada é criado na tabela e o Gemini não é chamado.
+    """
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    result = lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+
+    assert result == {"status": "SKIPPED", "session_id": SESSION_ID, "current_status": None}
+    mock_genai_client.files.upload.assert_not_called()
+    mock_genai_client.models.generate_content.assert_not_called()
+    assert 'Item' not in table.get_item(Key={'session_id': SESSION_ID})
+
+
+def test_process_audio_claim_returns_context_in_one_call(s3_client, dynamodb_resource, mock_genai_client):
+    """O claim já devolve a job_description (sem get_item separado) e registra o lease."""
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": "Vaga Go"})
+
+    class SpyDB:
+        def Table(self, name):
+            real = dynamodb_resource.Table(name)
+            spy = MagicMock(wraps=real)
+            spy.get_item.side_effect = AssertionError("get_item não deveria ser chamado")
+            return spy
+
+    resources = (s3_client, SpyDB(), mock_genai_client)
+    lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+
+    contents = mock_genai_client.models.generate_content.call_args[1]["contents"]
+    assert "Vaga Go" in contents[1]
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['status'] == "COMPLETED"
+    assert item['attempts'] == 1
+    assert 'lease_until' in item
+
+
+def test_process_audio_failure_releases_claim_for_retry(s3_client, dynamodb_resource, mock_genai_client):
+    """
+    Cenário: Falha transitória do Gemini na primeira tentativa.
+    Verifica: Sessão volta para RETRY_PENDING e o retry da Step Function consegue o claim.
+    """
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD"})
+    ok_response = mock_genai_client.models.generate_content.return_value
+    mock_genai_client.models.generate_content.side_effect = [Exception("503 UNAVAILABLE"), ok_response]
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}
+
+    with pytest.raises(Exception):
+        lambda_handler(event, {}, resources=resources)
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['status'] == "RETRY_PENDING"
+    assert "503" in item['error_message']
+
+    result = lambda_handler(event, {}, resources=resources)
+    assert result["status"] == "COMPLETED"
+    assert table.get_item(Key={'session_id': SESSION_ID})['Item']['attempts'] == 2
+
+
+def test_process_audio_streams_partial_feedback_to_the_session(s3_client, dynamodb_resource, mock_genai_client, monkeypatch):
+    """
+    Cenário: Streaming ligado (PARTIAL_FEEDBACK_INTERVAL_SECONDS).
+    Verifica: O texto parcial aparece na sessão durante a geração e sai quando o resultado final é gravado.
+    """
+    import time
+    from types import SimpleNamespace
+    monkeypatch.setenv("PARTIAL_FEEDBACK_INTERVAL_SECONDS", "0")
+    metrics.reset()
+
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+    observed = []
+
+    def stream(**kwargs):
+        yield SimpleNamespace(text='{"technical_score": 85, "summary": "Boa comunicação')
+        time.sleep(0.1)  # O worker grava o parcial enquanto o modelo ainda gera
+        observed.append(table.get_item(Key={'session_id': SESSION_ID})['Item'].get('partial_feedback'))
+        yield SimpleNamespace(text=' e clareza", "feedback": "Estude asyncio"}')
+
+    mock_genai_client.models.generate_content_stream.side_effect = stream
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    result = lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+
+    assert result["status"] == "COMPLETED"
+    mock_genai_client.models.generate_content.assert_not_called()
+    assert observed[0]["summary"] == "Boa comunicação"
+    assert metrics.get("PartialFeedbackWrites") >= 1
+
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['ai_feedback'] == {"technical_score": 85, "summary": "Boa comunicação e clareza",
+                                   "feedback": "Estude asyncio"}
+    assert 'partial_feedback' not in item
+
+
+# --- Prazo da invocação (RESUMABLE) ---
+
+class FakeLambdaContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def test_process_audio_near_deadline_saves_progress_and_resumes(s3_client, dynamodb_resource, mock_genai_client):
+    """
+    Cenário: Sobram 12 s na Lambda (5 s de reserva): o upload cabe, o generate não.
+    Verifica: Sessão RESUMABLE com o arquivo do Gemini salvo; a próxima tentativa não sobe o áudio de novo.
+    """
+    metrics.reset()
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}
+
+    with pytest.raises(Exception) as raised:
+        lambda_handler(event, FakeLambdaContext(12_000), resources=resources)
+
+    assert type(raised.value).__name__ == "DeadlineExceeded"  # ErrorEquals da Step Function
+    mock_genai_client.models.generate_content.assert_not_called()
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['status'] == "RESUMABLE"
+    assert item['resume']['files'] == {"full:10": "files/123"}
+    assert 'lease_until' not in item
+    assert metrics.get("DeadlineExceeded", stage="generate") == 1
+
+    result = lambda_handler(event, FakeLambdaContext(60_000), resources=resources)
+
+    assert result["status"] == "COMPLETED"
+    mock_genai_client.files.upload.assert_called_once()
+    mock_genai_client.files.get.assert_called_with(name="files/123")
+    config = mock_genai_client.models.generate_content.call_args[1]["config"]
+    assert 0 < config.http_options.timeout <= 55_000
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['status'] == "COMPLETED"
+    assert 'resume' not in item
+
+
+def test_process_audio_resume_uploads_again_when_saved_file_expired(s3_client, dynamodb_resource, mock_genai_client):
+    """Arquivo salvo não existe mais na Files API (404): novo upload, sem falhar a sessão."""
+    from google.genai import errors
+
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "RESUMABLE",
+                         "resume": {"files": {"full:10": "files/expirado"}, "results": {}}})
+    active_file = mock_genai_client.files.get.return_value
+    mock_genai_client.files.get.side_effect = [
+        errors.ClientError(404, {"error": {"message": "not found", "status": "NOT_FOUND"}}), active_file
+    ]
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    result = lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+
+    assert result["status"] == "COMPLETED"
+    mock_genai_client.files.upload.assert_called_once()
+
+
+# --- Análise segmentada (gravações longas) ---
+
+def test_process_audio_long_recording_is_analyzed_in_segments(s3_client, dynamodb_resource, cache_table, mock_genai_client, monkeypatch):
+    """
+    Cenário: Gravação acima do limite de segmentação (limites reduzidos para o teste).
+    Verifica: Um generate_content por trecho, cada um com a posição do trecho, e um único resultado consolidado.
+    """
+    from tests.unit.test_audio_screen import make_wav
+    monkeypatch.setenv("SEGMENT_MIN_DURATION_S", "6")
+    monkeypatch.setenv("SEGMENT_TARGET_S", "4")
+    metrics.reset()
+
+    wav_key = f"uploads/{SESSION_ID}/audio.wav"
+    s3_client.put_object(
+        Bucket=BUCKET_NAME, Key=wav_key, ContentType="audio/wav",
+        Body=make_wav([(3.5, 0.5), (1.0, 0.0), (3.5, 0.5), (1.0, 0.0), (3.5, 0.5)])
+    )
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    result = lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": wav_key}, {}, resources=resources)
+
+    assert result["status"] == "COMPLETED"
+    assert result["ingest_path"] == "segmented"
+    assert result["segments"] == 3
+    assert mock_genai_client.files.upload.call_count == 3
+    assert mock_genai_client.models.generate_content.call_count == 3
+
+    turns = sorted(c[1]["contents"][1] for c in mock_genai_client.models.generate_content.call_args_list)
+    assert all("Vaga Python" in turn for turn in turns)
+    assert "trecho 1 de 3" in turns[0] and "trecho 3 de 3" in turns[2]
+    assert metrics.get("AnalysisSegments") == 3
+
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['status'] == "COMPLETED"
+    assert item['ai_feedback']['technical_score'] == 85
+    assert item['ai_feedback']['segments'] == 3
+
+
+def test_process_audio_segments_fetch_only_their_bytes(s3_client, dynamodb_resource, cache_table, mock_genai_client, monkeypatch):
+    """
+    Cenário: Gravação segmentada com partes de S3 maiores que cada trecho.
+    Verifica: O stream de cada trecho busca no S3 só os bytes do próprio trecho (sem prefetch duplicado).
+    """
+    from tests.unit.test_audio_screen import make_wav
+    import handlers.process_audio as process_audio
+    monkeypatch.setenv("SEGMENT_MIN_DURATION_S", "6")
+    monkeypatch.setenv("SEGMENT_TARGET_S", "4")
+
+    fetched = []
+
+    class CountingStream(process_audio.S3ObjectStream):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.fetched = 0
+            if kwargs.get("window"):
+                fetched.append(self)
+
+        def _fetch(self, index):
+            data = super()._fetch(index)
+            self.fetched += len(data)
+            return data
+
+    monkeypatch.setattr(process_audio, "S3ObjectStream", CountingStream)
+
+    def fake_upload(file, config):
+        # Consome o trecho como o SDK faz
+        while file.read(64 * 1024):
+            pass
+        return mock_genai_client.files.get.return_value
+    mock_genai_client.files.upload.side_effect = fake_upload
+
+    wav_key = f"uploads/{SESSION_ID}/audio.wav"
+    audio = make_wav([(3.5, 0.5), (1.0, 0.0), (3.5, 0.5), (1.0, 0.0), (3.5, 0.5)])
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=wav_key, ContentType="audio/wav", Body=audio)
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    result = lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": wav_key}, {}, resources=resources)
+
+    assert result["segments"] == 3
+    assert len(fetched) == 3
+    for stream in fetched:
+        assert stream.fetched == stream._window_end - stream._window_start
+    # Trechos não se sobrepõem: juntos leem no máximo o objeto uma vez
+    assert sum(stream.fetched for stream in fetched) <= len(audio)
+
+
+def test_process_audio_routes_short_clip_to_fast_model(s3_client, dynamodb_resource, mock_genai_client):
+    """Clipe curto com duração conhecida: rota fast sem count_tokens; escolha e latências gravadas na sessão."""
+    from tests.unit.test_audio_screen import make_wav
+    metrics.reset()
+
+    wav_key = f"uploads/{SESSION_ID}/audio.wav"
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=wav_key, ContentType="audio/wav",
+                         Body=make_wav([(3.0, 0.5)]))
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    result = lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": wav_key}, {}, resources=resources)
+
+    assert result["model"] == "gemini-2.5-flash-lite"
+    assert mock_genai_client.models.generate_content.call_args[1]["model"] == "gemini-2.5-flash-lite"
+    mock_genai_client.models.count_tokens.assert_not_called()
+    assert metrics.get("ModelRouted", route="fast") == 1
+
+    routing = table.get_item(Key={'session_id': SESSION_ID})['Item']['model_routing']
+    assert routing["route"] == "fast"
+    assert routing["token_source"] == "duration"
+    assert 2.5 <= routing["duration_s"] <= 3.0
+    assert "decision_ms" in routing and "generate_ms" in routing
+
+
+def test_process_audio_unknown_format_is_rerouted_by_count_tokens(s3_client, dynamodb_resource, mock_genai_client, monkeypatch):
+    """Formato sem duração: estimativa por bytes cabe na rota fast, mas o count_tokens (320) manda para a standard."""
+    monkeypatch.setenv("MODEL_ROUTES", json.dumps([
+        {"name": "fast", "model": "modelo-rapido", "max_tokens": 100},
+        {"name": "standard", "model": "modelo-padrao"},
+    ]))
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    result = lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+
+    assert result["model"] == "modelo-padrao"
+    assert mock_genai_client.models.count_tokens.call_args[1]["model"] == "modelo-rapido"
+    assert mock_genai_client.models.generate_content.call_args[1]["model"] == "modelo-padrao"
+
+    routing = table.get_item(Key={'session_id': SESSION_ID})['Item']['model_routing']
+    assert routing["route"] == "standard"
+    assert routing["tokens"] == 320
+    assert routing["token_source"] == "count_tokens"
+
+
+def test_process_audio_retry_only_redoes_unfinished_segments(s3_client, dynamodb_resource, mock_genai_client, monkeypatch):
+    """
+    Cenário: Um dos 3 trechos falha; os outros terminam.
+    Verifica: Trechos prontos e arquivos enviados ficam em `resume`; a retentativa só gera o trecho que faltou.
+    """
+    from tests.unit.test_audio_screen import make_wav
+    monkeypatch.setenv("SEGMENT_MIN_DURATION_S", "6")
+    monkeypatch.setenv("SEGMENT_TARGET_S", "4")
+
+    wav_key = f"uploads/{SESSION_ID}/audio.wav"
+    s3_client.put_object(
+        Bucket=BUCKET_NAME, Key=wav_key, ContentType="audio/wav",
+        Body=make_wav([(3.5, 0.5), (1.0, 0.0), (3.5, 0.5), (1.0, 0.0), (3.5, 0.5)])
+    )
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD", "job_description": "Vaga Python"})
+    ok_response = mock_genai_client.models.generate_content.return_value
+
+    def generate(**kwargs):
+        if "trecho 2 de 3" in kwargs["contents"][1]:
+            raise Exception("falha no trecho 2")
+        return ok_response
+
+    mock_genai_client.models.generate_content.side_effect = generate
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": wav_key}
+
+    with pytest.raises(Exception):
+        lambda_handler(event, {}, resources=resources)
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['status'] == "RETRY_PENDING"
+    assert len(item['resume']['results']) == 2
+    assert len(item['resume']['files']) == 3
+
+    mock_genai_client.models.generate_content.side_effect = None
+    mock_genai_client.models.generate_content.reset_mock()
+    result = lambda_handler(event, {}, resources=resources)
+
+    assert result["status"] == "COMPLETED"
+    assert mock_genai_client.models.generate_content.call_count == 1
+    assert "trecho 2 de 3" in mock_genai_client.models.generate_content.call_args[1]["contents"][1]
+    assert mock_genai_client.files.upload.call_count == 3
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['ai_feedback']['segments'] == 3
+    assert 'resume' not in item
+
+
+def test_process_audio_segment_with_invalid_response_fails_whole_analysis(s3_client, dynamodb_resource, mock_genai_client, monkeypatch):
+    """Um trecho fora do formato invalida o resultado (ERROR), sem exceção nem retry."""
+    from tests.unit.test_audio_screen import make_wav
+    monkeypatch.setenv("SEGMENT_MIN_DURATION_S", "6")
+    monkeypatch.setenv("SEGMENT_TARGET_S", "4")
+
+    good = mock_genai_client.models.generate_content.return_value
+    bad = MagicMock(parsed=None, text="desculpe, não consegui")
+    mock_genai_client.models.generate_content.return_value = None
+    mock_genai_client.models.generate_content.side_effect = [good, bad, good]
+
+    wav_key = f"uploads/{SESSION_ID}/audio.wav"
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=wav_key, Body=make_wav([(12.0, 0.5)]))
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD"})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": wav_key}, {}, resources=resources)
+
+    item = table.get_item(Key={'session_id': SESSION_ID})['Item']
+    assert item['status'] == "ERROR"
+    assert item['error_message'] == "RESPOSTA_INVALIDA"
+
+
+# --- Fila deferred (jobs de lote) ---
+
+def _seed_deferred(s3_client, dynamodb_resource, mock_genai_client, session_ids):
+    """Cria sessões deferred e passa cada uma pelo process_audio (que só enfileira)."""
+    table = dynamodb_resource.Table(TABLE_NAME)
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    for sid in session_ids:
+        key = f"uploads/{sid}/audio.mp3"
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=f"audio-{sid}".encode())
+        table.put_item(Item={"session_id": sid, "status": "PENDING_UPLOAD",
+                             "analysis_mode": "deferred", "job_description": f"Vaga {sid}"})
+        result = lambda_handler({"session_id": sid, "bucket": BUCKET_NAME, "key": key}, {}, resources=resources)
+        assert result == {"status": "QUEUED", "session_id": sid}
+    return table, resources
+
+
+def test_process_audio_deferred_session_is_queued_without_gemini(s3_client, dynamodb_resource, mock_genai_client):
+    """Sessão deferred: o worker só valida/enfileira; nenhuma chamada ao modelo."""
+    table, _ = _seed_deferred(s3_client, dynamodb_resource, mock_genai_client, ["d-1"])
+
+    mock_genai_client.files.upload.assert_not_called()
+    mock_genai_client.models.generate_content.assert_not_called()
+    item = table.get_item(Key={'session_id': "d-1"})['Item']
+    assert item['status'] == "QUEUED"
+    assert item['batch_state'] == "QUEUED"
+    assert item['audio_location'] == {"bucket": BUCKET_NAME, "key": "uploads/d-1/audio.mp3", "mime_type": "audio/mpeg"}
+    assert 'lease_until' not in item
+
+
+def test_deferred_handler_submits_polls_once_and_fans_out(s3_client, dynamodb_resource, mock_genai_client, monkeypatch):
+    """
+    Cenário: 3 sessões na fila e backend fake que conclui na 2ª consulta.
+    Verifica: 1 job com as 3 requisições, uma consulta por execução e resultados gravados em cada sessão.
+    """
+    from core.batch_backend import FakeBatchBackend
+    monkeypatch.setenv("DEFERRED_BATCH_MIN_SIZE", "1")
+    table, resources = _seed_deferred(s3_client, dynamodb_resource, mock_genai_client, ["d-1", "d-2", "d-3"])
+    backend = FakeBatchBackend(polls_until_done=1)
+
+    first = deferred_handler({}, {}, resources=resources, backend=backend)
+    job_name = first["submitted_job"]
+    assert job_name and len(backend.jobs[job_name]["requests"]) == 3
+    assert mock_genai_client.files.upload.call_count == 3
+    turns = sorted(r.contents[1] for r in backend.jobs[job_name]["requests"])
+    assert ["Vaga d-1" in turns[0], "Vaga d-2" in turns[1], "Vaga d-3" in turns[2]] == [True] * 3
+    assert table.get_item(Key={'session_id': "d-2"})['Item']['batch_state'] == "SUBMITTED"
+
+    second = deferred_handler({}, {}, resources=resources, backend=backend)
+    assert second["pending_jobs"] == 1 and second["submitted_job"] is None
+
+    third = deferred_handler({}, {}, resources=resources, backend=backend)
+    assert third["completed"] == 3
+    assert backend.jobs[job_name]["polls"] == 2
+
+    mock_genai_client.models.generate_content.assert_not_called()
+    for sid in ("d-1", "d-2", "d-3"):
+        item = table.get_item(Key={'session_id': sid})['Item']
+        assert item['status'] == "COMPLETED"
+        assert item['ai_feedback']['technical_score'] == 70
+        assert 'batch_state' not in item and 'batch_job' not in item
+
+
+def test_deferred_handler_accumulates_until_min_size_or_max_wait(s3_client, dynamodb_resource, mock_genai_client, monkeypatch):
+    from core.batch_backend import FakeBatchBackend
+    monkeypatch.setenv("DEFERRED_BATCH_MIN_SIZE", "5")
+    _, resources = _seed_deferred(s3_client, dynamodb_resource, mock_genai_client, ["d-1", "d-2"])
+    backend = FakeBatchBackend()
+
+    assert deferred_handler({}, {}, resources=resources, backend=backend)["submitted_job"] is None
+    assert backend.jobs == {}
+
+    monkeypatch.setenv("DEFERRED_MAX_WAIT_SECONDS", "0")
+    assert deferred_handler({}, {}, resources=resources, backend=backend)["submitted_job"] is not None
+
+
+def test_deferred_handler_requeues_failed_items_then_gives_up(s3_client, dynamodb_resource, mock_genai_client, monkeypatch):
+    """Item com erro no lote volta para a fila; após DEFERRED_MAX_ATTEMPTS vira ERROR."""
+    from core.batch_backend import FakeBatchBackend
+    monkeypatch.setenv("DEFERRED_BATCH_MIN_SIZE", "1")
+    monkeypatch.setenv("DEFERRED_MAX_ATTEMPTS", "2")
+    table, resources = _seed_deferred(s3_client, dynamodb_resource, mock_genai_client, ["d-1"])
+
+    def responder(request):
+        raise RuntimeError("quota")
+    backend = FakeBatchBackend(responder=responder)
+
+    deferred_handler({}, {}, resources=resources, backend=backend)   # envia
+    summary = deferred_handler({}, {}, resources=resources, backend=backend)  # falha -> fila -> reenvia
+    assert summary["requeued"] == 1 and summary["submitted_job"] is not None
+    assert table.get_item(Key={'session_id': "d-1"})['Item']['batch_attempts'] == 1
+
+    deferred_handler({}, {}, resources=resources, backend=backend)   # 2ª falha -> ERROR
+    item = table.get_item(Key={'session_id': "d-1"})['Item']
+    assert item['status'] == "ERROR"
+    assert item['error_message'] == "quota"
+    assert 'batch_state' not in item
+
+
+def test_deferred_results_are_cached_under_the_batch_model(s3_client, dynamodb_resource, cache_table, mock_genai_client, monkeypatch):
+    """
+    Cenário: Sessão deferred concluída pelo lote (sempre MODEL_NAME) e depois a mesma gravação + vaga em realtime.
+    Verifica: O resultado fica na chave do modelo do lote; o realtime (modelo do roteador) não reaproveita.
+    """
+    from core.analysis_cache import build_cache_key
+    from core.batch_backend import FakeBatchBackend
+    from core.prompts import PROMPT_VERSION
+    from handlers.process_audio import MODEL_NAME
+    monkeypatch.setenv("DEFERRED_BATCH_MIN_SIZE", "1")
+    table, resources = _seed_deferred(s3_client, dynamodb_resource, mock_genai_client, ["d-1"])
+    backend = FakeBatchBackend()
+    deferred_handler({}, {}, resources=resources, backend=backend)
+    assert deferred_handler({}, {}, resources=resources, backend=backend)["completed"] == 1
+
+    etag = s3_client.head_object(Bucket=BUCKET_NAME, Key="uploads/d-1/audio.mp3")["ETag"].strip('"')
+    cached = cache_table.get_item(
+        Key={"cache_key": build_cache_key(f"md5:{etag}", "Vaga d-1", PROMPT_VERSION, MODEL_NAME)}
+    )["Item"]
+    assert cached["model"] == MODEL_NAME
+
+    table.put_item(Item={"session_id": "r-1", "status": "PENDING_UPLOAD", "job_description": "Vaga d-1"})
+    result = lambda_handler({"session_id": "r-1", "bucket": BUCKET_NAME, "key": "uploads/d-1/audio.mp3"},
+                            {}, resources=resources)
+    assert result["status"] == "COMPLETED" and "cache" not in result
+    mock_genai_client.models.generate_content.assert_called_once()
+
+
+# --- Rate limiter compartilhado ---
+
+def test_process_audio_defers_when_gemini_quota_is_exhausted(s3_client, dynamodb_resource, control_table, mock_genai_client, monkeypatch):
+    """
+    Cenário: Cota de 1 requisição/min (upload + geração consomem 2) e espera máxima 0.
+    Verifica: Nada de chamada sem cota; RateLimitExceeded e sessão devolvida para RETRY_PENDING.
+    """
+    from core.rate_limiter import RateLimitExceeded
+    monkeypatch.setenv("GEMINI_RPM", "1")
+    monkeypatch.setenv("RATE_LIMIT_MAX_WAIT_SECONDS", "0")
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD"})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    with pytest.raises(RateLimitExceeded):
+        lambda_handler({"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}, {}, resources=resources)
+
+    mock_genai_client.files.upload.assert_called_once()
+    mock_genai_client.models.generate_content.assert_not_called()
+    assert table.get_item(Key={'session_id': SESSION_ID})['Item']['status'] == "RETRY_PENDING"
+    assert control_table.get_item(Key={"control_key": "rate#gemini"})["Item"]["requests"] < 1
+
+
+# --- Circuit breaker ---
+
+def test_process_audio_open_breaker_defers_without_touching_audio(s3_client, dynamodb_resource, control_table, mock_genai_client, monkeypatch):
+    """
+    Cenário: Circuito do Gemini aberto (outro worker registrou a indisponibilidade).
+    Verifica: Falha rápida com CircuitOpenError, sessão DEFERRED, sem upload; fechado o circuito, o retry conclui.
+    """
+    from core.circuit_breaker import CircuitOpenError
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=S3_KEY, Body=b"fake_audio")
+    table = dynamodb_resource.Table(TABLE_NAME)
+    table.put_item(Item={"session_id": SESSION_ID, "status": "PENDING_UPLOAD"})
+    control_table.put_item(Item={"control_key": "breaker#gemini", "state": "OPEN", "failures": 0,
+                                 "opened_until": 4102444800})
+
+    resources = (s3_client, dynamodb_resource, mock_genai_client)
+    event = {"session_id": SESSION_ID, "bucket": BUCKET_NAME, "key": S3_KEY}
+    with pytest.raises(CircuitOpenError):
+        lambda_handler(event, {}, resources=resources)
+
+    mock_genai_client.files.upload.assert_not_called()
+    mock_genai_client.models.generate_content.assert_not_called()
+    assert table.get_item(Key={'session_id': SESSION_ID})['Item']['status'] == "DEFERRED"
+
+    control_table.delete_item(Key={"control_key": "breaker#gemini"})
+    assert lambda_handler(event, {}, resources=resources)["status"] == "COMPLETED"
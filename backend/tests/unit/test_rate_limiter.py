@@ -0,0 +1,102 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from core import metrics
+from core.gemini import GeminiGateway
+from core.rate_limiter import RateLimitExceeded, TokenBucketLimiter, get_rate_limiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Relógio controlado (time.time) para a reposição do balde."""
+    now = {"t": 1_700_000_000.0}
+    monkeypatch.setattr("core.rate_limiter.time.time", lambda: now["t"])
+    return now
+
+
+def test_full_bucket_then_wait_estimate(control_table, clock):
+    limiter = TokenBucketLimiter(control_table, rpm=2, tpm=1000)
+
+    assert limiter.try_acquire() == 0.0
+    clock["t"] += 0.001
+    assert limiter.try_acquire() == 0.0
+    clock["t"] += 0.001
+    # Sem requisições no balde: 1 requisição a cada 30 s (2/min)
+    assert limiter.try_acquire() == pytest.approx(30.0, abs=0.1)
+
+
+def test_tokens_per_minute_limit_and_refill(control_table, clock):
+    limiter = TokenBucketLimiter(control_table, rpm=100, tpm=1200)
+
+    assert limiter.try_acquire(tokens=1000) == 0.0
+    clock["t"] += 0.001
+    assert limiter.try_acquire(tokens=1000) == pytest.approx(40.0, abs=0.1)  # faltam 800 a 20/s
+
+    clock["t"] += 40
+    assert limiter.try_acquire(tokens=1000) == 0.0
+
+
+def test_workers_share_the_same_bucket(control_table, clock):
+    """Dois workers (instâncias diferentes) consomem do mesmo item."""
+    worker_a = TokenBucketLimiter(control_table, rpm=3, tpm=1000)
+    worker_b = TokenBucketLimiter(control_table, rpm=3, tpm=1000)
+
+    results = []
+    for worker in (worker_a, worker_b, worker_a, worker_b):
+        results.append(worker.try_acquire())
+        clock["t"] += 0.001
+    assert results[:3] == [0.0, 0.0, 0.0]
+    assert results[3] > 0
+
+
+def test_stale_write_is_rejected(control_table, clock):
+    """Lock otimista: gravação baseada em leitura antiga não sobrescreve o saldo."""
+    limiter = TokenBucketLimiter(control_table, rpm=10, tpm=1000)
+    limiter.try_acquire()
+    previous, _, _ = limiter._load()
+    clock["t"] += 1
+    limiter.try_acquire()
+
+    assert limiter._store(previous, 10, 1000, previous + 5) is False
+
+
+def test_acquire_waits_and_records_metric(control_table):
+    metrics.reset()
+    limiter = TokenBucketLimiter(control_table, rpm=1200, tpm=10**6, max_wait_seconds=5)
+    limiter.drain()
+
+    waited = asyncio.run(limiter.acquire(operation="generate"))
+
+    assert 0 < waited < 1
+    assert metrics.get("RateLimitWaitMs", operation="generate") > 0
+
+
+def test_acquire_defers_when_wait_exceeds_budget(control_table):
+    metrics.reset()
+    limiter = TokenBucketLimiter(control_table, rpm=1, tpm=10**6, max_wait_seconds=1)
+    limiter.drain()
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.acquire(operation="upload"))
+    assert metrics.get("RateLimitDeferred", operation="upload") == 1
+
+
+def test_limiter_disabled_without_control_table(dynamodb_resource, monkeypatch):
+    monkeypatch.delenv("CONTROL_TABLE_NAME", raising=False)
+    assert get_rate_limiter(dynamodb_resource) is None
+
+
+def test_gateway_429_drains_bucket_and_defers(control_table):
+    class QuotaError(Exception):
+        code = 429
+
+    client = MagicMock()
+    client.models.generate_content.side_effect = QuotaError("RESOURCE_EXHAUSTED")
+    limiter = TokenBucketLimiter(control_table, rpm=100, tpm=10**6)
+    gateway = GeminiGateway(client, limiter=limiter)
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(gateway.generate(model="m", contents=[], config=None, tokens=10))
+    item = control_table.get_item(Key={"control_key": "rate#gemini"})["Item"]
+    assert item["requests"] == 0
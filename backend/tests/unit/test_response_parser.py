@@ -0,0 +1,65 @@
+import pytest
+from unittest.mock import MagicMock
+from core import metrics
+from core.response_parser import ANALYSIS_SCHEMA, extract_json, generation_config, parse_analysis, partial_fields
+
+@pytest.mark.parametrize("text, outcome", [
+    ('{"technical_score": 80, "summary": "a", "feedback": "b"}', "clean"),
+    ('```json\n{"technical_score": 80, "summary": "a", "feedback": "b"}\n```', "extracted"),
+    ('Claro! Segue a análise:\n{"technical_score": 80, "summary": "usa {chaves}", "feedback": "b"} Abraços', "extracted"),
+    ('{"technical_score": 80, "summary": “a”, "feedback": "b",}', "repaired"),
+])
+def test_extract_json_tolerates_formatting_drift(text, outcome):
+    data, result = extract_json(text)
+
+    assert result == outcome
+    assert data["technical_score"] == 80
+
+@pytest.mark.parametrize("text", ["", "   ", "sem json aqui", '{"technical_score": 80, "summary": '])
+def test_extract_json_failures(text):
+    assert extract_json(text) == (None, "failed")
+
+def test_parse_prefers_schema_parsed_output():
+    metrics.reset()
+    response = MagicMock()
+    response.parsed = {"technical_score": 101.6, "summary": "ok", "feedback": None}
+
+    data, outcome = parse_analysis(response)
+
+    assert outcome == "schema"
+    assert data == {"technical_score": 100, "summary": "ok", "feedback": ""}
+    assert metrics.get("AnalysisParse", outcome="schema") == 1
+
+def test_parse_keeps_model_error():
+    response = MagicMock()
+    response.parsed = None
+    response.text = '{"error": "AUDIO_INAUDIVEL"}'
+
+    assert parse_analysis(response) == ({"error": "AUDIO_INAUDIVEL"}, "clean")
+
+def test_parse_invalid_response_becomes_error_without_raising():
+    response = MagicMock()
+    response.parsed = None
+    response.text = '{"resposta": "não segui o formato"}'
+
+    data, outcome = parse_analysis(response)
+
+    assert outcome == "failed"
+    assert data == {"error": "RESPOSTA_INVALIDA"}
+
+def test_generation_config_uses_schema():
+    config = generation_config(system_instruction="x")
+
+    assert config.response_mime_type == "application/json"
+    assert config.response_schema == ANALYSIS_SCHEMA
+    assert config.system_instruction == "x"
+
+@pytest.mark.parametrize("text,expected", [
+    ('{"technical_score": 80, "summ', {}),
+    ('{"technical_score": 80, "summary": "Boa comunica', {"summary": "Boa comunica"}),
+    ('{"technical_score": 80, "summary": "Usou \\"async\\" e', {"summary": 'Usou "async" e'}),
+    ('{"technical_score": 80, "summary": "ok", "feedback": "Estude \\u00e', {"summary": "ok", "feedback": "Estude "}),
+    ('{"summary": "cita \\"feedback\\": \\"x\\"", "feedback": "real', {"summary": 'cita "feedback": "x"', "feedback": "real"}),
+])
+def test_partial_fields_reads_strings_cut_mid_stream(text, expected):
+    assert partial_fields(text) == expected
@@ -0,0 +1,99 @@
+import os
+import pytest
+from core.s3_stream import S3ObjectStream, guess_mime_type
+
+BUCKET_NAME = "mock-interview-tests-bucket"
+KEY = "uploads/stream-1/audio.mp3"
+
+
+def _put(s3_client, data, content_type=None):
+    extra = {"ContentType": content_type} if content_type else {}
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=KEY, Body=data, **extra)
+
+
+def test_stream_reads_whole_object_in_parts(s3_client):
+    """Leitura sequencial em chunks (como o SDK faz) devolve o objeto inteiro."""
+    data = os.urandom(10_000)
+    _put(s3_client, data)
+
+    stream = S3ObjectStream(s3_client, BUCKET_NAME, KEY, part_size=1024, max_concurrency=3)
+
+    # O SDK mede o tamanho com seek/tell antes do upload
+    offset = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    assert stream.tell() - offset == len(data)
+    stream.seek(offset)
+
+    chunks = []
+    while True:
+        chunk = stream.read(3000)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    stream.close()
+
+    assert b"".join(chunks) == data
+
+
+def test_stream_memory_is_bounded_by_window(s3_client):
+    """Nunca mantém mais partes em memória do que a janela de prefetch."""
+    _put(s3_client, os.urandom(20_000))
+    stream = S3ObjectStream(s3_client, BUCKET_NAME, KEY, part_size=1000, max_concurrency=2)
+
+    while stream.read(700):
+        assert len(stream._parts) <= 2
+    stream.close()
+
+
+def test_stream_seek_backwards_and_sequential_mode(s3_client):
+    data = bytes(range(256)) * 20
+    _put(s3_client, data)
+    stream = S3ObjectStream(s3_client, BUCKET_NAME, KEY, part_size=512, max_concurrency=1)
+
+    assert stream.read(100) == data[:100]
+    stream.seek(4000)
+    assert stream.read(50) == data[4000:4050]
+    stream.seek(10)
+    assert stream.read() == data[10:]
+    assert stream.read(10) == b""
+
+
+def test_stream_window_fetches_only_its_range(s3_client):
+    """Com window: GETs alinhados ao início da faixa, sem prefetch além do fim."""
+    data = os.urandom(20_000)
+    _put(s3_client, data)
+    ranges = []
+    original_get = s3_client.get_object
+
+    def get_object(**kwargs):
+        ranges.append(kwargs["Range"])
+        return original_get(**kwargs)
+
+    s3_client.get_object = get_object
+    stream = S3ObjectStream(s3_client, BUCKET_NAME, KEY, part_size=4000, max_concurrency=4,
+                            window=(5_500, 9_000))
+
+    stream.seek(5_500)
+    assert stream.read() == data[5_500:9_000]
+    assert stream.read(10) == b""
+    stream.close()
+
+    # Faixa menor que part_size: um único GET, exatamente com os bytes do trecho
+    assert ranges == ["bytes=5500-8999"]
+
+
+def test_stream_missing_object_fails_on_open(s3_client):
+    with pytest.raises(Exception) as excinfo:
+        S3ObjectStream(s3_client, BUCKET_NAME, "uploads/nao-existe/audio.mp3")
+    assert "404" in str(excinfo.value)
+
+
+def test_guess_mime_type(s3_client):
+    _put(s3_client, b"abc")
+    stream = S3ObjectStream(s3_client, BUCKET_NAME, KEY)
+    # moto devolve binary/octet-stream quando não há ContentType -> usa a extensão
+    assert guess_mime_type(stream, KEY) == "audio/mpeg"
+
+    _put(s3_client, b"abc", content_type="audio/wav")
+    stream = S3ObjectStream(s3_client, BUCKET_NAME, KEY)
+    assert guess_mime_type(stream, KEY) == "audio/wav"
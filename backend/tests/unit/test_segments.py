@@ -0,0 +1,87 @@
+import io
+import wave
+
+import pytest
+from core.audio_screen import prescreen, profile_audio
+from core.s3_stream import ByteRangeView
+from core.segments import merge_analyses, plan_segments
+from tests.unit.test_audio_screen import _Stream, make_wav
+
+
+@pytest.fixture(autouse=True)
+def small_segments(monkeypatch):
+    """Limites em segundos para caber em áudios sintéticos curtos."""
+    monkeypatch.setenv("SEGMENT_MIN_DURATION_S", "6")
+    monkeypatch.setenv("SEGMENT_TARGET_S", "4")
+    monkeypatch.setenv("SEGMENT_SEARCH_S", "1.5")
+
+
+def test_short_audio_is_a_single_segment():
+    profile = profile_audio(_Stream(make_wav([(3.0, 0.5)])))
+
+    assert plan_segments(profile) == [(0, profile.frame_count)]
+
+
+def test_cuts_land_on_pauses():
+    """Fala de 3,5 s com pausas de 1 s: os cortes caem dentro das pausas, não na fala."""
+    data = make_wav([(3.5, 0.5), (1.0, 0.0), (3.5, 0.5), (1.0, 0.0), (3.5, 0.5)])
+    profile = profile_audio(_Stream(data))
+
+    segments = plan_segments(profile)
+
+    assert len(segments) == 3
+    assert segments[0][0] == 0 and segments[-1][1] == profile.frame_count
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert end == start
+        cut_s = end * profile.frame_s
+        assert 3.5 <= cut_s <= 4.5 or 8.0 <= cut_s <= 9.0
+
+
+def test_continuous_speech_is_cut_at_ideal_point():
+    profile = profile_audio(_Stream(make_wav([(12.0, 0.5)])))
+
+    segments = plan_segments(profile)
+
+    assert len(segments) == 3
+    lengths = [(end - start) * profile.frame_s for start, end in segments]
+    assert lengths == pytest.approx([4.0, 4.0, 4.0], abs=0.05)
+
+
+def test_max_segments_caps_the_split(monkeypatch):
+    monkeypatch.setenv("SEGMENT_MAX_SEGMENTS", "2")
+    profile = profile_audio(_Stream(make_wav([(12.0, 0.5)])))
+
+    assert len(plan_segments(profile)) == 2
+
+
+def test_segment_byte_ranges_are_valid_wav_files():
+    data = make_wav([(0.2, 0.0), (3.5, 0.5), (1.0, 0.0), (3.5, 0.5), (0.2, 0.0)])
+    stream = _Stream(data)
+    screen = prescreen(stream)
+
+    segments = plan_segments(screen.profile, *screen.frames)
+
+    assert len(segments) == 2
+    total = 0.0
+    for first, last in segments:
+        view = ByteRangeView(stream, *screen.profile.byte_range(first, last))
+        with wave.open(io.BytesIO(view.read()), "rb") as wav_file:
+            total += wav_file.getnframes() / wav_file.getframerate()
+    assert total == pytest.approx((screen.frames[1] - screen.frames[0]) * screen.profile.frame_s, abs=0.01)
+
+
+def test_merge_weights_score_by_duration_and_skips_errors():
+    merged = merge_analyses([
+        ({"technical_score": 90, "summary": "Domina Python.", "feedback": "Bom uso de async."}, 0.0, 90.0),
+        ({"error": "AUDIO_INAUDIVEL"}, 90.0, 100.0),
+        ({"technical_score": 60, "summary": "Pouco sobre AWS.", "feedback": "Aprofundar IAM."}, 100.0, 130.0),
+    ])
+
+    assert merged["technical_score"] == 82  # (90*90 + 60*30) / 120
+    assert merged["summary"] == "Domina Python. Pouco sobre AWS."
+    assert merged["feedback"] == "[00:00-01:30] Bom uso de async.\n[01:40-02:10] Aprofundar IAM."
+    assert merged["segments"] == 2
+
+
+def test_merge_all_errors_keeps_error():
+    assert merge_analyses([({"error": "AUDIO_INAUDIVEL"}, 0.0, 60.0)]) == {"error": "AUDIO_INAUDIVEL"}
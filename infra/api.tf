@@ -5,10 +5,12 @@ resource "aws_apigatewayv2_api" "main_api" {
 
   # Configuração de CORS (Vital para o Frontend funcionar)
   cors_configuration {
-    allow_headers = ["Content-Type", "Authorization", "X-Amz-Date", "X-Api-Key", "X-Amz-Security-Token"]
+    allow_headers = ["Content-Type", "Authorization", "X-Amz-Date", "X-Api-Key", "X-Amz-Security-Token", "If-None-Match"]
     allow_methods = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
     allow_origins = ["*"] # Em produção real, você trocaria "*" pela URL do CloudFront
-    max_age       = 300
+    # ETag do GET /sessions/{id}: o front reenvia em If-None-Match e recebe 304 sem mudança
+    expose_headers = ["ETag"]
+    max_age        = 300
   }
 }
 
@@ -47,6 +49,24 @@ resource "aws_apigatewayv2_route" "post_sessions" {
   authorizer_id      = aws_apigatewayv2_authorizer.cognito_auth.id
 }
 
+# Campanhas: várias sessões num POST (BatchWriteItem), mesma Lambda do POST /sessions
+resource "aws_apigatewayv2_route" "batch_create_sessions" {
+  api_id             = aws_apigatewayv2_api.main_api.id
+  route_key          = "POST /sessions/batch"
+  target             = "integrations/${aws_apigatewayv2_integration.upload_integration.id}"
+  authorization_type = "JWT"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito_auth.id
+}
+
+# Fecha o upload multipart (CompleteMultipartUpload) na mesma Lambda do POST /sessions
+resource "aws_apigatewayv2_route" "complete_upload" {
+  api_id             = aws_apigatewayv2_api.main_api.id
+  route_key          = "POST /sessions/{session_id}/complete-upload"
+  target             = "integrations/${aws_apigatewayv2_integration.upload_integration.id}"
+  authorization_type = "JWT"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito_auth.id
+}
+
 resource "aws_apigatewayv2_route" "get_session_by_id" {
   api_id             = aws_apigatewayv2_api.main_api.id
   route_key          = "GET /sessions/{session_id}"
@@ -55,6 +75,24 @@ resource "aws_apigatewayv2_route" "get_session_by_id" {
   authorizer_id      = aws_apigatewayv2_authorizer.cognito_auth.id
 }
 
+# Dashboard: várias sessões numa chamada (mesma Lambda do GET, BatchGetItem)
+resource "aws_apigatewayv2_route" "batch_get_sessions" {
+  api_id             = aws_apigatewayv2_api.main_api.id
+  route_key          = "POST /sessions/batch-get"
+  target             = "integrations/${aws_apigatewayv2_integration.session_integration.id}"
+  authorization_type = "JWT"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito_auth.id
+}
+
+# Histórico por candidato/pergunta (GSIs da tabela, paginado por cursor)
+resource "aws_apigatewayv2_route" "list_sessions" {
+  api_id             = aws_apigatewayv2_api.main_api.id
+  route_key          = "GET /sessions"
+  target             = "integrations/${aws_apigatewayv2_integration.session_integration.id}"
+  authorization_type = "JWT"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito_auth.id
+}
+
 # --- 5. Permissões (Dar chave da API para a Lambda) ---
 # A Lambda precisa saber que o API Gateway tem permissão de invocá-la
 
@@ -39,15 +39,39 @@ resource "aws_iam_role_policy" "lambda_policy" {
       # Permissão para Escrever/Ler no DynamoDB
       {
         Effect   = "Allow"
-        Action   = ["dynamodb:PutItem", "dynamodb:UpdateItem", "dynamodb:GetItem"]
+        Action   = ["dynamodb:PutItem", "dynamodb:UpdateItem", "dynamodb:GetItem", "dynamodb:BatchGetItem", "dynamodb:BatchWriteItem"]
         Resource = aws_dynamodb_table.sessions_table.arn
       },
+      # Consulta dos índices (fila deferred, histórico de sessões)
+      {
+        Effect   = "Allow"
+        Action   = "dynamodb:Query"
+        Resource = "${aws_dynamodb_table.sessions_table.arn}/index/*"
+      },
+      # Cache de análises (process_audio)
+      {
+        Effect   = "Allow"
+        Action   = ["dynamodb:PutItem", "dynamodb:GetItem"]
+        Resource = aws_dynamodb_table.analysis_cache_table.arn
+      },
+      # Rate limiter + circuit breaker compartilhados (escritas condicionais)
+      {
+        Effect   = "Allow"
+        Action   = ["dynamodb:PutItem", "dynamodb:GetItem", "dynamodb:UpdateItem"]
+        Resource = aws_dynamodb_table.control_table.arn
+      },
       # Permissão para Gerar URL de Upload no S3
       {
         Effect   = "Allow"
         Action   = ["s3:PutObject", "s3:GetObject"]
         Resource = "${aws_s3_bucket.media_bucket.arn}/*"
       },
+      # Consumo da fila de análises em lote
+      {
+        Effect   = "Allow"
+        Action   = ["sqs:ReceiveMessage", "sqs:DeleteMessage", "sqs:GetQueueAttributes"]
+        Resource = aws_sqs_queue.analysis_batch_queue.arn
+      },
       # [NOVO] Permissão para iniciar a Step Function
       {
         Effect   = "Allow"
@@ -69,12 +93,20 @@ resource "aws_lambda_function" "get_upload_url" {
 
   runtime = "python3.11"
   handler = "handlers.get_upload_url.lambda_handler" # Caminho: pasta.arquivo.funcao
-  timeout = 10                                       # Segundos
+  timeout = 30                                       # Segundos (lote de até 500 sessões)
 
   environment {
     variables = {
       BUCKET_NAME = aws_s3_bucket.media_bucket.id
       TABLE_NAME  = aws_dynamodb_table.sessions_table.name
+      # Multipart (file_size declarado acima do limite): partes de 8 MB, URLs por 1 h
+      MULTIPART_THRESHOLD_BYTES     = "16777216"
+      MULTIPART_PART_SIZE_BYTES     = "8388608"
+      MULTIPART_URL_EXPIRES_SECONDS = "3600"
+      MAX_UPLOAD_BYTES              = "2147483648"
+      # POST /sessions/batch: até 500 sessões; URLs valem 1 h (candidatos gravam depois)
+      BATCH_CREATE_MAX_ENTRIES         = "500"
+      BATCH_UPLOAD_URL_EXPIRES_SECONDS = "3600"
     }
   }
 }
@@ -94,12 +126,123 @@ resource "aws_lambda_function" "process_audio" {
 
   environment {
     variables = {
-      TABLE_NAME     = aws_dynamodb_table.sessions_table.name
-      GEMINI_API_KEY = var.gemini_api_key
+      TABLE_NAME         = aws_dynamodb_table.sessions_table.name
+      CACHE_TABLE_NAME   = aws_dynamodb_table.analysis_cache_table.name
+      CONTROL_TABLE_NAME = aws_dynamodb_table.control_table.name
+      GEMINI_API_KEY     = var.gemini_api_key
+      # Cota do Gemini compartilhada por todas as Lambdas (token bucket)
+      GEMINI_RPM                  = var.gemini_rpm
+      GEMINI_TPM                  = var.gemini_tpm
+      RATE_LIMIT_MAX_WAIT_SECONDS = "20"
+      # Circuit breaker compartilhado: abre após N falhas transitórias na janela
+      BREAKER_FAILURE_THRESHOLD = "5"
+      BREAKER_OPEN_SECONDS      = "60"
+      FILE_POLL_TIMEOUT_SECONDS = "30"
+      # Reserva antes do timeout para salvar o progresso (RESUMABLE)
+      DEADLINE_RESERVE_SECONDS = "5"
+      # Limite (bytes) do caminho inline; acima disso usa a Files API
+      INLINE_AUDIO_MAX_BYTES = "4194304"
+      # Gravações acima de SEGMENT_MIN_DURATION_S são analisadas em trechos paralelos
+      SEGMENT_MIN_DURATION_S = "240"
+      SEGMENT_TARGET_S       = "120"
+      # Tabela de rotas de modelo (JSON); vazio = padrão do core.model_router
+      MODEL_ROUTES = var.model_routes
+      # Geração em streaming: summary/feedback parciais na sessão, no máximo 1 escrita a cada 2 s
+      PARTIAL_FEEDBACK_INTERVAL_SECONDS = "2"
+    }
+  }
+}
+
+# --- 4.1 Processor em Lote (picos de processos seletivos) ---
+# Mesmo código do process_audio, entrada com várias sessões (Map da Step Function ou SQS).
+resource "aws_lambda_function" "process_audio_batch" {
+  function_name = "${var.project_name}-process-audio-batch-${var.environment}"
+  role          = aws_iam_role.lambda_role.arn
+
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+
+  runtime     = "python3.11"
+  handler     = "handlers.process_audio.batch_handler"
+  timeout     = 300 # Várias análises por invocação
+  memory_size = 1024
+
+  environment {
+    variables = {
+      TABLE_NAME         = aws_dynamodb_table.sessions_table.name
+      CACHE_TABLE_NAME   = aws_dynamodb_table.analysis_cache_table.name
+      CONTROL_TABLE_NAME = aws_dynamodb_table.control_table.name
+      GEMINI_API_KEY     = var.gemini_api_key
+      GEMINI_RPM         = var.gemini_rpm
+      GEMINI_TPM         = var.gemini_tpm
+      BATCH_CONCURRENCY  = "8"
     }
   }
 }
 
+# Fila de análises em lote (payload = {session_id, bucket, key})
+resource "aws_sqs_queue" "analysis_batch_queue" {
+  name                       = "${var.project_name}-analysis-batch-${var.environment}"
+  visibility_timeout_seconds = 1800 # 6x o timeout da Lambda (recomendação AWS)
+}
+
+resource "aws_lambda_event_source_mapping" "analysis_batch_trigger" {
+  event_source_arn                   = aws_sqs_queue.analysis_batch_queue.arn
+  function_name                      = aws_lambda_function.process_audio_batch.arn
+  batch_size                         = 10
+  maximum_batching_window_in_seconds = 5
+  # Só as mensagens que falharam voltam para a fila
+  function_response_types = ["ReportBatchItemFailures"]
+}
+
+# --- 4.2 Fila Deferred (Batch API do Gemini) ---
+# Sessões com analysis_mode = "deferred" acumulam e viram um job de lote.
+# Agendado: cada execução consulta os jobs enviados uma vez e envia um novo job.
+resource "aws_lambda_function" "deferred_analysis" {
+  function_name = "${var.project_name}-deferred-analysis-${var.environment}"
+  role          = aws_iam_role.lambda_role.arn
+
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+
+  runtime     = "python3.11"
+  handler     = "handlers.process_audio.deferred_handler"
+  timeout     = 300 # Uploads para a Files API de todo o lote
+  memory_size = 512
+
+  environment {
+    variables = {
+      TABLE_NAME                = aws_dynamodb_table.sessions_table.name
+      CACHE_TABLE_NAME          = aws_dynamodb_table.analysis_cache_table.name
+      CONTROL_TABLE_NAME        = aws_dynamodb_table.control_table.name
+      GEMINI_API_KEY            = var.gemini_api_key
+      GEMINI_RPM                = var.gemini_rpm
+      GEMINI_TPM                = var.gemini_tpm
+      DEFERRED_BATCH_MIN_SIZE   = "10"
+      DEFERRED_BATCH_MAX_SIZE   = "100"
+      DEFERRED_MAX_WAIT_SECONDS = "3600"
+    }
+  }
+}
+
+resource "aws_cloudwatch_event_rule" "deferred_analysis_schedule" {
+  name                = "${var.project_name}-deferred-analysis-${var.environment}"
+  schedule_expression = "rate(15 minutes)"
+}
+
+resource "aws_cloudwatch_event_target" "deferred_analysis_target" {
+  rule = aws_cloudwatch_event_rule.deferred_analysis_schedule.name
+  arn  = aws_lambda_function.deferred_analysis.arn
+}
+
+resource "aws_lambda_permission" "allow_deferred_schedule" {
+  statement_id  = "AllowEventBridgeInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.deferred_analysis.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.deferred_analysis_schedule.arn
+}
+
 # --- 5. O Gatilho (S3 Trigger) ---
 # Dá permissão para o S3 invocar esta Lambda
 resource "aws_lambda_permission" "allow_s3" {
@@ -133,11 +276,19 @@ resource "aws_lambda_function" "get_session" {
 
   runtime = "python3.11"
   handler = "handlers.get_session.lambda_handler"
-  timeout = 5
+  timeout = 25 # Long-poll (?wait=N) segura a requisição até 20 s
 
   environment {
     variables = {
-      TABLE_NAME = aws_dynamodb_table.sessions_table.name
+      TABLE_NAME                 = aws_dynamodb_table.sessions_table.name
+      LONG_POLL_MAX_WAIT_SECONDS = "20"
+      DEADLINE_RESERVE_SECONDS   = "2"
+      # Sessões COMPLETED/ERROR em memória (LRU) e Cache-Control longo na resposta
+      TERMINAL_CACHE_MAX_ENTRIES = "2000"
+      TERMINAL_CACHE_TTL_SECONDS = "900"
+      TERMINAL_MAX_AGE_SECONDS   = "86400"
+      # Corpo comprimido (br/gzip conforme Accept-Encoding) a partir deste tamanho
+      RESPONSE_COMPRESSION_MIN_BYTES = "1024"
     }
   }
 }
@@ -33,6 +33,23 @@ resource "aws_s3_bucket_cors_configuration" "media_bucket_cors" {
   }
 }
 
+# Uploads multipart abandonados (candidato fechou a aba no meio): as partes já
+# enviadas são cobradas até o abort, então o S3 aborta sozinho depois de 1 dia
+resource "aws_s3_bucket_lifecycle_configuration" "media_bucket_lifecycle" {
+  bucket = aws_s3_bucket.media_bucket.id
+
+  rule {
+    id     = "abort-incomplete-multipart"
+    status = "Enabled"
+
+    filter {}
+
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+  }
+}
+
 # --- 3. DynamoDB Table (Banco de Dados Serverless) ---
 resource "aws_dynamodb_table" "sessions_table" {
   name         = "${var.project_name}-sessions-${var.environment}"
@@ -44,9 +61,92 @@ resource "aws_dynamodb_table" "sessions_table" {
     type = "S" # String (UUID)
   }
 
+  attribute {
+    name = "batch_state"
+    type = "S"
+  }
+
+  attribute {
+    name = "queued_at"
+    type = "N"
+  }
+
+  attribute {
+    name = "owner"
+    type = "S"
+  }
+
+  attribute {
+    name = "question_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "created_at"
+    type = "N"
+  }
+
+  # Índice esparso da fila deferred: só sessões aguardando/em job de lote têm batch_state
+  global_secondary_index {
+    name            = "batch-state-index"
+    hash_key        = "batch_state"
+    range_key       = "queued_at"
+    projection_type = "ALL"
+  }
+
+  # Histórico sem Scan (GET /sessions): por candidato (owner, esparso) e por pergunta,
+  # ordenado por created_at. Só os atributos do resumo são projetados.
+  global_secondary_index {
+    name               = "owner-created-index"
+    hash_key           = "owner"
+    range_key          = "created_at"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["status", "candidate_name", "question_id", "analysis_mode", "updated_at"]
+  }
+
+  global_secondary_index {
+    name               = "question-created-index"
+    hash_key           = "question_id"
+    range_key          = "created_at"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["status", "candidate_name", "analysis_mode", "updated_at"]
+  }
+
   # TTL: Limpeza automática de sessões antigas
   ttl {
     attribute_name = "expire_at"
     enabled        = true
   }
-}
\ No newline at end of file
+}
+# --- 4. DynamoDB Table (Cache de Análises por Conteúdo) ---
+# Chave = hash(áudio) + hash(vaga) + versão do prompt + modelo.
+# Reenvios da mesma gravação reaproveitam o feedback sem chamar o Gemini.
+resource "aws_dynamodb_table" "analysis_cache_table" {
+  name         = "${var.project_name}-analysis-cache-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "cache_key"
+
+  attribute {
+    name = "cache_key"
+    type = "S" # SHA-256 hex
+  }
+
+  # TTL: Evicção automática de resultados antigos
+  ttl {
+    attribute_name = "expire_at"
+    enabled        = true
+  }
+}
+
+# --- 5. DynamoDB Table (Controle: rate limiter do Gemini) ---
+# Itens pequenos e quentes (token bucket compartilhado entre as Lambdas).
+resource "aws_dynamodb_table" "control_table" {
+  name         = "${var.project_name}-control-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "control_key"
+
+  attribute {
+    name = "control_key"
+    type = "S"
+  }
+}
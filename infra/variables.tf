@@ -20,4 +20,21 @@ variable "gemini_api_key" {
   description = "Chave de API do Google Gemini"
   type        = string
   sensitive   = true # Evita que a chave apareça nos logs do terminal
-}
\ No newline at end of file
+}
+variable "gemini_rpm" {
+  description = "Cota de requisições/min do Gemini compartilhada pelas Lambdas"
+  type        = string
+  default     = "60"
+}
+
+variable "gemini_tpm" {
+  description = "Cota de tokens/min do Gemini compartilhada pelas Lambdas"
+  type        = string
+  default     = "1000000"
+}
+
+variable "model_routes" {
+  description = "Rotas de modelo em JSON ([{name, model, max_seconds, max_bytes, max_tokens}]); vazio usa o padrão"
+  type        = string
+  default     = ""
+}
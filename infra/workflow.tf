@@ -46,6 +46,32 @@ resource "aws_sfn_state_machine" "analysis_workflow" {
 
         # Retentativa Automática (Robustez Enterprise)
         Retry = [
+          # Cota do Gemini esgotada (rate limiter): adia com espera longa e jitter,
+          # em vez de reexecutar o handler em 2 s e empilhar mais 429
+          {
+            ErrorEquals     = ["RateLimitExceeded"]
+            IntervalSeconds = 30
+            MaxAttempts     = 6
+            BackoffRate     = 1.5
+            MaxDelaySeconds = 300
+            JitterStrategy  = "FULL"
+          },
+          # Prazo da Lambda acabando: progresso salvo (RESUMABLE), continua logo em seguida
+          {
+            ErrorEquals     = ["DeadlineExceeded"]
+            IntervalSeconds = 1
+            MaxAttempts     = 5
+            BackoffRate     = 1.0
+          },
+          # Circuit breaker aberto (Gemini fora): sessão em DEFERRED, tenta de novo bem mais tarde
+          {
+            ErrorEquals     = ["CircuitOpenError"]
+            IntervalSeconds = 60
+            MaxAttempts     = 5
+            BackoffRate     = 2.0
+            MaxDelaySeconds = 900
+            JitterStrategy  = "FULL"
+          },
           {
             ErrorEquals     = ["States.ALL"]
             IntervalSeconds = 2